@@ -1,6 +1,7 @@
-from fastapi import FastAPI, HTTPException, BackgroundTasks, Query, Request, Depends, WebSocket, WebSocketDisconnect
-from fastapi.responses import JSONResponse, StreamingResponse, HTMLResponse, FileResponse
+from fastapi import FastAPI, HTTPException, Query, Request, Depends, WebSocket, WebSocketDisconnect
+from fastapi.responses import JSONResponse, StreamingResponse, HTMLResponse, FileResponse, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.concurrency import run_in_threadpool
 from fastapi.staticfiles import StaticFiles
 import json
 import os
@@ -22,6 +23,14 @@ from typing import Dict, List, Set
 from config import Config
 from automation.verixai_automation import VerixAIAutomation
 from utils.test_utils import TestResult
+from utils.memory_utils import MemoryAdmissionController
+from utils.screenshot_utils import get_screenshot_store
+from utils.result_utils import get_result_store
+from utils.run_utils import RunRegistry
+from utils.journal_utils import RunJournal
+from utils.export_utils import EXPORT_FORMATS, ndjson_lines, junit_xml
+from utils.outbox_utils import get_email_outbox
+from utils.email_utils import send_due_digests, digest_due
 from models.models import CaseDetails, TestRequest, HealthResponse, TestResponse, TestStatusResponse, WebhookConfig
 from config import DevConfig, StagingConfig, ProdConfig
 
@@ -53,6 +62,22 @@ async def lifespan(_: FastAPI):
     # Startup: Start the broadcast processor and sync queue checker
     broadcast_task = asyncio.create_task(broadcast_processor())
     sync_queue_task = asyncio.create_task(check_sync_queue())
+    eviction_task = asyncio.create_task(evict_finished_runs())
+    digest_task = asyncio.create_task(send_email_digests())
+
+    # Index result files written before the result store existed
+    imported = await run_in_threadpool(get_result_store().backfill, os.path.join(os.getcwd(), 'test_results'))
+    if imported:
+        logger.info(f"Imported {imported} saved test results into the result store")
+
+    # Recover the runs of the previous process from the run journal
+    recovered = await run_in_threadpool(run_registry.recover)
+    if recovered['finished'] or recovered['interrupted']:
+        logger.info(f"Recovered {recovered['finished']} finished runs and marked "
+                    f"{recovered['interrupted']} orphaned runs as interrupted from the run journal")
+
+    # Start delivering queued emails, including those a previous process left behind
+    await run_in_threadpool(get_email_outbox().start)
 
     logger.info("FastAPI application started with lifespan event handler")
 
@@ -61,6 +86,8 @@ async def lifespan(_: FastAPI):
     # Shutdown: Cancel the tasks
     broadcast_task.cancel()
     sync_queue_task.cancel()
+    eviction_task.cancel()
+    digest_task.cancel()
 
     try:
         await broadcast_task
@@ -72,6 +99,18 @@ async def lifespan(_: FastAPI):
     except asyncio.CancelledError:
         pass
 
+    try:
+        await eviction_task
+    except asyncio.CancelledError:
+        pass
+
+    try:
+        await digest_task
+    except asyncio.CancelledError:
+        pass
+
+    await run_in_threadpool(get_email_outbox().stop)
+
     logger.info("FastAPI application shutdown complete")
 
 # Initialize FastAPI app
@@ -96,8 +135,13 @@ static_dir = os.path.join(os.getcwd(), "static")
 os.makedirs(static_dir, exist_ok=True)
 app.mount("/static", StaticFiles(directory=static_dir), name="static")
 
-# Dictionary to store running tests
-running_tests = {}
+# Runs of this process; finished runs are moved to the result store after a while
+run_registry = RunRegistry(
+    ttl_seconds=Config.RUN_REGISTRY_TTL_SECONDS,
+    max_finished=Config.RUN_REGISTRY_MAX_FINISHED,
+    cache_size=Config.RUN_CACHE_SIZE,
+    journal=RunJournal(Config.RUN_JOURNAL_PATH, compact_every=Config.RUN_JOURNAL_COMPACT_EVERY)
+)
 
 # Dictionary to store webhook configurations
 webhooks = {}
@@ -105,6 +149,9 @@ webhooks = {}
 # Dictionary to store log queues for each test
 log_queues = {}
 
+# Admits new tests only when their browser memory budget fits in the container
+memory_admission = MemoryAdmissionController(reserve_mb=Config.MEMORY_RESERVE_MB)
+
 # WebSocket connection manager
 class ConnectionManager:
     def __init__(self):
@@ -121,12 +168,13 @@ class ConnectionManager:
             self.active_connections[test_id].append(websocket)
 
         # Send initial logs if available
-        if test_id in running_tests:
+        run = await run_in_threadpool(run_registry.get, test_id)
+        if run:
             await websocket.send_text(json.dumps({
                 "event": "initial_logs",
                 "test_id": test_id,
-                "logs": running_tests[test_id].get('logs', ''),
-                "status": running_tests[test_id]['status']
+                "logs": run.get('logs', ''),
+                "status": run['status']
             }))
 
     def disconnect(self, websocket: WebSocket, test_id: str):
@@ -195,15 +243,14 @@ async def broadcast_processor():
             await asyncio.sleep(0.1)
 
 def log_processor():
-    """Background thread to process logs from the queue and update running_tests"""
+    """Background thread to process logs from the queue and update the run registry"""
     while True:
         try:
             # Get a log entry from the queue
             test_id, log_text, stream_type = log_queue.get()
 
-            # Update the running_tests log
-            if test_id in running_tests:
-                running_tests[test_id]['logs'] += log_text
+            # Update the run's log
+            is_active = run_registry.append_logs(test_id, log_text)
 
             # Create a message for broadcasting
             log_message = json.dumps({
@@ -216,7 +263,7 @@ def log_processor():
 
             # Add the message to the broadcast queue
             # We use a synchronous queue to communicate between threads
-            if test_id in running_tests:
+            if is_active:
                 # Use a thread-safe way to add to the asyncio queue
                 asyncio_queue_sync.put((test_id, log_message))
 
@@ -258,6 +305,42 @@ async def check_sync_queue():
 
 
 
+async def evict_finished_runs():
+    """Periodically move finished runs past their time to live to the result store, and hourly
+    delete screenshots older than SCREENSHOT_RETENTION_DAYS"""
+    last_sweep = 0.0
+    while True:
+        await asyncio.sleep(60)
+        try:
+            evicted = await run_in_threadpool(run_registry.evict)
+            if evicted:
+                logger.info(f"Moved {evicted} finished runs to the result store")
+        except Exception as e:
+            logger.error(f"Error evicting finished runs: {str(e)}")
+
+        if time.monotonic() - last_sweep >= 3600:
+            last_sweep = time.monotonic()
+            try:
+                swept = await run_in_threadpool(get_screenshot_store().sweep, Config.SCREENSHOT_RETENTION_DAYS)
+                if swept['deleted']:
+                    logger.info(f"Deleted {swept['deleted']} old screenshots ({swept['freed_mb']} MB)")
+            except Exception as e:
+                logger.error(f"Error deleting old screenshots: {str(e)}")
+
+async def send_email_digests():
+    """Queue the digest emails that are due every minute, or as soon as one fills up"""
+    while True:
+        deadline = time.monotonic() + 60
+        while not digest_due.is_set() and time.monotonic() < deadline:
+            await asyncio.sleep(1)
+        digest_due.clear()
+        try:
+            queued = await run_in_threadpool(send_due_digests)
+            if queued:
+                logger.info(f"Queued {queued} digest emails")
+        except Exception as e:
+            logger.error(f"Error sending digest emails: {str(e)}")
+
 def capture_output(func, test_id=None):
     """Capture stdout and stderr during function execution with real-time streaming"""
     # Create streaming buffers
@@ -304,13 +387,34 @@ def send_webhook_notification(test_id, event_type, data=None):
 
 def run_test_in_background(test_id, test_params):
     """Run a test in a background thread and capture all output"""
+    # Wait until the test's browser memory budget fits in the container
+    config = env_map.get(test_params.get('env', 'dev'), Config)
+    budget_mb = test_params.get('memory_budget_mb') or config.CHROME_MEMORY_BUDGET_MB
+    if not memory_admission.try_admit(test_id, budget_mb):
+        run_registry.update(test_id, status='queued')
+        logger.info(f"Test {test_id} queued until {budget_mb:.0f} MB of memory is available: {memory_admission.capacity()}")
+        if not memory_admission.acquire(test_id, budget_mb, timeout=config.MEMORY_ADMISSION_TIMEOUT):
+            error = f"Not enough memory to start the test within {config.MEMORY_ADMISSION_TIMEOUT:.0f} seconds"
+            run_registry.update(test_id, status='error', error=error, end_time=datetime.now().isoformat())
+            logger.error(f"Test {test_id} was not admitted: {error}")
+            return
+        run_registry.update(test_id, status='running')
+
+    try:
+        _run_admitted_test(test_id, test_params)
+    finally:
+        memory_admission.release(test_id)
+
+def _run_admitted_test(test_id, test_params):
+    """Run a test that has been admitted by the memory admission controller"""
+    run = run_registry.active(test_id)
     try:
         logger.info(f"Starting test {test_id} with params: {test_params}")
 
         # Send webhook notification for test started
         send_webhook_notification(test_id, 'test_started', {
             'status': 'running',
-            'start_time': running_tests[test_id]['start_time']
+            'start_time': run['start_time']
         })
 
         # Broadcast test started event to WebSocket clients using the sync queue
@@ -318,12 +422,17 @@ def run_test_in_background(test_id, test_params):
             "event": "test_started",
             "test_id": test_id,
             "status": "running",
-            "start_time": running_tests[test_id]['start_time']
+            "start_time": run['start_time']
         })
         asyncio_queue_sync.put((test_id, start_message))
 
-        # Create automation instance
-        automation = VerixAIAutomation(test_params)
+        # Create automation instance, reporting browser memory samples to the admission controller
+        automation = VerixAIAutomation(test_params, test_id=test_id, memory_listener=memory_admission.update_usage)
+
+        # Journal each stage as it ends, so a restart can tell how far the test got
+        automation.test_result.add_listener(
+            lambda event, details: run_registry.record_stage(test_id, details) if event == 'test_case_ended' else None
+        )
 
         # Log the configuration being used
         env = test_params.get('env', 'dev')
@@ -337,30 +446,35 @@ def run_test_in_background(test_id, test_params):
         # Run automation with output capture and streaming
         result, stdout, stderr = capture_output(automation.run_automation, test_id)
 
+        # Persist the result so it can still be looked up once it leaves the run registry
+        try:
+            automation.test_result.save_result()
+        except Exception as e:
+            logger.error(f"Error saving result of test {test_id}: {str(e)}")
+
         # Store results and logs
-        running_tests[test_id]['status'] = 'completed'
-        running_tests[test_id]['result'] = result
-        running_tests[test_id]['logs'] = stdout + stderr
-        running_tests[test_id]['end_time'] = datetime.now().isoformat()
+        run_registry.update(test_id, status='completed', result=result, logs=stdout + stderr,
+                            end_time=datetime.now().isoformat())
 
         # Send webhook notification for test completed
         send_webhook_notification(test_id, 'test_completed', {
             'status': 'completed',
-            'start_time': running_tests[test_id]['start_time'],
-            'end_time': running_tests[test_id]['end_time'],
-            'result': result
+            'start_time': run['start_time'],
+            'end_time': run['end_time'],
+            'result': result,
+            'performance_regressions': (result or {}).get('performance_regressions', [])
         })
 
-        # Email is already sent by TestResult.mark_passed/mark_failed
-        logger.info(f"Email already sent by TestResult class for test {test_id}")
+        # Email is already queued by TestResult.mark_passed/mark_failed
+        logger.info(f"Email already queued by TestResult class for test {test_id}")
 
         # Broadcast test completed event to WebSocket clients using the sync queue
         complete_message = json.dumps({
             "event": "test_completed",
             "test_id": test_id,
             "status": "completed",
-            "start_time": running_tests[test_id]['start_time'],
-            "end_time": running_tests[test_id]['end_time'],
+            "start_time": run['start_time'],
+            "end_time": run['end_time'],
             "result": result
         })
         asyncio_queue_sync.put((test_id, complete_message))
@@ -368,29 +482,27 @@ def run_test_in_background(test_id, test_params):
         logger.info(f"Test {test_id} completed with status: {result.get('status') if result else 'ERROR'}")
     except Exception as e:
         logger.error(f"Error in test {test_id}: {str(e)}")
-        running_tests[test_id]['status'] = 'error'
-        running_tests[test_id]['error'] = str(e)
-        running_tests[test_id]['logs'] = traceback.format_exc()
-        running_tests[test_id]['end_time'] = datetime.now().isoformat()
+        run_registry.update(test_id, status='error', error=str(e), logs=traceback.format_exc(),
+                            end_time=datetime.now().isoformat())
 
         # Send webhook notification for test error
         send_webhook_notification(test_id, 'test_error', {
             'status': 'error',
-            'start_time': running_tests[test_id]['start_time'],
-            'end_time': running_tests[test_id]['end_time'],
+            'start_time': run['start_time'],
+            'end_time': run['end_time'],
             'error': str(e)
         })
 
-        # Email is already sent by TestResult.mark_passed/mark_failed
-        logger.info(f"Email already sent by TestResult class for test {test_id} (error case)")
+        # Email is already queued by TestResult.mark_passed/mark_failed
+        logger.info(f"Email already queued by TestResult class for test {test_id} (error case)")
 
         # Broadcast test error event to WebSocket clients using the sync queue
         error_message = json.dumps({
             "event": "test_error",
             "test_id": test_id,
             "status": "error",
-            "start_time": running_tests[test_id]['start_time'],
-            "end_time": running_tests[test_id]['end_time'],
+            "start_time": run['start_time'],
+            "end_time": run['end_time'],
             "error": str(e)
         })
         asyncio_queue_sync.put((test_id, error_message))
@@ -404,6 +516,29 @@ def health_check():
         'version': '1.0.0'
     }
 
+@app.get("/api/capacity")
+def get_capacity(
+    env: str = Query("dev", description="Environment whose per-test memory budget is checked (dev, staging, prod)")
+):
+    """API endpoint to check how much memory is left for new tests"""
+    config_class = env_map.get(env)
+    if not config_class:
+        raise HTTPException(status_code=400, detail="Invalid environment specified")
+
+    budget_mb = config_class.CHROME_MEMORY_BUDGET_MB
+    capacity = memory_admission.capacity()
+    capacity['env'] = env
+    capacity['test_budget_mb'] = budget_mb
+    capacity['can_admit'] = not budget_mb or capacity['running_tests'] == 0 or (
+        capacity['available_mb'] is not None and capacity['available_mb'] >= budget_mb
+    )
+    return {
+        'status': 'success',
+        'timestamp': datetime.now().isoformat(),
+        'memory': capacity,
+        'runs': run_registry.get_stats()
+    }
+
 @app.get("/logs", response_class=HTMLResponse)
 async def get_log_viewer():
     """Serve the log viewer HTML page"""
@@ -412,7 +547,6 @@ async def get_log_viewer():
 @app.post("/api/run-test", response_model=TestResponse)
 async def run_test(
     request: TestRequest,
-    background_tasks: BackgroundTasks,
     env: str = Query(..., description="Environment to run the test in (dev, staging, prod)")
 ):
     """API endpoint to run a test"""
@@ -425,22 +559,40 @@ async def run_test(
         config = config_class  # Now you're using the correct env-specific class
         test_id = f"test_{uuid.uuid4().hex[:8]}"
 
+        if request.upload_mode and request.upload_mode.lower() not in ('browser', 'http'):
+            raise HTTPException(status_code=400, detail="Invalid upload mode, expected 'browser' or 'http'")
+
+        # Resolve a generated corpus by name, never by arbitrary path
+        corpus_dir = None
+        if request.corpus:
+            corpus_root = os.path.abspath(Config.CORPUS_ROOT)
+            corpus_dir = os.path.abspath(os.path.join(corpus_root, request.corpus))
+            if os.path.dirname(corpus_dir) != corpus_root or not os.path.isdir(corpus_dir):
+                raise HTTPException(status_code=400, detail=f"Corpus '{request.corpus}' not found")
+
         # Only include case details and environment in test parameters
         test_params = {
             'case_details': request.case_details.model_dump() if request.case_details else None,
-            'env': env  # Pass the environment from the query parameter
+            'env': env,  # Pass the environment from the query parameter
+            'capture_network': request.capture_network,
+            'corpus_dir': corpus_dir,
+            'upload_mode': request.upload_mode
         }
 
-        running_tests[test_id] = {
+        # Journaling the run (and evicting or compacting) touches disk, so keep it off the event loop
+        await run_in_threadpool(run_registry.add, test_id, {
             'status': 'running',
             'start_time': datetime.now().isoformat(),
             'params': test_params,
             'logs': ''
-        }
+        })
 
         # Webhook is no longer included in the payload
 
-        background_tasks.add_task(run_test_in_background, test_id, test_params)
+        # Run on a thread of its own: a test queued for memory may wait for MEMORY_ADMISSION_TIMEOUT,
+        # which must not tie up the threadpool that serves the sync endpoints
+        threading.Thread(target=run_test_in_background, args=(test_id, test_params),
+                         name=f"test-{test_id}", daemon=True).start()
 
         return {
             'status': 'success',
@@ -448,6 +600,8 @@ async def run_test(
             'test_id': test_id
         }
 
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error starting test: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Error starting test: {str(e)}")
@@ -455,63 +609,212 @@ async def run_test(
 @app.get("/api/test-status/{test_id}", response_model=TestStatusResponse)
 async def test_status(test_id: str):
     """API endpoint to check test status"""
-    if test_id not in running_tests:
+    run = await run_in_threadpool(run_registry.get, test_id)
+    if not run:
         raise HTTPException(status_code=404, detail=f"Test ID {test_id} not found")
 
     return {
         'status': 'success',
         'test_id': test_id,
-        'test_status': running_tests[test_id]['status'],
-        'start_time': running_tests[test_id]['start_time'],
-        'result': running_tests[test_id].get('result'),
-        'logs': running_tests[test_id].get('logs', '')
+        'test_status': run['status'],
+        'start_time': run['start_time'],
+        'result': run.get('result'),
+        'logs': run.get('logs', '')
+    }
+
+@app.get("/api/test-results")
+async def list_test_results(
+    env: str = Query(None, description="Only results of this environment"),
+    status: str = Query(None, description="Only results with this status (PASSED or FAILED)"),
+    since: str = Query(None, description="Only results started at or after this ISO timestamp"),
+    until: str = Query(None, description="Only results started before this ISO timestamp"),
+    failed_case: str = Query(None, description="Only results in which this test case failed"),
+    limit: int = Query(50, ge=1, le=200, description="Maximum number of results per page"),
+    cursor: str = Query(None, description="next_cursor of the previous page")
+):
+    """API endpoint to list saved test results, newest first"""
+    for name, value in (('since', since), ('until', until)):
+        if value:
+            try:
+                datetime.fromisoformat(value)
+            except ValueError:
+                raise HTTPException(status_code=400, detail=f"Invalid {name} timestamp: {value}")
+
+    try:
+        results, next_cursor = await run_in_threadpool(
+            get_result_store().list_results,
+            env=env, status=status, since=since, until=until, failed_case=failed_case,
+            limit=limit, cursor=cursor
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    return {
+        'status': 'success',
+        'results': results,
+        'next_cursor': next_cursor
     }
 
+@app.get("/api/test-results/export")
+async def export_test_results(
+    format: str = Query("ndjson", description="Export format (ndjson or junit)"),
+    env: str = Query(None, description="Only results of this environment"),
+    status: str = Query(None, description="Only results with this status (PASSED or FAILED)"),
+    since: str = Query(None, description="Only results saved at or after this ISO timestamp (saved_at of the last export)"),
+    until: str = Query(None, description="Only results saved before this ISO timestamp")
+):
+    """API endpoint to stream saved test results, in the order they were saved, as NDJSON or JUnit XML"""
+    if format not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Invalid format: {format}. Must be one of {', '.join(EXPORT_FORMATS)}")
+    for name, value in (('since', since), ('until', until)):
+        if value:
+            try:
+                datetime.fromisoformat(value)
+            except ValueError:
+                raise HTTPException(status_code=400, detail=f"Invalid {name} timestamp: {value}")
+
+    # The generators run in the thread pool as the response is streamed
+    results = get_result_store().iter_results(env=env, status=status, since=since, until=until)
+    content = ndjson_lines(results) if format == 'ndjson' else junit_xml(results)
+    media_type, extension = EXPORT_FORMATS[format]
+    return StreamingResponse(
+        content,
+        media_type=media_type,
+        headers={'Content-Disposition': f'attachment; filename="test-results.{extension}"'}
+    )
+
 @app.get("/api/test-results/{test_id}")
 async def get_test_result(test_id: str):
     """API endpoint to get a specific test result by ID"""
-    # First check if the test is still running
-    if test_id in running_tests:
+    # First check if the test is still in memory
+    run = run_registry.active(test_id)
+    if run:
         return {
             'status': 'success',
             'message': f'Test {test_id} is still running or has not been saved yet',
-            'test_status': running_tests[test_id]['status'],
-            'start_time': running_tests[test_id]['start_time'],
-            'result': running_tests[test_id].get('result'),
+            'test_status': run['status'],
+            'start_time': run['start_time'],
+            'result': run.get('result'),
             'is_running': True
         }
 
-    # If not running, check saved results
-    results_dir = os.path.join(os.getcwd(), 'test_results')
-    if not os.path.exists(results_dir):
-        raise HTTPException(status_code=404, detail=f"Test ID {test_id} not found")
-
-    # Look for the test result file
-    for filename in os.listdir(results_dir):
-        if filename.endswith('.json'):
-            with open(os.path.join(results_dir, filename), 'r') as f:
-                result = json.load(f)
-                if result.get('test_id') == test_id:
-                    return {
-                        'status': 'success',
-                        'test_id': test_id,
-                        'result': result,
-                        'is_running': False
-                    }
+    # If not running, look the result up in the result store
+    result = await run_in_threadpool(get_result_store().get, test_id)
+    if result:
+        return {
+            'status': 'success',
+            'test_id': test_id,
+            'result': result,
+            'is_running': False
+        }
 
     # If we get here, the test was not found
     raise HTTPException(status_code=404, detail=f"Test ID {test_id} not found")
 
+def _find_result_details(test_id):
+    """Get the details of a finished test from memory or the saved results, or None"""
+    run = run_registry.get(test_id)
+    return run.get('result') if run else None
+
+def _serve_screenshot(request, test_id, name, thumbnail=False):
+    """Serve a screenshot or its thumbnail from the screenshot store"""
+    details = _find_result_details(test_id)
+    if not details:
+        raise HTTPException(status_code=404, detail=f"Test ID {test_id} not found or still running")
+
+    handle = details.get('screenshot_objects', {}).get(name)
+    if not handle:
+        raise HTTPException(status_code=404, detail=f"Screenshot {name} not found for test {test_id}")
+
+    # Thumbnails share the screenshot's content type; without one the full image is served
+    sha256 = (handle.get('thumbnail_sha256') if thumbnail else None) or handle['sha256']
+    path = get_screenshot_store().path(sha256)
+    if not os.path.exists(path):
+        raise HTTPException(status_code=404, detail=f"Screenshot {name} is no longer stored")
+
+    # Objects are content-addressed, so the hash is a strong validator and the response never changes
+    headers = {
+        'ETag': f'"{sha256}"',
+        'Cache-Control': 'public, max-age=31536000, immutable'
+    }
+    if_none_match = [tag.strip().removeprefix('W/') for tag in request.headers.get('if-none-match', '').split(',')]
+    if '*' in if_none_match or headers['ETag'] in if_none_match:
+        return Response(status_code=304, headers=headers)
+
+    # FileResponse streams from disk and answers Range requests itself
+    return FileResponse(
+        path,
+        media_type=handle.get('content_type', 'image/png'),
+        headers=headers,
+        filename=name,
+        content_disposition_type='inline'
+    )
+
+@app.get("/api/test-results/{test_id}/screenshots/{name}")
+def get_test_screenshot(request: Request, test_id: str, name: str):
+    """API endpoint to get a screenshot of a test run"""
+    return _serve_screenshot(request, test_id, name)
+
+@app.get("/api/test-results/{test_id}/screenshots/{name}/thumbnail")
+def get_test_screenshot_thumbnail(request: Request, test_id: str, name: str):
+    """API endpoint to get the thumbnail of a screenshot of a test run"""
+    return _serve_screenshot(request, test_id, name, thumbnail=True)
+
+@app.get("/api/notifications")
+async def get_notification_stats():
+    """API endpoint to count the emails in the outbox by delivery status"""
+    return {
+        'status': 'success',
+        'outbox': await run_in_threadpool(get_email_outbox().get_stats),
+        'digests': await run_in_threadpool(get_email_outbox().get_digest_backlog)
+    }
+
+@app.get("/api/notifications/{test_id}")
+async def get_test_notifications(test_id: str):
+    """API endpoint to get the delivery status of the emails of a test"""
+    return {
+        'status': 'success',
+        'test_id': test_id,
+        'messages': await run_in_threadpool(get_email_outbox().get_messages, test_id)
+    }
+
+@app.get("/api/analytics/stages")
+async def get_stage_analytics(
+    env: str = Query(None, description="Only runs of this environment; all environments are merged otherwise"),
+    granularity: str = Query("day", description="Bucket size of the series (hour or day)"),
+    since: str = Query(None, description="Only buckets at or after this ISO timestamp"),
+    until: str = Query(None, description="Only buckets up to this ISO timestamp"),
+    stage: str = Query(None, description="Only this stage (e.g. Login)")
+):
+    """API endpoint to get per-stage durations, pass rates and flakiness over time"""
+    for name, value in (('since', since), ('until', until)):
+        if value:
+            try:
+                datetime.fromisoformat(value)
+            except ValueError:
+                raise HTTPException(status_code=400, detail=f"Invalid {name} timestamp: {value}")
+
+    try:
+        stages = await run_in_threadpool(
+            get_result_store().stage_analytics,
+            env=env, granularity=granularity, since=since, until=until, stage=stage
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    return {
+        'status': 'success',
+        'env': env,
+        'granularity': granularity,
+        'stages': stages
+    }
+
 @app.websocket("/ws/test-logs/{test_id}")
 async def websocket_endpoint(websocket: WebSocket, test_id: str):
     """WebSocket endpoint for real-time test logs"""
     try:
         # Check if the test exists
-        if test_id not in running_tests and not any(
-            json.load(open(os.path.join(os.getcwd(), 'test_results', f))).get('test_id') == test_id
-            for f in os.listdir(os.path.join(os.getcwd(), 'test_results'))
-            if f.endswith('.json') and os.path.exists(os.path.join(os.getcwd(), 'test_results', f))
-        ):
+        if not await run_in_threadpool(run_registry.get, test_id):
             await websocket.accept()
             await websocket.send_text(json.dumps({
                 "event": "error",
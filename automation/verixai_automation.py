@@ -1,5 +1,4 @@
 from selenium import webdriver
-from selenium.webdriver.chrome.options import Options
 from selenium.webdriver.common.by import By
 from selenium.webdriver.common.keys import Keys
 from selenium.webdriver.common.action_chains import ActionChains
@@ -11,11 +10,23 @@ import openai
 import json
 import os
 import traceback
+import re
+from urllib.parse import urlparse
 from datetime import datetime
 from fastapi import HTTPException
 from config import DevConfig, StagingConfig, ProdConfig
 from utils.test_utils import TestResult
 from utils.email_utils import send_test_result_email
+from utils.dom_utils import apply_dom_actions, fill_action, unhide_action
+from utils.browser_utils import build_chrome_options, apply_lean_profile
+from utils.network_utils import NetworkRecorder, enable_performance_logging
+from utils.perf_utils import install_performance_observers, collect_page_metrics
+from utils.memory_utils import MemoryWatchdog, MemoryBudgetExceeded
+from utils.corpus_utils import load_manifest
+from utils.upload_utils import UploadMeasurement, BulkUploader, UPLOAD_PROGRESS_SCRIPT
+from utils.screenshot_utils import screenshot_extension
+from utils.screencast_utils import ScreencastRecorder
+from utils.test_utils import FAILURE_SCREENSHOT_MARKERS
 
 
 env_map = {
@@ -27,18 +38,26 @@ env_map = {
 class VerixAIAutomation:
     """Class to handle VerixAI automation"""
 
-    def __init__(self, test_params=None):
+    def __init__(self, test_params=None, test_id=None, memory_listener=None):
         """
         Initialize the automation with test parameters
 
         Args:
             test_params (dict): Parameters for the test run
+            test_id (str, optional): ID for the test run (generated if not provided)
+            memory_listener (callable, optional): Called with (test_id, rss_mb) after
+                each browser memory sample
         """
         self.test_params = test_params or {}
-        self.test_result = TestResult(test_params=test_params)
+        self.test_result = TestResult(test_id=test_id, test_params=test_params)
         self.driver = None
         self.wait = None
         self.openai_client = None
+        self.current_stage = None
+        self.network_recorder = None
+        self.memory_watchdog = None
+        self.memory_listener = memory_listener
+        self.screencast = None
 
         # Get environment from test parameters or default to 'dev'
         env = self.test_params.get('env', 'dev')
@@ -51,15 +70,33 @@ class VerixAIAutomation:
 
         # Set the config for this instance
         self.config = config_class
+        self.test_result.set_capture_policy(
+            self.test_params.get('screenshot_capture_policy') or self.config.SCREENSHOT_CAPTURE_POLICY,
+            self.config.SCREENSHOT_RING_SIZE
+        )
+        self.test_result.set_stage_budgets(
+            self.test_params.get('stage_budgets') or self.config.STAGE_BUDGETS,
+            self.test_params.get('stage_budget_action') or self.config.STAGE_BUDGET_ACTION
+        )
 
         print(f"Using environment: {env}")
 
         # Extract case details from parameters
         self.case_details = self.test_params.get('case_details', None)
 
-        # Use sample_data directory structure directly
-        sample_data_dir = os.path.join(os.getcwd(), 'sample_data')
-        print(f"Using sample_data directory: {sample_data_dir}")
+        # Use sample_data directory structure directly, or a generated corpus with the same layout
+        self.corpus_manifest = None
+        corpus_dir = self.test_params.get('corpus_dir')
+        if corpus_dir:
+            sample_data_dir = os.path.abspath(corpus_dir)
+            self.corpus_manifest = load_manifest(sample_data_dir)
+            print(f"Using generated corpus directory: {sample_data_dir}")
+            if self.corpus_manifest:
+                for name, total in self.corpus_manifest.get('totals', {}).items():
+                    print(f"  {name}: {total['count']} files, {total['bytes']} bytes")
+        else:
+            sample_data_dir = os.path.join(os.getcwd(), 'sample_data')
+            print(f"Using sample_data directory: {sample_data_dir}")
 
         # Set file and folder paths directly from sample_data directory
         self.notes_file_path = os.path.join(sample_data_dir, 'notes.pdf')
@@ -77,22 +114,40 @@ class VerixAIAutomation:
         print(f"Using imaging file path: {self.imaging_file_path}")
         print(f"Using imaging folder path: {self.imaging_folder_path}")
 
+        # Record network traffic if requested in the test parameters or the config
+        capture_network = self.test_params.get('capture_network')
+        self.capture_network = self.config.CAPTURE_NETWORK if capture_network is None else bool(capture_network)
+
+        # Upload through the popup ('browser') or straight to the upload endpoint ('http')
+        self.upload_mode = (self.test_params.get('upload_mode') or self.config.UPLOAD_MODE).lower()
+        if self.upload_mode not in ('browser', 'http'):
+            print(f"Invalid upload mode specified: {self.upload_mode}, defaulting to 'browser'")
+            self.upload_mode = 'browser'
+        print(f"Using upload mode: {self.upload_mode}")
+
+        # Take full screenshots, or record a screencast and screenshot only errors and warnings
+        self.screenshot_mode = (self.test_params.get('screenshot_mode') or self.config.SCREENSHOT_MODE).lower()
+
         # Create screenshots directory
         os.makedirs(self.config.SCREENSHOTS_DIR, exist_ok=True)
 
-    def init_driver(self, headless=True):
-        """Initialize the Chrome WebDriver"""
-        chrome_options = Options()
-        chrome_options.add_experimental_option("detach", True)
-        if headless:
-            chrome_options.add_argument("--headless")
-            chrome_options.add_argument("--window-size=1920,1080")
-        chrome_options.add_argument("--disable-gpu")
-        chrome_options.add_argument("--no-sandbox")
+    def init_driver(self, headless=True, profile=None):
+        """
+        Initialize the Chrome WebDriver
+
+        Args:
+            headless (bool): Whether to run Chrome headless
+            profile (str, optional): Browser profile ('standard' or 'lean'),
+                defaults to the BROWSER_PROFILE setting
+        """
+        profile = profile or self.test_params.get('browser_profile') or getattr(self.config, 'BROWSER_PROFILE', 'standard')
+        chrome_options = build_chrome_options(headless=headless, profile=profile)
+        if self.capture_network:
+            enable_performance_logging(chrome_options)
 
         # Use the same approach as in main.py
         try:
-            print("Initializing Chrome WebDriver with standard options")
+            print(f"Initializing Chrome WebDriver with {profile} options")
             self.driver = webdriver.Chrome(options=chrome_options)
             print("Chrome WebDriver initialized successfully")
         except Exception as e:
@@ -111,9 +166,98 @@ class VerixAIAutomation:
                 print(f"Error initializing Chrome driver with additional options: {str(e)}")
                 raise
 
+        if profile == 'lean':
+            try:
+                apply_lean_profile(
+                    self.driver,
+                    blocked_url_patterns=self.config.BLOCKED_URL_PATTERNS,
+                    disable_animations=self.config.DISABLE_ANIMATIONS,
+                    block_images=self.config.BLOCK_IMAGES
+                )
+            except Exception as e:
+                # The profile is an optimisation, never a reason to fail the run
+                print(f"Warning: Could not apply lean browser profile: {str(e)}")
+
+        if self.capture_network:
+            self.network_recorder = NetworkRecorder()
+            print("Network capture enabled")
+
+        if self.config.COLLECT_PERF_METRICS:
+            try:
+                install_performance_observers(self.driver)
+            except Exception as e:
+                print(f"Warning: Could not install performance observers: {str(e)}")
+
+        self.start_memory_watchdog()
+
+        if self.screenshot_mode == 'screencast':
+            self.start_screencast()
+
         self.wait = WebDriverWait(self.driver, 20)
         return self.driver
 
+    def start_screencast(self):
+        """Start recording the page, falling back to full screenshots if that is not possible"""
+        try:
+            self.screencast = ScreencastRecorder(
+                self.driver,
+                fps=self.config.SCREENCAST_FPS,
+                max_width=self.config.SCREENCAST_MAX_WIDTH,
+                max_height=self.config.SCREENCAST_MAX_HEIGHT,
+                quality=self.config.SCREENCAST_QUALITY
+            ).start()
+            print(f"Screencast recording started at up to {self.config.SCREENCAST_FPS:g} frames per second")
+        except Exception as e:
+            print(f"Warning: Could not start screencast, taking full screenshots instead: {str(e)}")
+            self.screencast = None
+            self.screenshot_mode = 'screenshots'
+        return self.screencast
+
+    def stop_screencast(self):
+        """Stop the screencast recording"""
+        if self.screencast:
+            self.screencast.stop()
+            print(f"Screencast stopped after receiving {self.screencast.frames_received} frames")
+            self.screencast = None
+
+    def start_memory_watchdog(self):
+        """Start sampling the memory of this test's chromedriver/Chrome process tree"""
+        try:
+            pid = self.driver.service.process.pid
+        except AttributeError:
+            print("Warning: Could not find the chromedriver process, memory watchdog disabled")
+            return None
+
+        budget_mb = self.test_params.get('memory_budget_mb') or self.config.CHROME_MEMORY_BUDGET_MB
+        test_id = self.test_result.test_id
+
+        def on_sample(rss_mb):
+            if self.memory_listener:
+                self.memory_listener(test_id, rss_mb)
+
+        self.memory_watchdog = MemoryWatchdog(
+            pid,
+            budget_mb,
+            interval=self.config.MEMORY_WATCHDOG_INTERVAL,
+            on_sample=on_sample,
+            label=test_id
+        ).start()
+        print(f"Memory watchdog started with a budget of {budget_mb:.0f} MB")
+        return self.memory_watchdog
+
+    def stop_memory_watchdog(self):
+        """Stop the memory watchdog and record the browser's memory usage in the result"""
+        if not self.memory_watchdog:
+            return None
+        self.memory_watchdog.stop()
+        self.test_result.memory = self.memory_watchdog.get_details()
+        return self.test_result.memory
+
+    def check_memory_budget(self):
+        """Raise MemoryBudgetExceeded if the watchdog killed the browser"""
+        if self.memory_watchdog and self.memory_watchdog.exceeded:
+            raise MemoryBudgetExceeded(self.memory_watchdog.message)
+
     def get_openai_client(self):
         """Initialize and return the Azure OpenAI client"""
         self.openai_client = openai.AzureOpenAI(
@@ -159,33 +303,140 @@ class VerixAIAutomation:
         Args:
             name (str): Name of the screenshot
             test_case_name (str, optional): Name of the test case to associate the screenshot with
+                (defaults to the current stage)
         """
         if not self.driver:
             return None
 
+        # Screenshots taken without a test case belong to the stage running, so they are
+        # deduplicated against the previous frame of that stage
+        if test_case_name is None:
+            test_case_name = self.current_stage
+
+        # The screencast covers everything but errors and warnings
+        if self.screencast and not any(marker in name.lower() for marker in FAILURE_SCREENSHOT_MARKERS):
+            return None
+
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        filename = f"{name}_{timestamp}.png"
+        # The screenshot is re-encoded in the background, so the extension is decided up front
+        filename = f"{name}_{timestamp}.{screenshot_extension()}"
 
         try:
             # Capture screenshot as binary data
             screenshot_data = self.driver.get_screenshot_as_png()
             print(f"Screenshot captured: {filename}")
 
-            # Add screenshot to test result
-            self.test_result.add_screenshot(screenshot_data, filename, test_case_name)
-
-            # For backward compatibility, also save to disk if needed
+            # For backward compatibility, also save to disk if needed (done by the encoding thread)
+            save_path = None
             if hasattr(self.config, 'SAVE_SCREENSHOTS_TO_DISK') and self.config.SAVE_SCREENSHOTS_TO_DISK:
-                filepath = os.path.join(self.config.SCREENSHOTS_DIR, filename)
-                with open(filepath, 'wb') as f:
-                    f.write(screenshot_data)
-                print(f"Screenshot also saved to disk: {filepath}")
+                save_path = os.path.join(self.config.SCREENSHOTS_DIR, filename)
+
+            # Add screenshot to test result; encoding and storage happen off this thread
+            self.test_result.add_screenshot(screenshot_data, filename, test_case_name, save_path)
 
             return filename
         except Exception as e:
             print(f"Error taking screenshot: {str(e)}")
             return None
 
+    def start_stage(self, name):
+        """
+        Start a test case and attribute everything recorded from now on to it
+
+        Args:
+            name (str): Name of the test case
+
+        Returns:
+            TestCase: The created test case
+        """
+        self.check_memory_budget()
+
+        if self.network_recorder:
+            # Requests still buffered belong to whatever ran before this stage
+            self.network_recorder.drain(self.driver)
+            self.network_recorder.set_stage(name)
+
+        if self.screencast:
+            # Frames recorded between stages are not kept
+            self.screencast.take_frames()
+
+        self.current_stage = name
+        return self.test_result.start_test_case(name)
+
+    def end_stage(self, name, passed=True, error_message=None):
+        """
+        End a test case, attaching the measurements recorded while it ran
+
+        Args:
+            name (str): Name of the test case
+            passed (bool): Whether the test case passed
+            error_message (str, optional): Error message if the test case failed
+
+        Returns:
+            dict: Details of the test case
+        """
+        if passed and self.memory_watchdog and self.memory_watchdog.exceeded:
+            passed = False
+            error_message = self.memory_watchdog.message
+
+        self.record_performance_sample("stage_end")
+
+        test_case = self.test_result.test_cases.get(name)
+        if self.network_recorder and test_case:
+            try:
+                self.network_recorder.drain(self.driver)
+                test_case.set_network_summary(self.network_recorder.summarize(stage=name))
+            except Exception as e:
+                print(f"Warning: Could not summarize network traffic for {name}: {str(e)}")
+
+        if self.screencast and test_case:
+            frames = self.screencast.take_frames()
+            if frames:
+                self.test_result.add_recording(frames, name)
+
+        return self.test_result.end_test_case(name, passed=passed, error_message=error_message)
+
+    def record_performance_sample(self, label):
+        """
+        Collect a web performance sample and attach it to the current test case
+
+        Args:
+            label (str): What triggered the sample (e.g. 'page_load' or 'stage_end')
+        """
+        if not self.config.COLLECT_PERF_METRICS or not self.driver:
+            return None
+
+        test_case = self.test_result.test_cases.get(self.current_stage) if self.current_stage else None
+        if not test_case:
+            return None
+
+        try:
+            sample = collect_page_metrics(self.driver, label)
+            test_case.add_performance_sample(sample)
+            return sample
+        except Exception as e:
+            print(f"Warning: Could not collect performance metrics: {str(e)}")
+            return None
+
+    def finish_network_capture(self):
+        """Write the HAR file for this run and attach the overall network aggregates"""
+        if not self.network_recorder:
+            return None
+
+        try:
+            self.network_recorder.drain(self.driver)
+            har_file = os.path.join(self.config.NETWORK_CAPTURE_DIR, f"{self.test_result.test_id}.har")
+            self.network_recorder.save_har(har_file)
+            print(f"Network capture saved to: {har_file}")
+
+            summary = self.network_recorder.summarize()
+            summary['har_file'] = har_file
+            self.test_result.network_capture = summary
+            return har_file
+        except Exception as e:
+            print(f"Warning: Could not save network capture: {str(e)}")
+            return None
+
     def element_exists(self, by, value, timeout=5):
         """Check if an element exists on the page"""
         try:
@@ -196,6 +447,60 @@ class VerixAIAutomation:
         except TimeoutException:
             return False
 
+    def apply_dom_actions(self, actions):
+        """
+        Apply a batch of DOM mutations and field values in one script call
+
+        An action counts as not applied when its target element was not found,
+        when the script raised on it, or when a field reads back a different
+        value than the one set (e.g. a React component reverted it).
+
+        Args:
+            actions (list): Action dicts built with utils.dom_utils helpers
+
+        Returns:
+            list: Indexes of the actions that were not applied
+        """
+        results = apply_dom_actions(self.driver, actions)
+        failed = []
+        for result in results:
+            index = result.get('index')
+            action = actions[index]
+            if not result.get('found'):
+                failed.append(index)
+            elif result.get('error'):
+                print(f"DOM action {index} failed: {result.get('error')}")
+                failed.append(index)
+            elif 'value' in action and result.get('value') != str(action['value']):
+                print(f"DOM action {index} set {action['value']!r} but the field reads {result.get('value')!r}")
+                failed.append(index)
+        return failed
+
+    def fill_fields(self, values):
+        """
+        Fill form fields by ID in a single script call
+
+        Fields the batched call could not fill are cleared and filled one by one
+        with send_keys, so the form is never left half-filled.
+
+        Args:
+            values (dict): Mapping of element ID to value
+
+        Raises:
+            Exception: If a field still does not hold its value after send_keys
+        """
+        field_ids = list(values.keys())
+        failed = self.apply_dom_actions([fill_action(values[field_id], element_id=field_id) for field_id in field_ids])
+
+        for index in failed:
+            field_id = field_ids[index]
+            print(f"Field '{field_id}' not filled by batched fill, falling back to send_keys")
+            field = self.driver.find_element(By.ID, field_id)
+            field.clear()
+            field.send_keys(values[field_id])
+            if field.get_attribute("value") != str(values[field_id]):
+                raise Exception(f"Could not fill field '{field_id}'")
+
     def wait_for_page_load(self, timeout=30):
         """Wait for the page to fully load"""
         try:
@@ -209,14 +514,203 @@ class VerixAIAutomation:
             time.sleep(2)
 
             print("Page fully loaded")
+            self.record_performance_sample("page_load")
             return True
         except TimeoutException:
             print(f"Warning: Page load timed out after {timeout} seconds")
             return False
 
 
+    def wait_for_upload_completion(self, measurement):
+        """
+        Poll the upload popup until the UI shows the upload as complete
+
+        When the popup never shows any progress, the wait gives up after
+        UPLOAD_FALLBACK_WAIT seconds, like the fixed wait it replaces.
+
+        Args:
+            measurement (UploadMeasurement): Measurement to record per-file progress in
+
+        Returns:
+            bool: True if completion was detected
+        """
+        start = time.monotonic()
+        seen_progress = False
+        while True:
+            try:
+                progress = self.driver.execute_script(UPLOAD_PROGRESS_SCRIPT, "file-upload-popup")
+            except Exception as e:
+                print(f"Could not read upload progress: {str(e)}")
+                return False
+
+            if progress:
+                if measurement.update(progress):
+                    measurement.mark_completed()
+                    print(f"Upload completed after {measurement.elapsed():.1f} seconds")
+                    return True
+                if progress.get('files') or progress.get('uploading'):
+                    seen_progress = True
+                elif seen_progress and not progress.get('visible'):
+                    # The popup closed itself after showing progress
+                    measurement.mark_completed()
+                    print(f"Upload popup closed after {measurement.elapsed():.1f} seconds")
+                    return True
+
+            waited = time.monotonic() - start
+            if waited >= self.config.UPLOAD_COMPLETION_TIMEOUT:
+                print(f"Warning: Upload did not complete within {self.config.UPLOAD_COMPLETION_TIMEOUT:.0f} seconds")
+                return False
+            if not seen_progress and waited >= self.config.UPLOAD_FALLBACK_WAIT:
+                print("Upload popup shows no progress, assuming the upload finished")
+                return False
+            time.sleep(self.config.UPLOAD_POLL_INTERVAL)
+
+    def record_upload(self, measurement, success, completion_detected=False):
+        """
+        Finish an upload measurement and attach it to the current test case
+
+        Args:
+            measurement (UploadMeasurement): The measurement
+            success (bool): Whether the upload succeeded
+            completion_detected (bool): Whether the UI showed completion
+        """
+        measurement.finish(success, completion_detected)
+        metrics = measurement.get_details()
+        print(f"Upload metrics: {metrics['file_count']} files, {metrics['total_bytes']} bytes "
+              f"in {metrics['elapsed_seconds']} s ({metrics['mb_per_second']} MB/s, {metrics['files_per_second']} files/s)")
+
+        test_case = self.test_result.test_cases.get(self.current_stage) if self.current_stage else None
+        if test_case:
+            test_case.add_upload_metrics(metrics)
+        return metrics
+
+    def get_upload_url(self, category):
+        """
+        Build the upload endpoint URL for the case currently open in the browser
+
+        Args:
+            category (str): Document category, 'notes' or 'imaging'
+
+        Returns:
+            str: Upload URL
+        """
+        match = re.search(self.config.CASE_ID_URL_PATTERN, self.driver.current_url)
+        if not match:
+            raise Exception(f"Could not find the case ID in the current URL: {self.driver.current_url}")
+        case_id = match.group(1)
+
+        base_url = self.config.UPLOAD_API_BASE_URL
+        if not base_url:
+            parsed = urlparse(self.config.BASE_URL)
+            base_url = f"{parsed.scheme}://{parsed.netloc}"
+        path = self.config.UPLOAD_API_PATH.format(case_id=case_id, category=category)
+        return base_url.rstrip('/') + '/' + path.lstrip('/')
+
+    def get_upload_headers(self):
+        """Get the Authorization header from the browser's storage, if configured"""
+        key = self.config.UPLOAD_AUTH_TOKEN_STORAGE_KEY
+        if not key:
+            return {}
+        token = self.driver.execute_script(
+            "return window.localStorage.getItem(arguments[0]) || window.sessionStorage.getItem(arguments[0]);", key)
+        if not token:
+            print(f"Warning: No auth token found in browser storage under '{key}'")
+            return {}
+        return {'Authorization': token if token.lower().startswith('bearer ') else f"Bearer {token}"}
+
+    def upload_via_http(self, path, category):
+        """
+        Upload a file or folder straight to the upload endpoint with the browser's session
+
+        Args:
+            path (str): File or folder path
+            category (str): Document category, 'notes' or 'imaging'
+
+        Returns:
+            dict: Upload throughput details
+        """
+        upload_url = self.get_upload_url(category)
+        print(f"Uploading {path} to {upload_url} with {self.config.UPLOAD_PARALLELISM} parallel connections")
+        uploader = BulkUploader(
+            upload_url,
+            cookies=self.driver.get_cookies(),
+            headers=self.get_upload_headers(),
+            parallelism=self.config.UPLOAD_PARALLELISM,
+            field_name=self.config.UPLOAD_FILE_FIELD,
+            timeout=self.config.UPLOAD_COMPLETION_TIMEOUT
+        )
+        try:
+            metrics = uploader.upload(path)
+        finally:
+            uploader.close()
+
+        print(f"Upload metrics: {metrics['file_count']} files, {metrics['total_bytes']} bytes "
+              f"in {metrics['elapsed_seconds']} s ({metrics['mb_per_second']} MB/s, {metrics['files_per_second']} files/s)")
+        for error in metrics['errors']:
+            print(f"Upload of {error['name']} failed: {error['status']} {error['error']}")
+
+        test_case = self.test_result.test_cases.get(self.current_stage) if self.current_stage else None
+        if test_case:
+            test_case.add_upload_metrics(metrics)
+        return metrics
+
+    def upload_stage_via_http(self, stage_name, category, tab_selector, panel_id, paths):
+        """
+        Run an upload stage over HTTP and check that the documents appear in the UI
+
+        Args:
+            stage_name (str): Name of the test case for screenshots
+            category (str): Document category, 'notes' or 'imaging'
+            tab_selector (str): CSS selector of the tab showing the panel
+            panel_id (str): ID of the panel listing the documents
+            paths (list): Files and folders to upload
+        """
+        uploaded = 0
+        for path in paths:
+            if not os.path.exists(path):
+                print(f"Warning: Upload path does not exist: {path}")
+                continue
+            metrics = self.upload_via_http(path, category)
+            if not metrics['success']:
+                raise Exception(f"{len(metrics['failed_files'])} of {metrics['file_count']} files "
+                                f"failed to upload from {os.path.basename(path)}")
+            uploaded += metrics['file_count']
+        if not uploaded:
+            raise Exception(f"No files were uploaded for {stage_name}")
+
+        # The UI only learns about the new documents on reload
+        self.driver.refresh()
+        self.wait_for_page_load()
+        tab = self.wait.until(EC.element_to_be_clickable((By.CSS_SELECTOR, tab_selector)))
+        self.driver.execute_script("arguments[0].click();", tab)
+        self.wait.until(EC.visibility_of_element_located((By.ID, panel_id)))
+
+        # Processing may lag behind the upload, so wait for the documents to be listed. The panel
+        # may group folders into one item, so also stop once the count has settled
+        selector = f"#{panel_id} .document-item"
+        deadline = time.monotonic() + self.config.UPLOAD_COMPLETION_TIMEOUT
+        count = 0
+        settled_since = time.monotonic()
+        while time.monotonic() < deadline:
+            latest = len(self.driver.find_elements(By.CSS_SELECTOR, selector))
+            if latest != count:
+                count = latest
+                settled_since = time.monotonic()
+            if count >= uploaded or (count and time.monotonic() - settled_since >= self.config.UPLOAD_FALLBACK_WAIT):
+                break
+            time.sleep(self.config.UPLOAD_POLL_INTERVAL)
+
+        if count:
+            print(f"{count} documents visible after uploading {uploaded} files")
+            self.take_screenshot(f"{category}_documents_visible", stage_name)
+        else:
+            print(f"Warning: Could not verify documents in the {panel_id} panel")
+            self.take_screenshot(f"{category}_verification_warning", stage_name)
+
     def handle_upload(self, file_path, upload_type="file"):
         """Handle file or folder upload in the upload popup"""
+        measurement = UploadMeasurement(file_path, upload_type)
+        completion_detected = False
         try:
             # Wait for the file upload dialog to be visible
             print(f"Waiting for file upload dialog to handle {upload_type} upload")
@@ -264,20 +758,18 @@ class VerixAIAutomation:
             # Make sure the element is visible and enabled
             if not file_input.is_displayed() or not file_input.is_enabled():
                 print(f"Warning: {upload_type} input element may not be visible or enabled")
-                # Try to make it visible with JavaScript if needed
-                self.driver.execute_script("arguments[0].style.display = 'block';", file_input)
-                self.driver.execute_script("arguments[0].disabled = false;", file_input)
-                self.driver.execute_script("arguments[0].removeAttribute('hidden');", file_input)
-                # For folder upload, ensure webkitdirectory attribute is set
+                # Try to make it visible with JavaScript if needed, in a single script call.
+                # For folder upload, also ensure the directory attributes are set
+                directory_attrs = None
                 if upload_type == "folder":
-                    self.driver.execute_script("arguments[0].setAttribute('webkitdirectory', '');", file_input)
-                    self.driver.execute_script("arguments[0].setAttribute('directory', '');", file_input)
-                    self.driver.execute_script("arguments[0].setAttribute('mozdirectory', '');", file_input)
+                    directory_attrs = {'webkitdirectory': '', 'directory': '', 'mozdirectory': ''}
+                self.apply_dom_actions([unhide_action(element=file_input, set_attrs=directory_attrs)])
 
             # Send the file path to the input element
             print(f"Sending path: {file_path} to input element")
             file_input.send_keys(file_path)
             time.sleep(3)  # Give more time for the file/folder to be selected
+            measurement.mark_selected()
 
             # Take a screenshot after selecting the file/folder
             self.take_screenshot(f"after_{upload_type}_selection")
@@ -299,7 +791,7 @@ class VerixAIAutomation:
 
             # Wait for upload to complete
             print("Waiting for upload to complete")
-            time.sleep(20)  # Increased wait time for larger folders
+            completion_detected = self.wait_for_upload_completion(measurement)
 
             # Take a screenshot after upload
             self.take_screenshot(f"after_{upload_type}_upload")
@@ -398,6 +890,7 @@ class VerixAIAutomation:
                 except:
                     print("No alert present during popup check")
 
+            self.record_upload(measurement, True, completion_detected)
             return True
         except Exception as e:
             print(f"Error during {upload_type} upload: {str(e)}")
@@ -416,6 +909,7 @@ class VerixAIAutomation:
                     print("Alert accepted, uploads will continue in background")
                     # Since we handled the alert, consider this a success
                     time.sleep(2)
+                    self.record_upload(measurement, True, completion_detected)
                     return True
                 else:
                     # For any other alert, also accept it
@@ -426,6 +920,7 @@ class VerixAIAutomation:
                 print("No alert present during upload error")
 
             self.take_screenshot(f"{upload_type}_upload_error")
+            self.record_upload(measurement, False, completion_detected)
             return False
 
     def close_side_panel(self):
@@ -482,7 +977,7 @@ class VerixAIAutomation:
             print("Case Details:", case_details)
 
             # Start Login Test Case
-            self.test_result.start_test_case("Login")
+            self.start_stage("Login")
             try:
                 # Navigate to the login page
                 print(f"Navigating to {self.config.BASE_URL}")
@@ -532,16 +1027,16 @@ class VerixAIAutomation:
                 print("Login successful!")
 
                 # Mark login test case as passed
-                self.test_result.end_test_case("Login", passed=True)
+                self.end_stage("Login", passed=True)
             except Exception as e:
                 error_message = f"Login failed: {str(e)}"
                 print(error_message)
                 self.take_screenshot("login_error", "Login")
-                self.test_result.end_test_case("Login", passed=False, error_message=error_message)
+                self.end_stage("Login", passed=False, error_message=error_message)
                 raise
 
             # Start Case Creation Test Case
-            self.test_result.start_test_case("Case Creation")
+            self.start_stage("Case Creation")
             try:
 
 
@@ -553,11 +1048,14 @@ class VerixAIAutomation:
                 new_case_button.click()
                 self.take_screenshot("new_case_form", "Case Creation")
 
-                # Fill in case details
-                self.wait.until(EC.visibility_of_element_located((By.ID, "title"))).send_keys(case_details["title"])
-                self.driver.find_element(By.ID, "plaintiff_name").send_keys(case_details["plaintiff_name"])
-                self.driver.find_element(By.ID, "medical_provider").send_keys(case_details["medical_provider"])
-                self.driver.find_element(By.ID, "description").send_keys(case_details["description"])
+                # Fill in case details in one batched script call
+                self.wait.until(EC.visibility_of_element_located((By.ID, "title")))
+                self.fill_fields({
+                    "title": case_details["title"],
+                    "plaintiff_name": case_details["plaintiff_name"],
+                    "medical_provider": case_details["medical_provider"],
+                    "description": case_details["description"]
+                })
                 self.take_screenshot("case_details_filled", "Case Creation")
 
                 self.wait.until(EC.element_to_be_clickable((By.ID, "new-case-submit"))).click()
@@ -573,96 +1071,100 @@ class VerixAIAutomation:
                 self.wait.until(EC.visibility_of_element_located((By.CSS_SELECTOR, "button#tab-notes")))
 
                 # Mark case creation test case as passed
-                self.test_result.end_test_case("Case Creation", passed=True)
+                self.end_stage("Case Creation", passed=True)
             except Exception as e:
                 error_message = f"Case creation failed: {str(e)}"
                 print(error_message)
                 self.take_screenshot("case_creation_error", "Case Creation")
-                self.test_result.end_test_case("Case Creation", passed=False, error_message=error_message)
+                self.end_stage("Case Creation", passed=False, error_message=error_message)
                 raise
 
             # Make sure we're on the case details page
             print("Making sure we're on the case details page")
 
             # Start Clinical Notes Upload Test Case
-            self.test_result.start_test_case("Clinical Notes Upload")
+            self.start_stage("Clinical Notes Upload")
             try:
-                # Upload Clinical Notes
-                print("Navigating to Clinical Notes tab")
-                notes_tab = self.wait.until(EC.element_to_be_clickable((By.CSS_SELECTOR, "button#tab-notes")))
-                self.driver.execute_script("arguments[0].click();", notes_tab)
-                self.take_screenshot("clinical_notes_tab", "Clinical Notes Upload")
-
-                # Wait for the clinical notes panel to be visible
-                self.wait.until(EC.visibility_of_element_located((By.ID, "clinical-notes-panel")))
-
-                # Find the upload button in the clinical notes panel
-                upload_button = self.wait.until(EC.element_to_be_clickable(
-                    (By.XPATH, '//div[@id="clinical-notes-panel"]//button[contains(text(), "Upload")]')))
-                self.driver.execute_script("arguments[0].click();", upload_button)
-                self.take_screenshot("clinical_notes_upload_button", "Clinical Notes Upload")
-
-                # Test folder upload for Clinical Notes
-                print("Testing folder upload for Clinical Notes")
-                print(f"Using folder path: {self.notes_folder_path}")
-                folder_upload_success = self.handle_upload(self.notes_folder_path, "folder")
-                self.take_screenshot("after_folder_upload_attempt", "Clinical Notes Upload")
-
-                if folder_upload_success:
-                    print("Successfully uploaded folder to Clinical Notes")
-
-                    # Now try file upload
+                if self.upload_mode == "http":
+                    self.upload_stage_via_http("Clinical Notes Upload", "notes", "button#tab-notes", "clinical-notes-panel",
+                                               [self.notes_folder_path, self.notes_file_path])
+                else:
+                    # Upload Clinical Notes
+                    print("Navigating to Clinical Notes tab")
+                    notes_tab = self.wait.until(EC.element_to_be_clickable((By.CSS_SELECTOR, "button#tab-notes")))
+                    self.driver.execute_script("arguments[0].click();", notes_tab)
+                    self.take_screenshot("clinical_notes_tab", "Clinical Notes Upload")
+
+                    # Wait for the clinical notes panel to be visible
+                    self.wait.until(EC.visibility_of_element_located((By.ID, "clinical-notes-panel")))
+
+                    # Find the upload button in the clinical notes panel
                     upload_button = self.wait.until(EC.element_to_be_clickable(
                         (By.XPATH, '//div[@id="clinical-notes-panel"]//button[contains(text(), "Upload")]')))
                     self.driver.execute_script("arguments[0].click();", upload_button)
-                    time.sleep(2)
+                    self.take_screenshot("clinical_notes_upload_button", "Clinical Notes Upload")
 
-                    print("Testing file upload for Clinical Notes")
-                    print(f"Using file path: {self.notes_file_path}")
-                    file_upload_success = self.handle_upload(self.notes_file_path, "file")
-                    self.take_screenshot("after_file_upload_attempt", "Clinical Notes Upload")
+                    # Test folder upload for Clinical Notes
+                    print("Testing folder upload for Clinical Notes")
+                    print(f"Using folder path: {self.notes_folder_path}")
+                    folder_upload_success = self.handle_upload(self.notes_folder_path, "folder")
+                    self.take_screenshot("after_folder_upload_attempt", "Clinical Notes Upload")
 
-                    if file_upload_success:
-                        print("Successfully uploaded file to Clinical Notes")
-                    else:
-                        print("Failed to upload file to Clinical Notes")
-                        # We don't fail the test case here since folder upload succeeded
-                else:
-                    print("Failed to upload folder to Clinical Notes, trying file upload instead")
+                    if folder_upload_success:
+                        print("Successfully uploaded folder to Clinical Notes")
 
-                    # Try file upload as fallback
-                    if self.element_exists(By.XPATH, '//div[@id="clinical-notes-panel"]//button[contains(text(), "Upload")]'):
+                        # Now try file upload
                         upload_button = self.wait.until(EC.element_to_be_clickable(
                             (By.XPATH, '//div[@id="clinical-notes-panel"]//button[contains(text(), "Upload")]')))
                         self.driver.execute_script("arguments[0].click();", upload_button)
                         time.sleep(2)
 
-                    print(f"Using file path: {self.notes_file_path}")
-                    file_upload_success = self.handle_upload(self.notes_file_path, "file")
-                    self.take_screenshot("after_fallback_file_upload", "Clinical Notes Upload")
+                        print("Testing file upload for Clinical Notes")
+                        print(f"Using file path: {self.notes_file_path}")
+                        file_upload_success = self.handle_upload(self.notes_file_path, "file")
+                        self.take_screenshot("after_file_upload_attempt", "Clinical Notes Upload")
 
-                    if file_upload_success:
-                        print("Successfully uploaded file to Clinical Notes as fallback")
+                        if file_upload_success:
+                            print("Successfully uploaded file to Clinical Notes")
+                        else:
+                            print("Failed to upload file to Clinical Notes")
+                            # We don't fail the test case here since folder upload succeeded
                     else:
-                        print("Failed to upload file to Clinical Notes as fallback")
-                        # Both folder and file upload failed, mark test case as failed
-                        raise Exception("Both folder and file upload failed for Clinical Notes")
+                        print("Failed to upload folder to Clinical Notes, trying file upload instead")
 
-                # Verify uploads by checking for documents in the panel
-                try:
-                    self.wait.until(EC.visibility_of_element_located((By.CSS_SELECTOR, "#clinical-notes-panel .document-item")))
-                    self.take_screenshot("clinical_notes_documents_visible", "Clinical Notes Upload")
-                except TimeoutException:
-                    print("Warning: Could not verify documents in Clinical Notes panel")
-                    self.take_screenshot("clinical_notes_verification_warning", "Clinical Notes Upload")
+                        # Try file upload as fallback
+                        if self.element_exists(By.XPATH, '//div[@id="clinical-notes-panel"]//button[contains(text(), "Upload")]'):
+                            upload_button = self.wait.until(EC.element_to_be_clickable(
+                                (By.XPATH, '//div[@id="clinical-notes-panel"]//button[contains(text(), "Upload")]')))
+                            self.driver.execute_script("arguments[0].click();", upload_button)
+                            time.sleep(2)
+
+                        print(f"Using file path: {self.notes_file_path}")
+                        file_upload_success = self.handle_upload(self.notes_file_path, "file")
+                        self.take_screenshot("after_fallback_file_upload", "Clinical Notes Upload")
+
+                        if file_upload_success:
+                            print("Successfully uploaded file to Clinical Notes as fallback")
+                        else:
+                            print("Failed to upload file to Clinical Notes as fallback")
+                            # Both folder and file upload failed, mark test case as failed
+                            raise Exception("Both folder and file upload failed for Clinical Notes")
+
+                    # Verify uploads by checking for documents in the panel
+                    try:
+                        self.wait.until(EC.visibility_of_element_located((By.CSS_SELECTOR, "#clinical-notes-panel .document-item")))
+                        self.take_screenshot("clinical_notes_documents_visible", "Clinical Notes Upload")
+                    except TimeoutException:
+                        print("Warning: Could not verify documents in Clinical Notes panel")
+                        self.take_screenshot("clinical_notes_verification_warning", "Clinical Notes Upload")
 
                 # Mark test case as passed
-                self.test_result.end_test_case("Clinical Notes Upload", passed=True)
+                self.end_stage("Clinical Notes Upload", passed=True)
             except Exception as e:
                 error_message = f"Clinical Notes upload failed: {str(e)}"
                 print(error_message)
                 self.take_screenshot("clinical_notes_upload_error", "Clinical Notes Upload")
-                self.test_result.end_test_case("Clinical Notes Upload", passed=False, error_message=error_message)
+                self.end_stage("Clinical Notes Upload", passed=False, error_message=error_message)
                 # Continue with other test cases instead of raising the exception
                 print("Continuing with other test cases despite Clinical Notes upload failure")
 
@@ -671,84 +1173,88 @@ class VerixAIAutomation:
             time.sleep(2)
 
             # Start Medical Imaging Upload Test Case
-            self.test_result.start_test_case("Medical Imaging Upload")
+            self.start_stage("Medical Imaging Upload")
             try:
-                # Upload Medical Imaging
-                print("Navigating to Medical Imaging tab")
-                imaging_tab = self.wait.until(EC.element_to_be_clickable((By.CSS_SELECTOR, "button#tab-imaging")))
-                self.driver.execute_script("arguments[0].click();", imaging_tab)
-                self.take_screenshot("medical_imaging_tab", "Medical Imaging Upload")
-
-                # Wait for the medical imaging panel to be visible
-                self.wait.until(EC.visibility_of_element_located((By.ID, "medical-imaging-panel")))
-
-                # Find the upload button in the medical imaging panel
-                upload_button = self.wait.until(EC.element_to_be_clickable(
-                    (By.XPATH, '//div[@id="medical-imaging-panel"]//button[contains(text(), "Upload")]')))
-                self.driver.execute_script("arguments[0].click();", upload_button)
-                self.take_screenshot("medical_imaging_upload_button", "Medical Imaging Upload")
-
-                # Test folder upload for Medical Imaging
-                print("Testing folder upload for Medical Imaging")
-                print(f"Using folder path: {self.imaging_folder_path}")
-                folder_upload_success = self.handle_upload(self.imaging_folder_path, "folder")
-                self.take_screenshot("after_imaging_folder_upload", "Medical Imaging Upload")
-
-                if folder_upload_success:
-                    print("Successfully uploaded folder to Medical Imaging")
-
-                    # Now try file upload
+                if self.upload_mode == "http":
+                    self.upload_stage_via_http("Medical Imaging Upload", "imaging", "button#tab-imaging", "medical-imaging-panel",
+                                               [self.imaging_folder_path, self.imaging_file_path])
+                else:
+                    # Upload Medical Imaging
+                    print("Navigating to Medical Imaging tab")
+                    imaging_tab = self.wait.until(EC.element_to_be_clickable((By.CSS_SELECTOR, "button#tab-imaging")))
+                    self.driver.execute_script("arguments[0].click();", imaging_tab)
+                    self.take_screenshot("medical_imaging_tab", "Medical Imaging Upload")
+
+                    # Wait for the medical imaging panel to be visible
+                    self.wait.until(EC.visibility_of_element_located((By.ID, "medical-imaging-panel")))
+
+                    # Find the upload button in the medical imaging panel
                     upload_button = self.wait.until(EC.element_to_be_clickable(
                         (By.XPATH, '//div[@id="medical-imaging-panel"]//button[contains(text(), "Upload")]')))
                     self.driver.execute_script("arguments[0].click();", upload_button)
-                    time.sleep(2)
+                    self.take_screenshot("medical_imaging_upload_button", "Medical Imaging Upload")
 
-                    print("Testing file upload for Medical Imaging")
-                    print(f"Using file path: {self.imaging_file_path}")
-                    file_upload_success = self.handle_upload(self.imaging_file_path, "file")
-                    self.take_screenshot("after_imaging_file_upload", "Medical Imaging Upload")
+                    # Test folder upload for Medical Imaging
+                    print("Testing folder upload for Medical Imaging")
+                    print(f"Using folder path: {self.imaging_folder_path}")
+                    folder_upload_success = self.handle_upload(self.imaging_folder_path, "folder")
+                    self.take_screenshot("after_imaging_folder_upload", "Medical Imaging Upload")
 
-                    if file_upload_success:
-                        print("Successfully uploaded file to Medical Imaging")
-                    else:
-                        print("Failed to upload file to Medical Imaging")
-                        # We don't fail the test case here since folder upload succeeded
-                else:
-                    print("Failed to upload folder to Medical Imaging, trying file upload instead")
+                    if folder_upload_success:
+                        print("Successfully uploaded folder to Medical Imaging")
 
-                    # Try file upload as fallback
-                    if self.element_exists(By.XPATH, '//div[@id="medical-imaging-panel"]//button[contains(text(), "Upload")]'):
+                        # Now try file upload
                         upload_button = self.wait.until(EC.element_to_be_clickable(
                             (By.XPATH, '//div[@id="medical-imaging-panel"]//button[contains(text(), "Upload")]')))
                         self.driver.execute_script("arguments[0].click();", upload_button)
                         time.sleep(2)
 
-                    print(f"Using file path: {self.imaging_file_path}")
-                    file_upload_success = self.handle_upload(self.imaging_file_path, "file")
-                    self.take_screenshot("after_imaging_fallback_file_upload", "Medical Imaging Upload")
+                        print("Testing file upload for Medical Imaging")
+                        print(f"Using file path: {self.imaging_file_path}")
+                        file_upload_success = self.handle_upload(self.imaging_file_path, "file")
+                        self.take_screenshot("after_imaging_file_upload", "Medical Imaging Upload")
 
-                    if file_upload_success:
-                        print("Successfully uploaded file to Medical Imaging as fallback")
+                        if file_upload_success:
+                            print("Successfully uploaded file to Medical Imaging")
+                        else:
+                            print("Failed to upload file to Medical Imaging")
+                            # We don't fail the test case here since folder upload succeeded
                     else:
-                        print("Failed to upload file to Medical Imaging as fallback")
-                        # Both folder and file upload failed, mark test case as failed
-                        raise Exception("Both folder and file upload failed for Medical Imaging")
+                        print("Failed to upload folder to Medical Imaging, trying file upload instead")
 
-                # Verify uploads by checking for documents in the panel
-                try:
-                    self.wait.until(EC.visibility_of_element_located((By.CSS_SELECTOR, "#medical-imaging-panel .document-item")))
-                    self.take_screenshot("medical_imaging_documents_visible", "Medical Imaging Upload")
-                except TimeoutException:
-                    print("Warning: Could not verify documents in Medical Imaging panel")
-                    self.take_screenshot("medical_imaging_verification_warning", "Medical Imaging Upload")
+                        # Try file upload as fallback
+                        if self.element_exists(By.XPATH, '//div[@id="medical-imaging-panel"]//button[contains(text(), "Upload")]'):
+                            upload_button = self.wait.until(EC.element_to_be_clickable(
+                                (By.XPATH, '//div[@id="medical-imaging-panel"]//button[contains(text(), "Upload")]')))
+                            self.driver.execute_script("arguments[0].click();", upload_button)
+                            time.sleep(2)
+
+                        print(f"Using file path: {self.imaging_file_path}")
+                        file_upload_success = self.handle_upload(self.imaging_file_path, "file")
+                        self.take_screenshot("after_imaging_fallback_file_upload", "Medical Imaging Upload")
+
+                        if file_upload_success:
+                            print("Successfully uploaded file to Medical Imaging as fallback")
+                        else:
+                            print("Failed to upload file to Medical Imaging as fallback")
+                            # Both folder and file upload failed, mark test case as failed
+                            raise Exception("Both folder and file upload failed for Medical Imaging")
+
+                    # Verify uploads by checking for documents in the panel
+                    try:
+                        self.wait.until(EC.visibility_of_element_located((By.CSS_SELECTOR, "#medical-imaging-panel .document-item")))
+                        self.take_screenshot("medical_imaging_documents_visible", "Medical Imaging Upload")
+                    except TimeoutException:
+                        print("Warning: Could not verify documents in Medical Imaging panel")
+                        self.take_screenshot("medical_imaging_verification_warning", "Medical Imaging Upload")
 
                 # Mark test case as passed
-                self.test_result.end_test_case("Medical Imaging Upload", passed=True)
+                self.end_stage("Medical Imaging Upload", passed=True)
             except Exception as e:
                 error_message = f"Medical Imaging upload failed: {str(e)}"
                 print(error_message)
                 self.take_screenshot("medical_imaging_upload_error", "Medical Imaging Upload")
-                self.test_result.end_test_case("Medical Imaging Upload", passed=False, error_message=error_message)
+                self.end_stage("Medical Imaging Upload", passed=False, error_message=error_message)
                 # Continue with other test cases instead of raising the exception
                 print("Continuing with other test cases despite Medical Imaging upload failure")
 
@@ -758,7 +1264,7 @@ class VerixAIAutomation:
 
 
             # Start Medical Chronology Test Case
-            self.test_result.start_test_case("Medical Chronology")
+            self.start_stage("Medical Chronology")
             try:
                 # Medical Chronology Automation - using a more direct approach to find the tab faster
                 print("Looking for chronology tab with optimized approach")
@@ -773,7 +1279,7 @@ class VerixAIAutomation:
                 error_message = f"Error during Medical Chronology tab lookup: {str(e)}"
                 print(error_message)
                 self.take_screenshot("medical_chronology_tab_lookup_error", "Medical Chronology")
-                self.test_result.end_test_case("Medical Chronology", passed=False, error_message=error_message)
+                self.end_stage("Medical Chronology", passed=False, error_message=error_message)
                 # Continue with other test cases instead of raising the exception
                 print("Continuing with other test cases despite Medical Chronology tab lookup failure")
 
@@ -955,12 +1461,16 @@ class VerixAIAutomation:
                 print("Successfully created medical chronology")
 
                 # Mark Medical Chronology test case as passed
-                self.test_result.end_test_case("Medical Chronology", passed=True)
+                self.end_stage("Medical Chronology", passed=True)
             except Exception as e:
                 error_message = f"Error during chronology creation: {str(e)}"
                 print(error_message)
                 self.take_screenshot("chronology_creation_error", "Medical Chronology")
-                self.test_result.end_test_case("Medical Chronology", passed=False, error_message=error_message)
+                self.end_stage("Medical Chronology", passed=False, error_message=error_message)
+
+            self.finish_network_capture()
+            self.check_memory_budget()
+            self.stop_memory_watchdog()
 
             # Mark test as passed (this will also send the email)
             details = self.test_result.mark_passed()
@@ -968,16 +1478,25 @@ class VerixAIAutomation:
 
         except Exception as e:
             error_message = f"Error during automation: {str(e)}\n{traceback.format_exc()}"
+            if self.memory_watchdog and self.memory_watchdog.exceeded:
+                error_message = self.memory_watchdog.message
             print(error_message)
 
             # Take a final error screenshot
             self.take_screenshot("final_error", "Overall Test")
 
+            self.finish_network_capture()
+            self.stop_memory_watchdog()
+
             # Mark test as failed (this will also send the email)
             details = self.test_result.mark_failed(error_message)
             return details
 
         finally:
+            if self.memory_watchdog:
+                self.memory_watchdog.stop()
+            self.stop_screencast()
+
             # Always quit the driver to clean up resources
             if self.driver:
                 try:
@@ -12,6 +12,28 @@ except Exception as e:
 # Detect environment
 APP_ENV = os.getenv("APP_ENV", "dev").lower()
 
+
+def parse_stage_budgets(value):
+    """
+    Parse stage time budgets
+
+    Args:
+        value (str): Comma-separated 'Stage Name=seconds' pairs, e.g. 'Login=8,Medical Chronology=90'
+
+    Returns:
+        dict: Stage name -> budget in seconds
+    """
+    budgets = {}
+    for item in value.split(','):
+        name, _, seconds = item.partition('=')
+        if not name.strip() or not seconds.strip():
+            continue
+        try:
+            budgets[name.strip()] = float(seconds)
+        except ValueError:
+            print(f"Warning: Invalid stage budget '{item.strip()}'. Skipping it.")
+    return budgets
+
 class BaseConfig:
     # Common to all environments
     AZURE_API_VERSION = os.getenv('AZURE_API_VERSION', '2024-08-01-preview')
@@ -34,9 +56,126 @@ class BaseConfig:
         DEFAULT_IMAGING_FILE_PATH = os.getenv('DEFAULT_IMAGING_FILE_PATH', './sample_data/sample_image.dcm')
         DEFAULT_IMAGING_FOLDER_PATH = os.getenv('DEFAULT_IMAGING_FOLDER_PATH', './sample_data/imaging_folder')
 
+    # Directory holding generated upload corpora (see utils/corpus_utils.py)
+    CORPUS_ROOT = os.getenv('CORPUS_ROOT', 'corpora')
+
+    # SQLite database indexing saved test results by test ID (see utils/result_utils.py)
+    RESULTS_DB_PATH = os.getenv('RESULTS_DB_PATH', os.path.join('test_results', 'results.db'))
+
+    # Stage regression detection: each passed stage is compared with the median and MAD of the
+    # same stage in the last REGRESSION_BASELINE_RUNS passing runs of the env. It is flagged when
+    # its robust z-score is above REGRESSION_Z_THRESHOLD and it is at least
+    # REGRESSION_MIN_SLOWDOWN_PERCENT slower than the median
+    REGRESSION_BASELINE_RUNS = int(os.getenv('REGRESSION_BASELINE_RUNS', 20))
+    REGRESSION_MIN_BASELINE_RUNS = int(os.getenv('REGRESSION_MIN_BASELINE_RUNS', 5))
+    REGRESSION_Z_THRESHOLD = float(os.getenv('REGRESSION_Z_THRESHOLD', 3.5))
+    REGRESSION_MIN_SLOWDOWN_PERCENT = float(os.getenv('REGRESSION_MIN_SLOWDOWN_PERCENT', 20))
+
+    # Finished runs stay in memory for RUN_REGISTRY_TTL_SECONDS, and at most RUN_REGISTRY_MAX_FINISHED
+    # of them; older ones are moved to the result store. RUN_CACHE_SIZE runs read back are cached
+    RUN_REGISTRY_TTL_SECONDS = float(os.getenv('RUN_REGISTRY_TTL_SECONDS', 3600))
+    RUN_REGISTRY_MAX_FINISHED = int(os.getenv('RUN_REGISTRY_MAX_FINISHED', 50))
+    RUN_CACHE_SIZE = int(os.getenv('RUN_CACHE_SIZE', 32))
+    # Append-only journal of run lifecycle events, replayed on startup to recover the runs of a
+    # previous process; compacted every RUN_JOURNAL_COMPACT_EVERY events
+    RUN_JOURNAL_PATH = os.getenv('RUN_JOURNAL_PATH', os.path.join('test_results', 'run_journal.jsonl'))
+    RUN_JOURNAL_COMPACT_EVERY = int(os.getenv('RUN_JOURNAL_COMPACT_EVERY', 1000))
+
+    # Emails are queued in a persistent outbox and sent by a background thread over a reused SMTP
+    # connection (closed after SMTP_IDLE_TIMEOUT seconds unused). Failed sends are retried up to
+    # EMAIL_MAX_ATTEMPTS times, waiting EMAIL_RETRY_BACKOFF_SECONDS and doubling each time
+    EMAIL_OUTBOX_PATH = os.getenv('EMAIL_OUTBOX_PATH', os.path.join('test_results', 'email_outbox.db'))
+    EMAIL_MAX_ATTEMPTS = int(os.getenv('EMAIL_MAX_ATTEMPTS', 6))
+    EMAIL_RETRY_BACKOFF_SECONDS = float(os.getenv('EMAIL_RETRY_BACKOFF_SECONDS', 30))
+    SMTP_IDLE_TIMEOUT = float(os.getenv('SMTP_IDLE_TIMEOUT', 60))
+    # Days the delivery status of a sent or failed email is kept (its bytes are dropped once it is done)
+    EMAIL_OUTBOX_RETENTION_DAYS = float(os.getenv('EMAIL_OUTBOX_RETENTION_DAYS', 30))
+    # Largest size of a result email in MB (0 for no limit). Screenshots that do not fit are downscaled
+    # into one contact-sheet image per test case, with the full-resolution images linked
+    EMAIL_SIZE_BUDGET_MB = float(os.getenv('EMAIL_SIZE_BUDGET_MB', 10))
+    # Public URL of this API, used for links to results and screenshots in emails (no links if unset)
+    PUBLIC_BASE_URL = os.getenv('PUBLIC_BASE_URL')
+
     # Selenium Configuration
     SCREENSHOTS_DIR = os.getenv('SCREENSHOTS_DIR', 'screenshots')
     SAVE_SCREENSHOTS_TO_DISK = os.getenv('SAVE_SCREENSHOTS_TO_DISK', 'False').lower() == 'true'
+    # Screenshots are kept in a content-addressed store under SCREENSHOTS_DIR/objects; this caps
+    # the screenshot bytes held in memory by the whole process
+    SCREENSHOT_MEMORY_CAP_MB = float(os.getenv('SCREENSHOT_MEMORY_CAP_MB', 64))
+    # Objects no run has written for this many days are deleted from the store (0 keeps everything)
+    SCREENSHOT_RETENTION_DAYS = float(os.getenv('SCREENSHOT_RETENTION_DAYS', 14))
+    # Screenshots are re-encoded and thumbnailed on background threads: format ('webp', 'jpeg'
+    # or 'png'; PNG is kept when Pillow is not installed), lossy quality and thumbnail width
+    SCREENSHOT_FORMAT = os.getenv('SCREENSHOT_FORMAT', 'webp').lower()
+    SCREENSHOT_QUALITY = int(os.getenv('SCREENSHOT_QUALITY', 80))
+    SCREENSHOT_THUMBNAIL_WIDTH = int(os.getenv('SCREENSHOT_THUMBNAIL_WIDTH', 320))
+    SCREENSHOT_WORKERS = int(os.getenv('SCREENSHOT_WORKERS', 2))
+    # Near-duplicate screenshots (perceptual hash within the threshold of the previous kept frame
+    # of the same test case): 'off' keeps them, 'drop' removes them, 'collapse' keeps the name
+    # but stores and attaches the image only once. Error and warning shots are always kept
+    SCREENSHOT_DEDUP_POLICY = os.getenv('SCREENSHOT_DEDUP_POLICY', 'collapse').lower()
+    SCREENSHOT_DEDUP_THRESHOLD = int(os.getenv('SCREENSHOT_DEDUP_THRESHOLD', 4))
+
+    # Screenshot mode: 'screenshots' takes full screenshots throughout; 'screencast' records each
+    # test case as an animated WebP from DevTools screencast frames (reduced size and frame rate)
+    # and only takes full screenshots of errors and warnings
+    SCREENSHOT_MODE = os.getenv('SCREENSHOT_MODE', 'screenshots').lower()
+    SCREENCAST_FPS = float(os.getenv('SCREENCAST_FPS', 2))
+    SCREENCAST_MAX_WIDTH = int(os.getenv('SCREENCAST_MAX_WIDTH', 960))
+    SCREENCAST_MAX_HEIGHT = int(os.getenv('SCREENCAST_MAX_HEIGHT', 540))
+    SCREENCAST_QUALITY = int(os.getenv('SCREENCAST_QUALITY', 60))
+
+    # Browser profile: 'standard' keeps the original Chrome options, 'lean' uses the new
+    # headless mode, blocks heavy resources and disables animations to save memory
+    BROWSER_PROFILE = os.getenv('BROWSER_PROFILE', 'standard').lower()
+    # URL patterns blocked through Network.setBlockedURLs in the lean profile (comma-separated).
+    # Images are left alone: screenshots are the evidence of a run and icons can be load-bearing
+    BLOCKED_URL_PATTERNS = [pattern.strip() for pattern in os.getenv(
+        'BLOCKED_URL_PATTERNS',
+        '*.woff,*.woff2,*.ttf,*.otf,*fonts.googleapis.com*,*fonts.gstatic.com*,'
+        '*.mp4,*.webm,*.ogg,*.mp3,*.wav,'
+        '*google-analytics.com*,*googletagmanager.com*,*doubleclick.net*,'
+        '*hotjar.com*,*clarity.ms*,*segment.io*,*intercom.io*'
+    ).split(',') if pattern.strip()]
+    # Also block images in the lean profile (changes what screenshots show, so off by default)
+    BLOCK_IMAGES = os.getenv('BLOCK_IMAGES', 'False').lower() == 'true'
+    DISABLE_ANIMATIONS = os.getenv('DISABLE_ANIMATIONS', 'True').lower() == 'true'
+
+    # Network capture: record every request through the ChromeDriver performance log,
+    # write a HAR file per test and store per-stage endpoint latency aggregates
+    CAPTURE_NETWORK = os.getenv('CAPTURE_NETWORK', 'False').lower() == 'true'
+    NETWORK_CAPTURE_DIR = os.getenv('NETWORK_CAPTURE_DIR', 'network_captures')
+
+    # Collect Navigation Timing, paint timings, long tasks and JS heap after each page load and stage
+    COLLECT_PERF_METRICS = os.getenv('COLLECT_PERF_METRICS', 'True').lower() == 'true'
+
+    # Upload completion: how long to wait for the UI to show an upload as complete, how long
+    # to wait when the popup shows no progress at all, and how often to poll it
+    UPLOAD_COMPLETION_TIMEOUT = float(os.getenv('UPLOAD_COMPLETION_TIMEOUT', 300))
+    UPLOAD_FALLBACK_WAIT = float(os.getenv('UPLOAD_FALLBACK_WAIT', 20))
+    UPLOAD_POLL_INTERVAL = float(os.getenv('UPLOAD_POLL_INTERVAL', 0.5))
+
+    # Upload mode: 'browser' drives the upload popup, 'http' posts the files straight to the
+    # upload endpoint over pooled connections with the browser's session (see utils/upload_utils.py).
+    # UPLOAD_API_PATH may use {case_id} and {category} ('notes' or 'imaging') placeholders;
+    # UPLOAD_API_BASE_URL defaults to the origin of BASE_URL
+    UPLOAD_MODE = os.getenv('UPLOAD_MODE', 'browser').lower()
+    UPLOAD_API_BASE_URL = os.getenv('UPLOAD_API_BASE_URL')
+    UPLOAD_API_PATH = os.getenv('UPLOAD_API_PATH', '/api/cases/{case_id}/documents')
+    UPLOAD_FILE_FIELD = os.getenv('UPLOAD_FILE_FIELD', 'file')
+    UPLOAD_PARALLELISM = int(os.getenv('UPLOAD_PARALLELISM', 4))
+    # Regular expression extracting the case ID from the URL of the case page
+    CASE_ID_URL_PATTERN = os.getenv('CASE_ID_URL_PATTERN', r'/cases?/([^/?#]+)')
+    # localStorage/sessionStorage key of a bearer token to send with uploads, if the API needs one
+    UPLOAD_AUTH_TOKEN_STORAGE_KEY = os.getenv('UPLOAD_AUTH_TOKEN_STORAGE_KEY')
+
+    # Memory watchdog: per-test budget for the chromedriver/Chrome process tree (0, the default,
+    # disables both the watchdog and admission queueing), memory kept free for the API process,
+    # and how long a new test may wait to be admitted
+    CHROME_MEMORY_BUDGET_MB = float(os.getenv('CHROME_MEMORY_BUDGET_MB', 0))
+    MEMORY_WATCHDOG_INTERVAL = float(os.getenv('MEMORY_WATCHDOG_INTERVAL', 2))
+    MEMORY_RESERVE_MB = float(os.getenv('MEMORY_RESERVE_MB', 256))
+    MEMORY_ADMISSION_TIMEOUT = float(os.getenv('MEMORY_ADMISSION_TIMEOUT', 1800))
 
 
 class DevConfig(BaseConfig):
@@ -51,6 +190,21 @@ class DevConfig(BaseConfig):
     EMAIL_PASSWORD = os.getenv('DEV_EMAIL_PASSWORD')
     # Split by comma and strip whitespace from each email
     EMAIL_RECIPIENTS = [email.strip() for email in os.getenv('DEV_EMAIL_RECIPIENTS', '').split(',') if email.strip()]
+    # Screenshot capture policy: 'always' keeps every screenshot, 'on_failure' keeps the last
+    # SCREENSHOT_RING_SIZE screenshots of a test case in memory and only stores them if it fails
+    SCREENSHOT_CAPTURE_POLICY = os.getenv('DEV_SCREENSHOT_CAPTURE_POLICY', 'always').lower()
+    SCREENSHOT_RING_SIZE = int(os.getenv('DEV_SCREENSHOT_RING_SIZE', 5))
+    # Time budgets per stage (test case) in seconds, e.g. 'Login=8,Case Creation=5,Clinical Notes Upload=60,
+    # Medical Chronology=90'. A stage over its budget is marked SLOW ('slow') or failed ('fail')
+    STAGE_BUDGETS = parse_stage_budgets(os.getenv('DEV_STAGE_BUDGETS', ''))
+    STAGE_BUDGET_ACTION = os.getenv('DEV_STAGE_BUDGET_ACTION', 'slow').lower()
+    # Email mode: 'immediate' sends an email per result, 'digest' collects results and sends one
+    # summary email once the oldest has waited DIGEST_WINDOW_MINUTES or DIGEST_MAX_RESULTS are collected.
+    # With DIGEST_FAILURES_IMMEDIATE, failed results are still emailed straight away
+    EMAIL_MODE = os.getenv('DEV_EMAIL_MODE', 'immediate').lower()
+    DIGEST_WINDOW_MINUTES = float(os.getenv('DEV_DIGEST_WINDOW_MINUTES', 60))
+    DIGEST_MAX_RESULTS = int(os.getenv('DEV_DIGEST_MAX_RESULTS', 20))
+    DIGEST_FAILURES_IMMEDIATE = os.getenv('DEV_DIGEST_FAILURES_IMMEDIATE', 'True').lower() == 'true'
 
 
 class StagingConfig(BaseConfig):
@@ -65,6 +219,21 @@ class StagingConfig(BaseConfig):
     EMAIL_PASSWORD = os.getenv('STAGING_EMAIL_PASSWORD')
     # Split by comma and strip whitespace from each email
     EMAIL_RECIPIENTS = [email.strip() for email in os.getenv('STAGING_EMAIL_RECIPIENTS', '').split(',') if email.strip()]
+    # Screenshot capture policy: 'always' keeps every screenshot, 'on_failure' keeps the last
+    # SCREENSHOT_RING_SIZE screenshots of a test case in memory and only stores them if it fails
+    SCREENSHOT_CAPTURE_POLICY = os.getenv('STAGING_SCREENSHOT_CAPTURE_POLICY', 'always').lower()
+    SCREENSHOT_RING_SIZE = int(os.getenv('STAGING_SCREENSHOT_RING_SIZE', 5))
+    # Time budgets per stage (test case) in seconds, e.g. 'Login=8,Case Creation=5,Clinical Notes Upload=60,
+    # Medical Chronology=90'. A stage over its budget is marked SLOW ('slow') or failed ('fail')
+    STAGE_BUDGETS = parse_stage_budgets(os.getenv('STAGING_STAGE_BUDGETS', ''))
+    STAGE_BUDGET_ACTION = os.getenv('STAGING_STAGE_BUDGET_ACTION', 'slow').lower()
+    # Email mode: 'immediate' sends an email per result, 'digest' collects results and sends one
+    # summary email once the oldest has waited DIGEST_WINDOW_MINUTES or DIGEST_MAX_RESULTS are collected.
+    # With DIGEST_FAILURES_IMMEDIATE, failed results are still emailed straight away
+    EMAIL_MODE = os.getenv('STAGING_EMAIL_MODE', 'immediate').lower()
+    DIGEST_WINDOW_MINUTES = float(os.getenv('STAGING_DIGEST_WINDOW_MINUTES', 60))
+    DIGEST_MAX_RESULTS = int(os.getenv('STAGING_DIGEST_MAX_RESULTS', 20))
+    DIGEST_FAILURES_IMMEDIATE = os.getenv('STAGING_DIGEST_FAILURES_IMMEDIATE', 'True').lower() == 'true'
 
 
 class ProdConfig(BaseConfig):
@@ -79,6 +248,21 @@ class ProdConfig(BaseConfig):
     EMAIL_PASSWORD = os.getenv('PROD_EMAIL_PASSWORD')
     # Split by comma and strip whitespace from each email
     EMAIL_RECIPIENTS = [email.strip() for email in os.getenv('PROD_EMAIL_RECIPIENTS', '').split(',') if email.strip()]
+    # Screenshot capture policy: 'always' keeps every screenshot, 'on_failure' keeps the last
+    # SCREENSHOT_RING_SIZE screenshots of a test case in memory and only stores them if it fails
+    SCREENSHOT_CAPTURE_POLICY = os.getenv('PROD_SCREENSHOT_CAPTURE_POLICY', 'always').lower()
+    SCREENSHOT_RING_SIZE = int(os.getenv('PROD_SCREENSHOT_RING_SIZE', 5))
+    # Time budgets per stage (test case) in seconds, e.g. 'Login=8,Case Creation=5,Clinical Notes Upload=60,
+    # Medical Chronology=90'. A stage over its budget is marked SLOW ('slow') or failed ('fail')
+    STAGE_BUDGETS = parse_stage_budgets(os.getenv('PROD_STAGE_BUDGETS', ''))
+    STAGE_BUDGET_ACTION = os.getenv('PROD_STAGE_BUDGET_ACTION', 'slow').lower()
+    # Email mode: 'immediate' sends an email per result, 'digest' collects results and sends one
+    # summary email once the oldest has waited DIGEST_WINDOW_MINUTES or DIGEST_MAX_RESULTS are collected.
+    # With DIGEST_FAILURES_IMMEDIATE, failed results are still emailed straight away
+    EMAIL_MODE = os.getenv('PROD_EMAIL_MODE', 'immediate').lower()
+    DIGEST_WINDOW_MINUTES = float(os.getenv('PROD_DIGEST_WINDOW_MINUTES', 60))
+    DIGEST_MAX_RESULTS = int(os.getenv('PROD_DIGEST_MAX_RESULTS', 20))
+    DIGEST_FAILURES_IMMEDIATE = os.getenv('PROD_DIGEST_FAILURES_IMMEDIATE', 'True').lower() == 'true'
 
 
 # Select config class based on APP_ENV
@@ -5,6 +5,7 @@ import traceback
 from automation.verixai_automation import VerixAIAutomation
 from utils.test_utils import TestResult
 from utils.email_utils import send_test_result_email
+from utils.outbox_utils import get_email_outbox
 from config import Config
 
 def main():
@@ -90,6 +91,10 @@ def main():
         for screenshot in result.get('screenshots', []):
             print(f"- {screenshot}")
 
+        # The email is delivered in the background; give it a chance to go out before exiting
+        if not get_email_outbox().flush(timeout=120):
+            print("Email is still queued; it will be sent by the next run or the API server")
+
         return 0 if result.get('status') == 'PASSED' else 1
     except Exception as e:
         print(f"Unhandled exception in test execution: {str(e)}")
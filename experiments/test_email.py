@@ -2,6 +2,7 @@ import os
 import sys
 import json
 from utils.email_utils import send_test_result_email_from_json
+from utils.outbox_utils import get_email_outbox
 
 def main():
     """Test the email functionality"""
@@ -33,6 +34,12 @@ def main():
 
         # Send the email
         success = send_test_result_email_from_json(test_result_path)
+        if success:
+            # Delivery happens on the outbox's background thread; wait for the first attempt
+            outbox = get_email_outbox()
+            outbox.flush(timeout=120)
+            messages = outbox.get_messages(test_id)
+            success = bool(messages) and messages[-1]['status'] == 'sent'
 
         if success:
             print("Email sent successfully!")
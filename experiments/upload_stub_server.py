@@ -0,0 +1,120 @@
+"""
+Local stand-in for the VerixAI upload endpoint, for testing the HTTP bulk-upload mode.
+
+Accepts multipart/form-data POSTs on any path, records the uploaded files and
+answers with their sizes and SHA-256 hashes. GET /stats returns everything
+received so far.
+
+Usage:
+    python experiments/upload_stub_server.py --port 8765 --delay 0.2 --require-cookie KEYCLOAK_SESSION
+
+    from utils.upload_utils import BulkUploader
+    uploader = BulkUploader("http://localhost:8765/api/cases/123/documents",
+                            cookies=[{'name': 'KEYCLOAK_SESSION', 'value': 'x'}], parallelism=8)
+    print(uploader.upload("sample_data/notes_folder"))
+"""
+
+import sys
+import json
+import time
+import hashlib
+import argparse
+import threading
+from email.parser import BytesParser
+from email.policy import HTTP
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+received = []
+received_lock = threading.Lock()
+
+
+class UploadHandler(BaseHTTPRequestHandler):
+    """Request handler recording multipart uploads"""
+
+    delay = 0.0
+    require_cookie = None
+    protocol_version = 'HTTP/1.1'  # Keep-alive, so pooled connections are reused
+
+    def _send_json(self, status, payload):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path == '/stats':
+            with received_lock:
+                files = list(received)
+            self._send_json(200, {
+                'file_count': len(files),
+                'total_bytes': sum(f['size'] for f in files),
+                'connections': len({f['client_port'] for f in files}),
+                'files': files
+            })
+        else:
+            self._send_json(404, {'error': 'not found'})
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length', 0))
+        body = self.rfile.read(length)
+
+        if self.require_cookie and self.require_cookie not in (self.headers.get('Cookie') or ''):
+            self._send_json(401, {'error': f'missing cookie {self.require_cookie}'})
+            return
+
+        content_type = self.headers.get('Content-Type', '')
+        if not content_type.startswith('multipart/form-data'):
+            self._send_json(400, {'error': 'expected multipart/form-data'})
+            return
+
+        message = BytesParser(policy=HTTP).parsebytes(
+            f'Content-Type: {content_type}\r\n\r\n'.encode('utf-8') + body
+        )
+        files = []
+        for part in message.iter_parts():
+            filename = part.get_filename()
+            if not filename:
+                continue
+            data = part.get_payload(decode=True) or b''
+            files.append({
+                'name': filename,
+                'size': len(data),
+                'sha256': hashlib.sha256(data).hexdigest(),
+                'path': self.path,
+                'client_port': self.client_address[1]
+            })
+
+        if self.delay:
+            time.sleep(self.delay)
+
+        with received_lock:
+            received.extend(files)
+        self._send_json(201, {'files': files})
+
+    def log_message(self, format, *args):
+        pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stand-in upload server for the HTTP bulk-upload mode")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--delay', type=float, default=0.0, help="Seconds to wait before answering each upload")
+    parser.add_argument('--require-cookie', help="Reject uploads without this session cookie")
+    args = parser.parse_args()
+
+    UploadHandler.delay = args.delay
+    UploadHandler.require_cookie = args.require_cookie
+    server = ThreadingHTTPServer((args.host, args.port), UploadHandler)
+    print(f"Upload stub server listening on http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -15,6 +15,12 @@ class WebhookConfig(BaseModel):
 class TestRequest(BaseModel):
     case_details: Optional[CaseDetails] = None
     # File paths are now hardcoded to use sample_data directory
+    # Record network traffic into a HAR file (defaults to the CAPTURE_NETWORK setting)
+    capture_network: Optional[bool] = None
+    # Name of a generated corpus under CORPUS_ROOT to upload instead of sample_data
+    corpus: Optional[str] = None
+    # 'browser' or 'http' (defaults to the UPLOAD_MODE setting)
+    upload_mode: Optional[str] = None
 
 class HealthResponse(BaseModel):
     status: str
@@ -0,0 +1,142 @@
+import os
+from selenium.webdriver.chrome.options import Options
+
+
+# Chrome falls back to /tmp when --disable-dev-shm-usage is passed. Docker gives
+# containers a 64 MB /dev/shm by default, which Chrome exhausts quickly and then
+# crashes renderers with "session deleted because of page crash".
+MIN_DEV_SHM_MB = 512
+
+# Stylesheet injected on every document by the lean profile to switch off CSS
+# animations and transitions. Waiting for an element to become clickable no
+# longer has to outlast fade-ins, and the compositor does less work.
+DISABLE_ANIMATIONS_SCRIPT = """
+(function () {
+    var css = '*, *::before, *::after {' +
+        'animation-duration: 0s !important; animation-delay: 0s !important;' +
+        'transition-duration: 0s !important; transition-delay: 0s !important;' +
+        'scroll-behavior: auto !important; caret-color: transparent !important; }';
+
+    function inject() {
+        if (document.getElementById('verixai-disable-animations')) {
+            return;
+        }
+        var root = document.head || document.documentElement;
+        if (!root) {
+            return;
+        }
+        var style = document.createElement('style');
+        style.id = 'verixai-disable-animations';
+        style.textContent = css;
+        root.appendChild(style);
+    }
+
+    inject();
+    document.addEventListener('DOMContentLoaded', inject);
+})();
+"""
+
+# URL patterns of images, blocked by the lean profile only with BLOCK_IMAGES
+IMAGE_URL_PATTERNS = ['*.png', '*.jpg', '*.jpeg', '*.gif', '*.webp', '*.svg', '*.ico']
+
+# Chrome arguments shared by the lean profile on top of the standard ones
+LEAN_CHROME_ARGUMENTS = [
+    "--disable-extensions",
+    "--disable-background-networking",
+    "--disable-background-timer-throttling",
+    "--disable-component-update",
+    "--disable-default-apps",
+    "--disable-sync",
+    "--disable-features=Translate,OptimizationHints,MediaRouter,site-per-process",
+    "--metrics-recording-only",
+    "--mute-audio",
+    "--no-first-run",
+    "--hide-scrollbars",
+]
+
+
+def dev_shm_size_mb(path='/dev/shm'):
+    """
+    Get the size of the shared memory mount
+
+    Args:
+        path (str): Path of the shared memory mount
+
+    Returns:
+        float: Size in MB, or None if the mount does not exist
+    """
+    try:
+        stats = os.statvfs(path)
+    except (OSError, AttributeError):
+        return None
+    return stats.f_frsize * stats.f_blocks / (1024 * 1024)
+
+
+def should_disable_dev_shm(min_size_mb=MIN_DEV_SHM_MB):
+    """Check whether Chrome should be told not to use /dev/shm"""
+    size_mb = dev_shm_size_mb()
+    return size_mb is None or size_mb < min_size_mb
+
+
+def build_chrome_options(headless=True, profile='standard'):
+    """
+    Build Chrome options for the given browser profile
+
+    Args:
+        headless (bool): Whether to run Chrome headless
+        profile (str): 'standard' for the original options, 'lean' for the
+            low-memory profile
+
+    Returns:
+        Options: Chrome options
+    """
+    chrome_options = Options()
+    chrome_options.add_experimental_option("detach", True)
+
+    if profile == 'lean':
+        if headless:
+            chrome_options.add_argument("--headless=new")
+        chrome_options.add_argument("--window-size=1920,1080")
+        chrome_options.add_argument("--disable-gpu")
+        chrome_options.add_argument("--no-sandbox")
+        for argument in LEAN_CHROME_ARGUMENTS:
+            chrome_options.add_argument(argument)
+        if should_disable_dev_shm():
+            print(f"/dev/shm is smaller than {MIN_DEV_SHM_MB} MB, disabling its use")
+            chrome_options.add_argument("--disable-dev-shm-usage")
+        return chrome_options
+
+    if headless:
+        chrome_options.add_argument("--headless")
+        chrome_options.add_argument("--window-size=1920,1080")
+    chrome_options.add_argument("--disable-gpu")
+    chrome_options.add_argument("--no-sandbox")
+    return chrome_options
+
+
+def apply_lean_profile(driver, blocked_url_patterns=None, disable_animations=True, block_images=False):
+    """
+    Apply the DevTools side of the lean profile to a running driver
+
+    Args:
+        driver (WebDriver): The Chrome WebDriver
+        blocked_url_patterns (list, optional): URL patterns for Network.setBlockedURLs
+            (``*`` matches any run of characters)
+        disable_animations (bool): Whether to inject the no-animation stylesheet
+        block_images (bool): Whether to also block IMAGE_URL_PATTERNS
+    """
+    blocked_url_patterns = list(blocked_url_patterns or [])
+    if block_images:
+        blocked_url_patterns += IMAGE_URL_PATTERNS
+
+    if blocked_url_patterns:
+        driver.execute_cdp_cmd("Network.enable", {})
+        driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": blocked_url_patterns})
+        print(f"Blocking {len(blocked_url_patterns)} URL pattern(s) in the browser")
+
+    if disable_animations:
+        driver.execute_cdp_cmd("Page.addScriptToEvaluateOnNewDocument", {"source": DISABLE_ANIMATIONS_SCRIPT})
+        driver.execute_cdp_cmd("Emulation.setEmulatedMedia", {
+            "features": [{"name": "prefers-reduced-motion", "value": "reduce"}]
+        })
+        print("Disabled CSS animations and transitions in the browser")
@@ -0,0 +1,509 @@
+"""Synthetic upload corpus generator.
+
+Builds PDF and DICOM corpora of a configurable number of files, size
+distribution and folder depth from the files in ``sample_data``, laid out the
+same way as ``sample_data`` so VerixAIAutomation can use a corpus in its place::
+
+    <corpus>/notes.pdf
+    <corpus>/notes_folder/...
+    <corpus>/imaging.dcm
+    <corpus>/imaging_folder/...
+    <corpus>/manifest.json
+
+Every generated file is still a valid document of its type: PDFs get padding
+as trailing comment lines followed by a repeated ``startxref``/``%%EOF``
+trailer, and DICOM files get a new SOP Instance UID and a Data Set Trailing
+Padding (FFFC,FFFC) element. Files can only grow, so a target size smaller
+than the template keeps the template's size.
+
+Usage:
+    python -m utils.corpus_utils corpora/large --notes 200 --imaging 50 \\
+        --distribution lognormal --median-size 2MB --max-size 40MB --depth 2 --seed 42
+"""
+import os
+import re
+import sys
+import json
+import math
+import base64
+import struct
+import random
+import hashlib
+import argparse
+from datetime import datetime
+
+
+# Layout shared with sample_data
+NOTES_FILE_NAME = 'notes.pdf'
+NOTES_FOLDER_NAME = 'notes_folder'
+IMAGING_FILE_NAME = 'imaging.dcm'
+IMAGING_FOLDER_NAME = 'imaging_folder'
+MANIFEST_FILE_NAME = 'manifest.json'
+
+SIZE_DISTRIBUTIONS = ('template', 'fixed', 'uniform', 'lognormal')
+
+# Padding is written in chunks so large files never sit in memory
+CHUNK_SIZE = 1024 * 1024
+
+_SIZE_UNITS = {'': 1, 'B': 1, 'KB': 1024, 'MB': 1024 ** 2, 'GB': 1024 ** 3}
+
+# DICOM transfer syntaxes that need special handling when padding
+IMPLICIT_VR_LITTLE_ENDIAN = '1.2.840.10008.1.2'
+EXPLICIT_VR_BIG_ENDIAN = '1.2.840.10008.1.2.2'
+DEFLATED_EXPLICIT_VR_LITTLE_ENDIAN = '1.2.840.10008.1.2.1.99'
+
+
+def parse_size(value):
+    """
+    Parse a human readable size such as '512KB' or '2.5MB'
+
+    Args:
+        value (str or int): Size to parse
+
+    Returns:
+        int: Size in bytes, or None if value is None
+    """
+    if value is None or isinstance(value, int):
+        return value
+    match = re.match(r'^\s*([\d.]+)\s*([KMG]?B?)\s*$', str(value).upper())
+    if not match:
+        raise ValueError(f"Invalid size: {value}")
+    return int(float(match.group(1)) * _SIZE_UNITS[match.group(2)])
+
+
+class SizeSampler:
+    """Class to draw target file sizes from a distribution"""
+
+    def __init__(self, distribution='template', min_size=None, max_size=None, median_size=None, sigma=0.75, rng=None):
+        """
+        Initialize the sampler
+
+        Args:
+            distribution (str): 'template' (keep template sizes), 'fixed' (median_size),
+                'uniform' (min_size..max_size) or 'lognormal' (median_size, sigma)
+            min_size (int, optional): Minimum size in bytes
+            max_size (int, optional): Maximum size in bytes
+            median_size (int, optional): Median (or fixed) size in bytes
+            sigma (float): Shape of the lognormal distribution
+            rng (random.Random, optional): Random generator
+        """
+        if distribution not in SIZE_DISTRIBUTIONS:
+            raise ValueError(f"Unknown size distribution: {distribution}")
+        if distribution in ('fixed', 'lognormal') and not median_size:
+            raise ValueError(f"The {distribution} distribution needs a median size")
+        if distribution == 'uniform' and not (min_size and max_size):
+            raise ValueError("The uniform distribution needs a minimum and a maximum size")
+
+        self.distribution = distribution
+        self.min_size = min_size
+        self.max_size = max_size
+        self.median_size = median_size
+        self.sigma = sigma
+        self.rng = rng or random.Random()
+
+    def sample(self):
+        """
+        Draw a target size
+
+        Returns:
+            int: Target size in bytes, or None to keep the template size
+        """
+        if self.distribution == 'template':
+            return None
+        if self.distribution == 'fixed':
+            size = self.median_size
+        elif self.distribution == 'uniform':
+            size = self.rng.randint(self.min_size, self.max_size)
+        else:
+            size = int(self.rng.lognormvariate(math.log(self.median_size), self.sigma))
+
+        if self.min_size:
+            size = max(size, self.min_size)
+        if self.max_size:
+            size = min(size, self.max_size)
+        return size
+
+
+def find_templates(templates_dir):
+    """
+    Find the PDF and DICOM template files
+
+    Args:
+        templates_dir (str): Directory to search (usually sample_data)
+
+    Returns:
+        tuple: (list of PDF paths, list of DICOM paths)
+    """
+    pdfs, dicoms = [], []
+    for root, _, files in os.walk(templates_dir):
+        for name in sorted(files):
+            path = os.path.join(root, name)
+            if name.lower().endswith('.pdf'):
+                pdfs.append(path)
+            elif name.lower().endswith('.dcm') or _is_dicom(path):
+                dicoms.append(path)
+    return sorted(pdfs), sorted(dicoms)
+
+
+def _is_dicom(path):
+    """Check for a DICOM Part 10 file that is not a DICOMDIR"""
+    if os.path.basename(path).upper() == 'DICOMDIR':
+        return False
+    try:
+        with open(path, 'rb') as f:
+            f.seek(128)
+            return f.read(4) == b'DICM'
+    except OSError:
+        return False
+
+
+def folder_path(index, depth, branching):
+    """
+    Get the nested folder for the n-th file
+
+    Args:
+        index (int): Index of the file
+        depth (int): Number of nested folder levels (0 for a flat folder)
+        branching (int): Number of subfolders per folder
+
+    Returns:
+        str: Relative folder path ('' for a flat folder)
+    """
+    parts = []
+    for level in range(depth):
+        parts.append(f"level{level + 1}_{(index // (branching ** level)) % branching:02d}")
+    return os.path.join(*parts) if parts else ''
+
+
+class _HashingWriter:
+    """File writer that tracks the size and SHA-256 of what it writes"""
+
+    def __init__(self, path):
+        self.file = open(path, 'wb')
+        self.sha256 = hashlib.sha256()
+        self.size = 0
+
+    def write(self, data):
+        self.file.write(data)
+        self.sha256.update(data)
+        self.size += len(data)
+
+    def close(self):
+        self.file.close()
+
+
+def _padding_chunks(length, rng):
+    """Yield random padding bytes in chunks"""
+    remaining = length
+    while remaining > 0:
+        size = min(CHUNK_SIZE, remaining)
+        yield rng.randbytes(size)
+        remaining -= size
+
+
+def write_pdf(template_path, output_path, target_size, rng, marker):
+    """
+    Write a PDF from a template, padded to a target size
+
+    Args:
+        template_path (str): Template PDF
+        output_path (str): Output file
+        target_size (int): Target size in bytes (None to keep the template size)
+        rng (random.Random): Random generator for the padding
+        marker (str): Unique marker so every file has a distinct hash
+
+    Returns:
+        dict: Size and SHA-256 of the written file
+    """
+    with open(template_path, 'rb') as f:
+        data = f.read()
+
+    # Repeat the last cross-reference pointer after the padding so readers that
+    # look for startxref near the end of the file still find it
+    startxref = re.findall(rb'startxref\s+(\d+)', data[-2048:])
+    trailer = b"\nstartxref\n" + (startxref[-1] if startxref else b"0") + b"\n%%EOF\n"
+    header = f"\n% verixai-corpus {marker}\n".encode('ascii')
+
+    writer = _HashingWriter(output_path)
+    try:
+        writer.write(data)
+        writer.write(header)
+
+        padding = max(0, (target_size or 0) - len(data) - len(header) - len(trailer))
+        # Each comment line is '%' + 76 base64 characters + '\n'
+        line_count = padding // 78
+        raw_per_line = 57
+        written_lines = 0
+        while written_lines < line_count:
+            batch = min(line_count - written_lines, CHUNK_SIZE // 78)
+            raw = rng.randbytes(raw_per_line * batch)
+            encoded = base64.b64encode(raw)
+            lines = [b'%' + encoded[i * 76:(i + 1) * 76] + b'\n' for i in range(batch)]
+            writer.write(b''.join(lines))
+            written_lines += batch
+        remainder = padding - line_count * 78
+        if remainder > 1:
+            writer.write(b'%' + b'0' * (remainder - 2) + b'\n')
+
+        writer.write(trailer)
+    finally:
+        writer.close()
+    return {'size': writer.size, 'sha256': writer.sha256.hexdigest()}
+
+
+def _dicom_transfer_syntax(data):
+    """Read the Transfer Syntax UID (0002,0010) from the file meta information"""
+    index = data.find(b'\x02\x00\x10\x00UI', 132)
+    if index < 0:
+        return None
+    length = struct.unpack('<H', data[index + 6:index + 8])[0]
+    return data[index + 8:index + 8 + length].rstrip(b'\x00 ').decode('ascii', 'ignore')
+
+
+def _replace_uid(data, tag_bytes, explicit, rng, start=0):
+    """Replace the last component of a UID element with random digits of the same length"""
+    index = data.find(tag_bytes + (b'UI' if explicit else b''), start)
+    if index < 0:
+        return None
+    if explicit:
+        length = struct.unpack('<H', data[index + 6:index + 8])[0]
+        value_start = index + 8
+    else:
+        length = struct.unpack('<I', data[index + 4:index + 8])[0]
+        value_start = index + 8
+
+    value = bytes(data[value_start:value_start + length])
+    uid = value.rstrip(b'\x00 ')
+    last_dot = uid.rfind(b'.')
+    component_length = len(uid) - last_dot - 1
+    if last_dot < 0 or component_length < 1:
+        return None
+
+    component = str(rng.randrange(10 ** (component_length - 1), 10 ** component_length)).encode('ascii')
+    new_uid = uid[:last_dot + 1] + component
+    data[value_start:value_start + len(new_uid)] = new_uid
+    return new_uid.decode('ascii')
+
+
+def write_dicom(template_path, output_path, target_size, rng):
+    """
+    Write a DICOM file from a template with a new SOP Instance UID, padded to a target size
+
+    Args:
+        template_path (str): Template DICOM file
+        output_path (str): Output file
+        target_size (int): Target size in bytes (None to keep the template size)
+        rng (random.Random): Random generator for the UID and the padding
+
+    Returns:
+        dict: Size, SHA-256 and SOP Instance UID of the written file
+    """
+    with open(template_path, 'rb') as f:
+        data = bytearray(f.read())
+
+    transfer_syntax = _dicom_transfer_syntax(data)
+    # File meta information is always explicit VR little endian. The dataset's own
+    # SOP Instance UID (0008,0018) is then set to the same value
+    sop_instance_uid = _replace_uid(data, b'\x02\x00\x03\x00', True, rng, start=132)
+    if sop_instance_uid:
+        _sync_dataset_uid(data, sop_instance_uid, transfer_syntax)
+
+    writer = _HashingWriter(output_path)
+    try:
+        writer.write(bytes(data))
+
+        padding = (target_size or 0) - len(data)
+        if transfer_syntax == DEFLATED_EXPLICIT_VR_LITTLE_ENDIAN:
+            padding = 0
+            if target_size:
+                print(f"Warning: Cannot pad deflated DICOM template {template_path}, keeping its size")
+
+        # Data Set Trailing Padding (FFFC,FFFC), OB; header is 12 bytes (8 implicit)
+        header_size = 8 if transfer_syntax == IMPLICIT_VR_LITTLE_ENDIAN else 12
+        value_length = padding - header_size
+        value_length -= value_length % 2  # DICOM values have even lengths
+        if value_length > 0:
+            if transfer_syntax == IMPLICIT_VR_LITTLE_ENDIAN:
+                writer.write(b'\xfc\xff\xfc\xff' + struct.pack('<I', value_length))
+            elif transfer_syntax == EXPLICIT_VR_BIG_ENDIAN:
+                writer.write(b'\xff\xfc\xff\xfcOB\x00\x00' + struct.pack('>I', value_length))
+            else:
+                writer.write(b'\xfc\xff\xfc\xffOB\x00\x00' + struct.pack('<I', value_length))
+            for chunk in _padding_chunks(value_length, rng):
+                writer.write(chunk)
+    finally:
+        writer.close()
+    return {'size': writer.size, 'sha256': writer.sha256.hexdigest(), 'sop_instance_uid': sop_instance_uid}
+
+
+def _sync_dataset_uid(data, uid, transfer_syntax):
+    """Copy the new SOP Instance UID into (0008,0018) when lengths match"""
+    explicit = transfer_syntax != IMPLICIT_VR_LITTLE_ENDIAN
+    if transfer_syntax in (EXPLICIT_VR_BIG_ENDIAN, DEFLATED_EXPLICIT_VR_LITTLE_ENDIAN):
+        return
+    tag = b'\x08\x00\x18\x00' + (b'UI' if explicit else b'')
+    index = data.find(tag, 132)
+    if index < 0:
+        return
+    if explicit:
+        length = struct.unpack('<H', data[index + 6:index + 8])[0]
+    else:
+        length = struct.unpack('<I', data[index + 4:index + 8])[0]
+    value_start = index + 8
+    current = bytes(data[value_start:value_start + length]).rstrip(b'\x00 ')
+    new_uid = uid.encode('ascii')
+    if len(current) == len(new_uid):
+        data[value_start:value_start + len(new_uid)] = new_uid
+
+
+def generate_corpus(output_dir, notes_count=35, imaging_count=3, size_distribution='template',
+                    min_size=None, max_size=None, median_size=None, sigma=0.75,
+                    folder_depth=0, branching=2, seed=None, templates_dir='sample_data'):
+    """
+    Generate a synthetic upload corpus
+
+    Args:
+        output_dir (str): Directory to create the corpus in
+        notes_count (int): Number of PDFs in notes_folder
+        imaging_count (int): Number of DICOM files in imaging_folder
+        size_distribution (str): 'template', 'fixed', 'uniform' or 'lognormal'
+        min_size (int or str, optional): Minimum file size
+        max_size (int or str, optional): Maximum file size
+        median_size (int or str, optional): Median (or fixed) file size
+        sigma (float): Shape of the lognormal distribution
+        folder_depth (int): Number of nested folder levels in the upload folders
+        branching (int): Number of subfolders per folder
+        seed (int, optional): Random seed for reproducible corpora
+        templates_dir (str): Directory holding the template files
+
+    Returns:
+        dict: The manifest, also written to manifest.json in output_dir
+    """
+    rng = random.Random(seed)
+    sampler = SizeSampler(size_distribution, parse_size(min_size), parse_size(max_size),
+                          parse_size(median_size), sigma, rng)
+
+    pdf_templates, dicom_templates = find_templates(templates_dir)
+    if not pdf_templates:
+        raise ValueError(f"No PDF templates found in {templates_dir}")
+    if not dicom_templates:
+        raise ValueError(f"No DICOM templates found in {templates_dir}")
+
+    os.makedirs(output_dir, exist_ok=True)
+    files = []
+
+    def add_pdf(relative_path, index):
+        template = pdf_templates[index % len(pdf_templates)]
+        path = os.path.join(output_dir, relative_path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        info = write_pdf(template, path, sampler.sample(), rng, f"{seed}-{len(files)}")
+        files.append(dict(info, path=relative_path, kind='pdf', template=os.path.relpath(template, templates_dir)))
+
+    def add_dicom(relative_path, index):
+        template = dicom_templates[index % len(dicom_templates)]
+        path = os.path.join(output_dir, relative_path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        info = write_dicom(template, path, sampler.sample(), rng)
+        files.append(dict(info, path=relative_path, kind='dicom', template=os.path.relpath(template, templates_dir)))
+
+    # Single files used by the file upload paths
+    add_pdf(NOTES_FILE_NAME, 0)
+    add_dicom(IMAGING_FILE_NAME, 0)
+
+    for index in range(notes_count):
+        folder = folder_path(index, folder_depth, branching)
+        add_pdf(os.path.join(NOTES_FOLDER_NAME, folder, f"note_{index + 1:05d}.pdf"), index)
+
+    for index in range(imaging_count):
+        folder = folder_path(index, folder_depth, branching)
+        add_dicom(os.path.join(IMAGING_FOLDER_NAME, folder, f"IMG{index + 1:05d}.dcm"), index)
+
+    def totals(prefix):
+        selected = [f for f in files if f['path'].startswith(prefix + os.sep)]
+        return {'count': len(selected), 'bytes': sum(f['size'] for f in selected)}
+
+    manifest = {
+        'generated_at': datetime.now().isoformat(),
+        'parameters': {
+            'notes_count': notes_count,
+            'imaging_count': imaging_count,
+            'size_distribution': size_distribution,
+            'min_size': sampler.min_size,
+            'max_size': sampler.max_size,
+            'median_size': sampler.median_size,
+            'sigma': sigma,
+            'folder_depth': folder_depth,
+            'branching': branching,
+            'seed': seed
+        },
+        'totals': {
+            NOTES_FOLDER_NAME: totals(NOTES_FOLDER_NAME),
+            IMAGING_FOLDER_NAME: totals(IMAGING_FOLDER_NAME),
+            'all': {'count': len(files), 'bytes': sum(f['size'] for f in files)}
+        },
+        'files': files
+    }
+
+    with open(os.path.join(output_dir, MANIFEST_FILE_NAME), 'w') as f:
+        json.dump(manifest, f, indent=2)
+
+    return manifest
+
+
+def load_manifest(corpus_dir):
+    """
+    Load the manifest of a generated corpus
+
+    Args:
+        corpus_dir (str): Corpus directory
+
+    Returns:
+        dict: The manifest, or None if the directory has no manifest
+    """
+    manifest_path = os.path.join(corpus_dir, MANIFEST_FILE_NAME)
+    if not os.path.exists(manifest_path):
+        return None
+    with open(manifest_path, 'r') as f:
+        return json.load(f)
+
+
+def main(argv=None):
+    """Command line entry point"""
+    parser = argparse.ArgumentParser(description="Generate a synthetic upload corpus from sample_data")
+    parser.add_argument('output_dir', help="Directory to create the corpus in")
+    parser.add_argument('--notes', type=int, default=35, help="Number of PDFs in notes_folder")
+    parser.add_argument('--imaging', type=int, default=3, help="Number of DICOM files in imaging_folder")
+    parser.add_argument('--distribution', choices=SIZE_DISTRIBUTIONS, default='template', help="File size distribution")
+    parser.add_argument('--min-size', help="Minimum file size (e.g. 100KB)")
+    parser.add_argument('--max-size', help="Maximum file size (e.g. 50MB)")
+    parser.add_argument('--median-size', help="Median or fixed file size (e.g. 2MB)")
+    parser.add_argument('--sigma', type=float, default=0.75, help="Shape of the lognormal distribution")
+    parser.add_argument('--depth', type=int, default=0, help="Nested folder levels in the upload folders")
+    parser.add_argument('--branching', type=int, default=2, help="Subfolders per folder")
+    parser.add_argument('--seed', type=int, help="Random seed for a reproducible corpus")
+    parser.add_argument('--templates', default='sample_data', help="Directory holding the template files")
+    args = parser.parse_args(argv)
+
+    manifest = generate_corpus(
+        args.output_dir,
+        notes_count=args.notes,
+        imaging_count=args.imaging,
+        size_distribution=args.distribution,
+        min_size=args.min_size,
+        max_size=args.max_size,
+        median_size=args.median_size,
+        sigma=args.sigma,
+        folder_depth=args.depth,
+        branching=args.branching,
+        seed=args.seed,
+        templates_dir=args.templates
+    )
+
+    for name, total in manifest['totals'].items():
+        print(f"{name}: {total['count']} files, {total['bytes'] / (1024 * 1024):.1f} MB")
+    print(f"Manifest written to {os.path.join(args.output_dir, MANIFEST_FILE_NAME)}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
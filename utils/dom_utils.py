@@ -0,0 +1,169 @@
+"""Batched DOM helpers for the Selenium automation.
+
+Every ``find_element``/``send_keys``/``execute_script`` call is a WebDriver round
+trip. The helpers in this module apply a whole list of DOM mutations and field
+values inside a single ``execute_script`` call instead.
+"""
+
+# JavaScript executed in the page for apply_dom_actions.
+#
+# Field values are written through the native value setter of the element's
+# prototype rather than ``el.value = ...``. React-controlled inputs track their
+# value on the instance, so assigning directly would be swallowed and the
+# component state would never see the change. Writing through the prototype
+# setter and then dispatching bubbling ``input``/``change`` events is what a
+# real keystroke does from React's point of view.
+BATCH_DOM_ACTIONS_SCRIPT = """
+var actions = arguments[0] || [];
+var results = [];
+
+function resolveTarget(action) {
+    if (action.element) {
+        return action.element;
+    }
+    if (action.id) {
+        return document.getElementById(action.id);
+    }
+    if (action.selector) {
+        return document.querySelector(action.selector);
+    }
+    return null;
+}
+
+function nativeValueSetter(el) {
+    var proto = Object.getPrototypeOf(el);
+    while (proto) {
+        var descriptor = Object.getOwnPropertyDescriptor(proto, 'value');
+        if (descriptor && descriptor.set) {
+            return descriptor.set;
+        }
+        proto = Object.getPrototypeOf(proto);
+    }
+    return null;
+}
+
+function fire(el, type) {
+    el.dispatchEvent(new Event(type, { bubbles: true, cancelable: true }));
+}
+
+for (var i = 0; i < actions.length; i++) {
+    var action = actions[i];
+    var el = resolveTarget(action);
+    if (!el) {
+        results.push({ index: i, found: false });
+        continue;
+    }
+
+    try {
+        var style = action.style || {};
+        Object.keys(style).forEach(function (key) { el.style[key] = style[key]; });
+
+        var props = action.props || {};
+        Object.keys(props).forEach(function (key) { el[key] = props[key]; });
+
+        var setAttrs = action.set_attrs || {};
+        Object.keys(setAttrs).forEach(function (key) { el.setAttribute(key, setAttrs[key]); });
+
+        (action.remove_attrs || []).forEach(function (key) { el.removeAttribute(key); });
+
+        if (Object.prototype.hasOwnProperty.call(action, 'value')) {
+            if (typeof el.focus === 'function') {
+                el.focus();
+            }
+            var setter = nativeValueSetter(el);
+            if (setter) {
+                setter.call(el, action.value);
+            } else {
+                el.value = action.value;
+            }
+            fire(el, 'input');
+            fire(el, 'change');
+            if (typeof el.blur === 'function') {
+                el.blur();
+            }
+        }
+
+        results.push({ index: i, found: true, value: el.value === undefined ? null : el.value });
+    } catch (e) {
+        results.push({ index: i, found: true, error: String(e) });
+    }
+}
+
+return results;
+"""
+
+
+def fill_action(value, element_id=None, selector=None, element=None):
+    """
+    Build an action that sets the value of a form field
+
+    Args:
+        value (str): Value to set
+        element_id (str, optional): ID of the target element
+        selector (str, optional): CSS selector of the target element
+        element (WebElement, optional): Target element already located by Selenium
+
+    Returns:
+        dict: Action for apply_dom_actions
+    """
+    action = _target(element_id, selector, element)
+    action['value'] = value
+    return action
+
+
+def unhide_action(element_id=None, selector=None, element=None, set_attrs=None):
+    """
+    Build an action that makes an element visible and enabled
+
+    Args:
+        element_id (str, optional): ID of the target element
+        selector (str, optional): CSS selector of the target element
+        element (WebElement, optional): Target element already located by Selenium
+        set_attrs (dict, optional): Extra attributes to set on the element
+
+    Returns:
+        dict: Action for apply_dom_actions
+    """
+    action = _target(element_id, selector, element)
+    action['style'] = {'display': 'block'}
+    action['props'] = {'disabled': False}
+    action['remove_attrs'] = ['hidden']
+    if set_attrs:
+        action['set_attrs'] = dict(set_attrs)
+    return action
+
+
+def apply_dom_actions(driver, actions):
+    """
+    Apply a list of DOM mutations and field values in a single script call
+
+    Each action is a dict targeting one element through ``element`` (a Selenium
+    WebElement), ``id`` or ``selector``, and may contain any of:
+
+    - ``style``: dict of inline style properties to set
+    - ``props``: dict of DOM properties to set (e.g. ``{'disabled': False}``)
+    - ``set_attrs``: dict of attributes to set
+    - ``remove_attrs``: list of attributes to remove
+    - ``value``: field value to set, followed by ``input`` and ``change`` events
+
+    Args:
+        driver (WebDriver): The Selenium WebDriver
+        actions (list): List of action dicts
+
+    Returns:
+        list: One result dict per action with ``found``, the ``value`` read back and, on failure, ``error``
+    """
+    if not actions:
+        return []
+    return driver.execute_script(BATCH_DOM_ACTIONS_SCRIPT, list(actions)) or []
+
+
+def _target(element_id=None, selector=None, element=None):
+    """Build the targeting part of an action"""
+    if element is not None:
+        return {'element': element}
+    if element_id:
+        return {'id': element_id}
+    if selector:
+        return {'selector': selector}
+    raise ValueError("A DOM action needs an element, id or selector")
@@ -1,12 +1,56 @@
-import smtplib
 import os
 import json
 import re
+import time
+import threading
+from urllib.parse import quote
 from email.mime.multipart import MIMEMultipart
 from email.mime.text import MIMEText
 from email.mime.image import MIMEImage
 from datetime import datetime
-from config import Config
+from config import Config, config_by_env
+from utils.screenshot_utils import get_screenshot_store, build_contact_sheet
+from utils.outbox_utils import get_email_outbox
+
+
+# Styles shared by the result and digest emails (purple theme)
+EMAIL_STYLE = """<style>
+    body { font-family: Arial, sans-serif; margin: 0; padding: 20px; color: #333; }
+    .header { background-color: #8200db; color: white; padding: 15px; border-radius: 5px 5px 0 0; }
+    .content { padding: 20px; border: 1px solid #ddd; border-top: none; border-radius: 0 0 5px 5px; }
+    .passed { color: #28a745; font-weight: bold; }
+    .failed { color: #dc3545; font-weight: bold; }
+    .test-case { margin-bottom: 20px; border: 1px solid #ddd; border-radius: 5px; overflow: hidden; }
+    .test-case-header { padding: 10px; background-color: #f8f9fa; border-bottom: 1px solid #ddd; }
+    .test-case-content { padding: 15px; }
+    .test-case-passed { border-left: 4px solid #28a745; }
+    .test-case-failed { border-left: 4px solid #dc3545; }
+    table { border-collapse: collapse; width: 100%; margin-bottom: 20px; }
+    th, td { border: 1px solid #ddd; padding: 8px; text-align: left; }
+    th { background-color: #f2f2f2; }
+    .summary { background-color: #f8f9fa; padding: 15px; margin-bottom: 20px; border-radius: 5px; }
+    .footer { margin-top: 30px; font-size: 12px; color: #777; text-align: center; }
+    .badge { display: inline-block; padding: 5px 10px; border-radius: 3px; font-size: 12px; font-weight: bold; }
+    .badge-success { background-color: #28a745; color: white; }
+    .badge-danger { background-color: #dc3545; color: white; }
+    .badge-primary { background-color: #8200db; color: white; }
+    .badge-warning { background-color: #fd7e14; color: white; }
+    .regression-details { background-color: #fff8f0; border-left: 4px solid #fd7e14; padding: 10px; margin-top: 10px; }
+    .duration { color: #6c757d; font-size: 14px; }
+    .error-details { background-color: #fff8f8; border-left: 4px solid #dc3545; padding: 10px; margin-top: 10px; }
+</style>"""
+
+# Serializes digest sends, so a digest is never built twice from the same entries
+_digest_lock = threading.Lock()
+
+# Set when a digest reaches DIGEST_MAX_RESULTS, to wake the task that sends digests (see app.py)
+digest_due = threading.Event()
+
+# Part of the email size budget kept for the HTML body and MIME headers
+EMAIL_BODY_ALLOWANCE = 256 * 1024
+
+# Growth of attachments from base64 encoding (4/3) and its line breaks
+BASE64_OVERHEAD = 1.37
 
 
 def validate_email(email):
@@ -26,22 +70,13 @@ def validate_email(email):
     pattern = r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$'
     return bool(re.match(pattern, email))
 
-def send_test_result_email(test_id, status, details, screenshots=None):
+def get_email_recipients():
     """
-    Send an email with test results and screenshots
+    Get the valid addresses from EMAIL_RECIPIENTS
 
-    Args:
-        test_id (str): Unique identifier for the test
-        status (str): 'PASSED' or 'FAILED'
-        details (dict): Dictionary containing test details
-        screenshots (list): List of dictionaries with screenshot data and filenames
+    Returns:
+        list: Valid recipient addresses
     """
-    # Check if email configuration is available
-    if not all([Config.SMTP_SERVER, Config.EMAIL_USERNAME, Config.EMAIL_PASSWORD]):
-        print("Email configuration is incomplete. Skipping email notification.")
-        return False
-
-    # Validate and filter recipients
     recipients = []
     if hasattr(Config, 'EMAIL_RECIPIENTS') and Config.EMAIL_RECIPIENTS:
         # Debug output to help diagnose issues
@@ -63,204 +98,745 @@ def send_test_result_email(test_id, status, details, screenshots=None):
             elif email:  # Only log if not empty
                 print(f"Warning: Invalid email format: '{email}'. Skipping this recipient.")
 
-    if not recipients:
-        print("No valid email recipients found. Skipping email notification.")
-        return False
+    return recipients
 
-    print(f"Sending email to {len(recipients)} recipient(s): {', '.join(recipients)}")
+def result_url(test_id):
+    """
+    Get the public URL of a test result
 
-    try:
-        # Create message container
-        msg = MIMEMultipart()
-        msg['From'] = Config.EMAIL_USERNAME
-        msg['To'] = ', '.join(recipients)
-        msg['Subject'] = f"VerixAI Automation Test {status}: {test_id}"
-
-        # Get test start and end times
-        start_time = datetime.fromisoformat(details.get('start_time')) if 'start_time' in details else datetime.now()
-        end_time = datetime.fromisoformat(details.get('end_time')) if 'end_time' in details else datetime.now()
-
-        # Calculate duration
-        duration_seconds = details.get('duration_seconds', 0)
-        minutes, seconds = divmod(int(duration_seconds), 60)
-        duration_formatted = f"{minutes}m {seconds}s"
-
-        # Get test cases if available
-        test_cases = details.get('test_cases', [])
-
-        # Get screenshot count
-        screenshot_count = details.get('screenshot_count', 0)
-
-        # Create HTML content with purple theme
-        html_content = f"""
-        <html>
-        <head>
-            <style>
-                body {{ font-family: Arial, sans-serif; margin: 0; padding: 20px; color: #333; }}
-                .header {{ background-color: #8200db; color: white; padding: 15px; border-radius: 5px 5px 0 0; }}
-                .content {{ padding: 20px; border: 1px solid #ddd; border-top: none; border-radius: 0 0 5px 5px; }}
-                .passed {{ color: #28a745; font-weight: bold; }}
-                .failed {{ color: #dc3545; font-weight: bold; }}
-                .test-case {{ margin-bottom: 20px; border: 1px solid #ddd; border-radius: 5px; overflow: hidden; }}
-                .test-case-header {{ padding: 10px; background-color: #f8f9fa; border-bottom: 1px solid #ddd; }}
-                .test-case-content {{ padding: 15px; }}
-                .test-case-passed {{ border-left: 4px solid #28a745; }}
-                .test-case-failed {{ border-left: 4px solid #dc3545; }}
-                table {{ border-collapse: collapse; width: 100%; margin-bottom: 20px; }}
-                th, td {{ border: 1px solid #ddd; padding: 8px; text-align: left; }}
-                th {{ background-color: #f2f2f2; }}
-                .summary {{ background-color: #f8f9fa; padding: 15px; margin-bottom: 20px; border-radius: 5px; }}
-                .footer {{ margin-top: 30px; font-size: 12px; color: #777; text-align: center; }}
-                .badge {{ display: inline-block; padding: 5px 10px; border-radius: 3px; font-size: 12px; font-weight: bold; }}
-                .badge-success {{ background-color: #28a745; color: white; }}
-                .badge-danger {{ background-color: #dc3545; color: white; }}
-                .badge-primary {{ background-color: #8200db; color: white; }}
-                .duration {{ color: #6c757d; font-size: 14px; }}
-                .error-details {{ background-color: #fff8f8; border-left: 4px solid #dc3545; padding: 10px; margin-top: 10px; }}
-            </style>
-        </head>
-        <body>
-            <div class="header">
-                <h2 style="margin: 0;">VerixAI Automation Test Result</h2>
+    Args:
+        test_id (str): ID of the test
+
+    Returns:
+        str: The URL, or None if PUBLIC_BASE_URL is not set
+    """
+    if not Config.PUBLIC_BASE_URL:
+        return None
+    return f"{Config.PUBLIC_BASE_URL.rstrip('/')}/api/test-results/{quote(test_id)}"
+
+def screenshot_url(test_id, filename):
+    """
+    Get the public URL of a screenshot of a test result
+
+    Args:
+        test_id (str): ID of the test
+        filename (str): Name of the screenshot
+
+    Returns:
+        str: The URL, or None if PUBLIC_BASE_URL is not set
+    """
+    base = result_url(test_id)
+    return f"{base}/screenshots/{quote(filename)}" if base else None
+
+def email_size_budget():
+    """
+    Get the size budget of an email from EMAIL_SIZE_BUDGET_MB
+
+    Returns:
+        int: Budget in bytes, or None for no limit
+    """
+    budget_mb = getattr(Config, 'EMAIL_SIZE_BUDGET_MB', 0)
+    return int(budget_mb * 1024 * 1024) if budget_mb and budget_mb > 0 else None
+
+def fit_screenshots(groups, budget_bytes=None):
+    """
+    Choose the screenshot attachments of an email within its size budget
+
+    The screenshots are attached as they are if they all fit. Otherwise each
+    group is downscaled into one contact-sheet image, taking an equal share
+    of what is left of the budget. Without Pillow, or if a group does not
+    fit even as a contact sheet, its screenshots are attached in order while
+    they fit. Screenshots that are not attached are to be linked instead.
+
+    Args:
+        groups (list): (group name, screenshots) tuples, each screenshot a dict with filename,
+            data and content_type
+        budget_bytes (int, optional): Size budget of the email (None for no limit)
+
+    Returns:
+        dict: 'mode' ('original', 'contact_sheet', or 'partial' if no contact sheet could be made),
+            'attachments' (screenshot dicts),
+            'contact_sheets' (group name -> filename) and 'linked' (filenames)
+    """
+    screenshots = [screenshot for _, group in groups for screenshot in group]
+    plan = {'mode': 'original', 'attachments': screenshots, 'contact_sheets': {}, 'linked': []}
+    if budget_bytes is None:
+        return plan
+
+    available = (budget_bytes - EMAIL_BODY_ALLOWANCE) / BASE64_OVERHEAD
+    if sum(len(screenshot['data']) for screenshot in screenshots) <= available:
+        return plan
+
+    plan.update(mode='contact_sheet', attachments=[])
+    for index, (name, group) in enumerate(groups):
+        share = max(0, available / (len(groups) - index))
+        sheet = build_contact_sheet([(screenshot['filename'], screenshot['data']) for screenshot in group],
+                                    max_bytes=share)
+        if sheet:
+            data, content_type = sheet
+            slug = re.sub(r'[^A-Za-z0-9]+', '_', name).strip('_').lower() or 'screenshots'
+            extension = content_type.split('/')[-1].replace('jpeg', 'jpg')
+            filename = f"{index + 1:02d}_{slug}_contact_sheet.{extension}"
+            plan['attachments'].append({'filename': filename, 'data': data, 'content_type': content_type})
+            plan['contact_sheets'][name] = filename
+            plan['linked'].extend(screenshot['filename'] for screenshot in group)
+            available -= len(data)
+            continue
+
+        used = 0
+        for screenshot in group:
+            if used + len(screenshot['data']) <= share:
+                plan['attachments'].append(screenshot)
+                used += len(screenshot['data'])
+            else:
+                plan['linked'].append(screenshot['filename'])
+        available -= used
+
+    if not plan['contact_sheets']:
+        plan['mode'] = 'partial'
+    return plan
+
+def group_screenshots_by_case(details, screenshots):
+    """
+    Group the screenshots of a result by the test case they were taken in
+
+    Args:
+        details (dict): Result details
+        screenshots (list): Dicts with the filename, data and content type of each screenshot
+
+    Returns:
+        list: (test case name, screenshots) tuples; screenshots of no test case come last, as 'Other'
+    """
+    by_filename = {screenshot['filename']: screenshot for screenshot in screenshots or []}
+    groups = []
+    for test_case in details.get('test_cases', []):
+        case_screenshots = [by_filename.pop(filename) for filename in test_case.get('screenshots', [])
+                            if filename in by_filename]
+        if case_screenshots:
+            groups.append((test_case.get('name'), case_screenshots))
+    if by_filename:
+        groups.append(('Other', list(by_filename.values())))
+    return groups
+
+def build_test_result_email(test_id, status, details, screenshots=None, recipients=None, plan=None):
+    """
+    Build the email with test results and screenshots
+
+    Args:
+        test_id (str): Unique identifier for the test
+        status (str): 'PASSED' or 'FAILED'
+        details (dict): Dictionary containing test details
+        screenshots (list): List of dictionaries with screenshot data and filenames
+        recipients (list, optional): Recipient addresses (defaults to get_email_recipients())
+        plan (dict, optional): Attachments chosen by fit_screenshots (defaults to fitting the
+            screenshots in EMAIL_SIZE_BUDGET_MB)
+
+    Returns:
+        MIMEMultipart: The message
+    """
+    if recipients is None:
+        recipients = get_email_recipients()
+    if plan is None:
+        plan = fit_screenshots(group_screenshots_by_case(details, screenshots), email_size_budget())
+    linked = set(plan['linked'])
+
+    # Create message container
+    msg = MIMEMultipart()
+    msg['From'] = Config.EMAIL_USERNAME
+    msg['To'] = ', '.join(recipients)
+    msg['Subject'] = f"VerixAI Automation Test {status}: {test_id}"
+
+    # Stages flagged as slower than their baseline (see utils/regression_utils.py)
+    regressions = details.get('performance_regressions') or []
+    regressed_stages = {regression['stage']: regression for regression in regressions}
+    if regressions:
+        msg.replace_header('Subject', f"{msg['Subject']} ({len(regressions)} performance regression"
+                                      f"{'s' if len(regressions) != 1 else ''})")
+
+    # Get test start and end times
+    start_time = datetime.fromisoformat(details.get('start_time')) if 'start_time' in details else datetime.now()
+    end_time = datetime.fromisoformat(details.get('end_time')) if 'end_time' in details else datetime.now()
+
+    # Calculate duration
+    duration_seconds = details.get('duration_seconds', 0)
+    minutes, seconds = divmod(int(duration_seconds), 60)
+    duration_formatted = f"{minutes}m {seconds}s"
+
+    # Get test cases if available
+    test_cases = details.get('test_cases', [])
+
+    # Get screenshot count
+    screenshot_count = details.get('screenshot_count', 0)
+
+    # Result of the stage time budgets, if any are set
+    performance_status = details.get('performance_status')
+    performance_status_html = ""
+    if performance_status:
+        over_budget = details.get('over_budget_stages') or []
+        performance_status_html = (
+            f'<p>Performance: <span class="badge badge-{"warning" if over_budget else "success"}">'
+            f'{performance_status}</span>{" " + ", ".join(over_budget) if over_budget else ""}</p>'
+        )
+
+    if plan['mode'] == 'contact_sheet':
+        screenshot_note = "downscaled into contact sheets attached to this email, full size linked below"
+    elif linked:
+        screenshot_note = f"{len(plan['attachments'])} attached to this email, the others linked below"
+    else:
+        screenshot_note = "attached to this email"
+
+    # Create HTML content with purple theme
+    html_content = f"""
+    <html>
+    <head>
+        {EMAIL_STYLE}
+    </head>
+    <body>
+        <div class="header">
+            <h2 style="margin: 0;">VerixAI Automation Test Result</h2>
+        </div>
+        <div class="content">
+            <div class="summary">
+                <h3>Test Summary</h3>
+                <p>Test ID: <strong>{test_id}</strong></p>
+                <p>Overall Status: <span class="badge badge-{'success' if status == 'PASSED' else 'danger'}">{status}</span></p>
+                <p>Start Time: {start_time.strftime('%Y-%m-%d %H:%M:%S')}</p>
+                <p>End Time: {end_time.strftime('%Y-%m-%d %H:%M:%S')}</p>
+                <p>Total Duration: <span class="duration">{duration_formatted}</span></p>
+                {performance_status_html}
+                <p>Screenshots: {screenshot_count} ({screenshot_note})</p>
             </div>
-            <div class="content">
-                <div class="summary">
-                    <h3>Test Summary</h3>
-                    <p>Test ID: <strong>{test_id}</strong></p>
-                    <p>Overall Status: <span class="badge badge-{'success' if status == 'PASSED' else 'danger'}">{status}</span></p>
-                    <p>Start Time: {start_time.strftime('%Y-%m-%d %H:%M:%S')}</p>
-                    <p>End Time: {end_time.strftime('%Y-%m-%d %H:%M:%S')}</p>
-                    <p>Total Duration: <span class="duration">{duration_formatted}</span></p>
-                    <p>Screenshots: {screenshot_count} (attached to this email)</p>
-                </div>
+    """
+
+    # Add test parameters if available
+    if 'test_params' in details:
+        html_content += """
+            <h3>Test Parameters</h3>
+            <table>
+                <tr>
+                    <th>Parameter</th>
+                    <th>Value</th>
+                </tr>
         """
 
-        # Add test parameters if available
-        if 'test_params' in details:
-            html_content += """
-                <h3>Test Parameters</h3>
-                <table>
-                    <tr>
-                        <th>Parameter</th>
-                        <th>Value</th>
-                    </tr>
-            """
+        test_params = details.get('test_params', {})
 
-            test_params = details.get('test_params', {})
+        # Add case details if available
+        if 'case_details' in test_params:
+            for key, value in test_params['case_details'].items():
+                html_content += f"""
+                <tr>
+                    <td>Case {key.replace('_', ' ').title()}</td>
+                    <td>{value}</td>
+                </tr>
+                """
 
-            # Add case details if available
-            if 'case_details' in test_params:
-                for key, value in test_params['case_details'].items():
-                    html_content += f"""
-                    <tr>
-                        <td>Case {key.replace('_', ' ').title()}</td>
-                        <td>{value}</td>
-                    </tr>
-                    """
+        html_content += """
+            </table>
+        """
 
-            html_content += """
-                </table>
-            """
+    # Add error details if test failed
+    if status == 'FAILED' and 'error_message' in details:
+        html_content += f"""
+            <h3>Error Details</h3>
+            <div class="error-details">
+                <pre>{details['error_message']}</pre>
+            </div>
+        """
 
-        # Add error details if test failed
-        if status == 'FAILED' and 'error_message' in details:
+    # Add the performance regressions, if any
+    if regressions:
+        html_content += """
+            <h3>Performance Regressions</h3>
+            <table>
+                <tr>
+                    <th>Stage</th>
+                    <th>Duration</th>
+                    <th>Baseline Median</th>
+                    <th>Slowdown</th>
+                    <th>Robust Z</th>
+                    <th>Baseline Runs</th>
+                </tr>
+        """
+        for regression in regressions:
             html_content += f"""
-                <h3>Error Details</h3>
-                <div class="error-details">
-                    <pre>{details['error_message']}</pre>
-                </div>
+                <tr>
+                    <td>{regression['stage']}</td>
+                    <td>{regression['duration_seconds']}s</td>
+                    <td>{regression['baseline_median_seconds']}s (MAD {regression['baseline_mad_seconds']}s)</td>
+                    <td>+{regression['slowdown_percent']}%</td>
+                    <td>{regression['robust_z']}</td>
+                    <td>{regression['baseline_runs']}</td>
+                </tr>
             """
+        html_content += """
+            </table>
+        """
 
-        # Add individual test cases if available
-        if test_cases:
-            html_content += """
-                <h3>Individual Test Cases</h3>
-            """
+    # Add individual test cases if available
+    if test_cases:
+        html_content += """
+            <h3>Individual Test Cases</h3>
+        """
 
-            for test_case in test_cases:
-                case_name = test_case.get('name')
-                case_status = test_case.get('status')
-                case_duration = test_case.get('duration_seconds', 0)
-                case_minutes, case_seconds = divmod(int(case_duration), 60)
-                case_duration_formatted = f"{case_minutes}m {case_seconds}s"
+        for test_case in test_cases:
+            case_name = test_case.get('name')
+            case_status = test_case.get('status')
+            case_duration = test_case.get('duration_seconds', 0)
+            case_minutes, case_seconds = divmod(int(case_duration), 60)
+            case_duration_formatted = f"{case_minutes}m {case_seconds}s"
+
+            # Get screenshot count and add to the display if available
+            case_screenshots = test_case.get('screenshots', [])
+            case_screenshot_info = f" ({len(case_screenshots)} screenshots)" if case_screenshots else ""
+
+            # Flag stages slower than their baseline
+            regression = regressed_stages.get(case_name)
+            case_badges = (f' <span class="badge badge-warning">+{regression["slowdown_percent"]}% SLOWER</span>'
+                           if regression else "")
+
+            # Flag stages over their time budget
+            budget_info = ""
+            if test_case.get('budget_seconds') is not None:
+                budget_info = f" / budget {test_case['budget_seconds']:g}s"
+                if test_case.get('performance_status') == 'SLOW':
+                    case_badges += ' <span class="badge badge-warning">SLOW</span>'
 
-                # Get screenshot count and add to the display if available
-                case_screenshots = test_case.get('screenshots', [])
-                case_screenshot_info = f" ({len(case_screenshots)} screenshots)" if case_screenshots else ""
+            html_content += f"""
+                <div class="test-case test-case-{'passed' if case_status == 'PASSED' else 'failed'}">
+                    <div class="test-case-header">
+                        <h4 style="margin: 0;">{case_name} <span class="badge badge-{'success' if case_status == 'PASSED' else 'danger'}">{case_status}</span>{case_badges}</h4>
+                        <p class="duration">Duration: {case_duration_formatted}{budget_info}{case_screenshot_info}</p>
+                    </div>
+                    <div class="test-case-content">
+            """
 
+            # Point to the contact sheet and link the screenshots not attached
+            if case_name in plan['contact_sheets']:
                 html_content += f"""
-                    <div class="test-case test-case-{'passed' if case_status == 'PASSED' else 'failed'}">
-                        <div class="test-case-header">
-                            <h4 style="margin: 0;">{case_name} <span class="badge badge-{'success' if case_status == 'PASSED' else 'danger'}">{case_status}</span></h4>
-                            <p class="duration">Duration: {case_duration_formatted}{case_screenshot_info}</p>
-                        </div>
-                        <div class="test-case-content">
+                        <p class="duration">Contact sheet: {plan['contact_sheets'][case_name]}</p>
+                """
+            case_linked = [filename for filename in case_screenshots if filename in linked]
+            if case_linked:
+                links = [f'<a href="{screenshot_url(test_id, filename)}">{filename}</a>' if Config.PUBLIC_BASE_URL
+                         else filename for filename in case_linked]
+                html_content += f"""
+                        <p class="duration">Full size: {', '.join(links)}</p>
                 """
 
-                # Add error message if test case failed
-                if case_status == 'FAILED' and 'error_message' in test_case:
-                    html_content += f"""
-                            <div class="error-details">
-                                <h5>Error Details:</h5>
-                                <pre>{test_case['error_message']}</pre>
-                            </div>
-                    """
+            if regression:
+                html_content += f"""
+                        <div class="regression-details">
+                            Took {regression['duration_seconds']}s against a median of {regression['baseline_median_seconds']}s
+                            over the last {regression['baseline_runs']} passing runs.
+                        </div>
+                """
 
-                html_content += """
+            # Add error message if test case failed
+            if case_status == 'FAILED' and 'error_message' in test_case:
+                html_content += f"""
+                        <div class="error-details">
+                            <h5>Error Details:</h5>
+                            <pre>{test_case['error_message']}</pre>
                         </div>
-                    </div>
                 """
 
-        # Add footer
-        html_content += """
-                <div class="footer">
-                    <p>This is an automated email from the VerixAI Automation System.</p>
-                    <p>Screenshots are attached to this email.</p>
+            html_content += """
+                    </div>
                 </div>
+            """
+
+    # Add footer
+    if linked:
+        footer_note = (f"Screenshots are downscaled or linked to keep this email under "
+                       f"{Config.EMAIL_SIZE_BUDGET_MB:g} MB.")
+        if not Config.PUBLIC_BASE_URL:
+            footer_note += f" Full-size screenshots are served at /api/test-results/{test_id}/screenshots/."
+    else:
+        footer_note = "Screenshots are attached to this email."
+    html_content += f"""
+            <div class="footer">
+                <p>This is an automated email from the VerixAI Automation System.</p>
+                <p>{footer_note}</p>
+            </div>
+        </div>
+    </body>
+    </html>
+    """
+
+    # Attach HTML content
+    msg.attach(MIMEText(html_content, 'html'))
+
+    # Attach the screenshots or contact sheets that fit
+    if plan['attachments']:
+        for i, screenshot in enumerate(plan['attachments']):
+            try:
+                # Get screenshot data and filename
+                img_data = screenshot.get('data')
+                filename = screenshot.get('filename')
+
+                if img_data and filename:
+                    subtype = screenshot.get('content_type', 'image/png').split('/')[-1]
+                    image = MIMEImage(img_data, _subtype=subtype)
+                    image.add_header('Content-Disposition', f'attachment; filename="{filename}"')
+                    msg.attach(image)
+            except Exception as e:
+                print(f"Error attaching screenshot {i+1}: {str(e)}")
+
+    return msg
+
+def digest_summary(details, emailed=False):
+    """
+    Keep what a digest email shows of a result
+
+    Args:
+        details (dict): Result details
+        emailed (bool): Whether the result was also emailed on its own
+
+    Returns:
+        dict: Summary of the result
+    """
+    return {
+        'test_id': details.get('test_id'),
+        'status': details.get('status'),
+        'start_time': details.get('start_time'),
+        'duration_seconds': details.get('duration_seconds'),
+        'error_message': details.get('error_message'),
+        'performance_status': details.get('performance_status'),
+        'regression_count': len(details.get('performance_regressions') or []),
+        'test_cases': [
+            {key: case.get(key) for key in ('name', 'status', 'duration_seconds', 'performance_status')}
+            for case in details.get('test_cases') or []
+        ],
+        'screenshot_objects': {
+            filename: {key: handle.get(key) for key in ('sha256', 'content_type', 'duplicate_of')}
+            for filename, handle in (details.get('screenshot_objects') or {}).items()
+        },
+        'emailed': emailed
+    }
+
+def build_digest_email(env, summaries, recipients):
+    """
+    Build one email summarizing many test results
+
+    It holds a pass/fail table, the stage durations of each result and links
+    to the screenshots (with PUBLIC_BASE_URL). Only the screenshots of failed
+    results not already emailed on their own are attached.
+
+    Args:
+        env (str): Environment of the results
+        summaries (list): Result summaries from digest_summary, oldest first
+        recipients (list): Recipient addresses
+
+    Returns:
+        MIMEMultipart: The message
+    """
+    failed = [summary for summary in summaries if summary['status'] != 'PASSED']
+    passed_count = len(summaries) - len(failed)
+
+    msg = MIMEMultipart()
+    msg['From'] = Config.EMAIL_USERNAME
+    msg['To'] = ', '.join(recipients)
+    msg['Subject'] = (f"VerixAI Automation Digest ({env}): {passed_count} passed, "
+                      f"{len(failed)} failed of {len(summaries)} test{'s' if len(summaries) != 1 else ''}")
+
+    starts = [summary['start_time'] for summary in summaries if summary.get('start_time')]
+    period = f"{min(starts)[:16].replace('T', ' ')} to {max(starts)[:16].replace('T', ' ')}" if starts else "-"
+
+    html_content = f"""
+    <html>
+    <head>
+        {EMAIL_STYLE}
+    </head>
+    <body>
+        <div class="header">
+            <h2 style="margin: 0;">VerixAI Automation Digest</h2>
+        </div>
+        <div class="content">
+            <div class="summary">
+                <h3>Summary</h3>
+                <p>Environment: <strong>{env}</strong></p>
+                <p>Tests started: {period}</p>
+                <p><span class="passed">{passed_count} passed</span>, <span class="failed">{len(failed)} failed</span></p>
             </div>
-        </body>
-        </html>
+            <h3>Results</h3>
+            <table>
+                <tr>
+                    <th>Test ID</th>
+                    <th>Status</th>
+                    <th>Start Time</th>
+                    <th>Duration</th>
+                    <th>Screenshots</th>
+                </tr>
+    """
+
+    for summary in summaries:
+        test_id = summary['test_id']
+        url = result_url(test_id)
+        test_link = f'<a href="{url}">{test_id}</a>' if url else test_id
+        status = summary['status']
+        notes = ""
+        if summary.get('performance_status') == 'OVER_BUDGET':
+            notes += ' <span class="badge badge-warning">OVER BUDGET</span>'
+        if summary.get('regression_count'):
+            notes += f' <span class="badge badge-warning">{summary["regression_count"]} SLOWER</span>'
+        if summary.get('emailed'):
+            notes += ' (emailed separately)'
+
+        screenshots = [filename for filename, handle in summary.get('screenshot_objects', {}).items()
+                       if not handle.get('duplicate_of')]
+        if screenshots and url:
+            screenshot_links = ', '.join(
+                f'<a href="{screenshot_url(test_id, filename)}">{filename}</a>' for filename in screenshots)
+        else:
+            screenshot_links = str(len(screenshots))
+
+        minutes, seconds = divmod(int(summary.get('duration_seconds') or 0), 60)
+        html_content += f"""
+                <tr>
+                    <td>{test_link}</td>
+                    <td><span class="badge badge-{'success' if status == 'PASSED' else 'danger'}">{status}</span>{notes}</td>
+                    <td>{(summary.get('start_time') or '')[:19].replace('T', ' ')}</td>
+                    <td class="duration">{minutes}m {seconds}s</td>
+                    <td>{screenshot_links}</td>
+                </tr>
         """
+    html_content += """
+            </table>
+    """
 
-        # Attach HTML content
-        msg.attach(MIMEText(html_content, 'html'))
+    # Stage durations, one column per stage in the order the stages first appear
+    stages = []
+    for summary in summaries:
+        for case in summary.get('test_cases', []):
+            if case.get('name') and case['name'] not in stages:
+                stages.append(case['name'])
+    if stages:
+        html_content += """
+            <h3>Stage Durations</h3>
+            <table>
+                <tr>
+                    <th>Test ID</th>
+        """
+        html_content += ''.join(f"""
+                    <th>{stage}</th>""" for stage in stages)
+        html_content += """
+                </tr>
+        """
+        for summary in summaries:
+            cases = {case.get('name'): case for case in summary.get('test_cases', [])}
+            cells = []
+            for stage in stages:
+                case = cases.get(stage)
+                if case is None:
+                    cells.append('<td>-</td>')
+                    continue
+                css = 'passed' if case.get('status') == 'PASSED' else 'failed'
+                slow = ' <span class="badge badge-warning">SLOW</span>' if case.get('performance_status') == 'SLOW' else ''
+                cells.append(f'<td><span class="{css}">{case.get("duration_seconds") or 0:.1f}s</span>{slow}</td>')
+            html_content += f"""
+                <tr>
+                    <td>{summary['test_id']}</td>
+                    {''.join(cells)}
+                </tr>
+            """
+        html_content += """
+            </table>
+        """
 
-        # Attach screenshots if provided
+    # Error details of the failed results
+    if failed:
+        html_content += """
+            <h3>Failures</h3>
+        """
+        for summary in failed:
+            html_content += f"""
+            <div class="test-case test-case-failed">
+                <div class="test-case-header">
+                    <h4 style="margin: 0;">{summary['test_id']} <span class="badge badge-danger">{summary['status']}</span></h4>
+                </div>
+                <div class="test-case-content">
+                    <div class="error-details">
+                        <pre>{summary.get('error_message') or 'No error message'}</pre>
+                    </div>
+                </div>
+            </div>
+            """
+
+    # Attach the screenshots of failed results, loaded from the screenshot store, within the size
+    # budget (one contact sheet per result if they do not all fit)
+    store = get_screenshot_store()
+    groups = []
+    for summary in failed:
+        if summary.get('emailed'):
+            continue
+        screenshots = []
+        for filename, handle in summary.get('screenshot_objects', {}).items():
+            if handle.get('duplicate_of') or not handle.get('sha256'):
+                continue
+            data = store.get(handle['sha256'])
+            if data is not None:
+                screenshots.append({'filename': f"{summary['test_id']}_{filename}", 'data': data,
+                                    'content_type': handle.get('content_type') or 'image/png'})
         if screenshots:
-            for i, screenshot in enumerate(screenshots):
-                try:
-                    # Get screenshot data and filename
-                    img_data = screenshot.get('data')
-                    filename = screenshot.get('filename')
-
-                    if img_data and filename:
-                        image = MIMEImage(img_data)
-                        image.add_header('Content-Disposition', f'attachment; filename="{filename}"')
-                        msg.attach(image)
-                except Exception as e:
-                    print(f"Error attaching screenshot {i+1}: {str(e)}")
-
-        # Connect to SMTP server and send email
+            groups.append((summary['test_id'], screenshots))
+
+    plan = fit_screenshots(groups, email_size_budget())
+
+    # Say what was attached, from the plan
+    if not plan['attachments']:
+        footer_note = "No screenshots are attached to this email."
+    elif plan['mode'] == 'contact_sheet':
+        footer_note = ("Screenshots of failed tests are downscaled into contact sheets attached to this email, "
+                       "one per test, to keep it under the size limit.")
+    elif plan['linked']:
+        footer_note = (f"{len(plan['attachments'])} screenshots of failed tests are attached to this email; "
+                       f"the others did not fit in its size limit.")
+    else:
+        footer_note = "Screenshots of failed tests are attached to this email."
+
+    html_content += f"""
+            <div class="footer">
+                <p>This is an automated digest from the VerixAI Automation System.</p>
+                <p>{footer_note}</p>
+            </div>
+        </div>
+    </body>
+    </html>
+    """
+
+    msg.attach(MIMEText(html_content, 'html'))
+
+    for screenshot in plan['attachments']:
         try:
-            with smtplib.SMTP(Config.SMTP_SERVER, Config.SMTP_PORT) as server:
-                server.starttls()
-                server.login(Config.EMAIL_USERNAME, Config.EMAIL_PASSWORD)
-                server.send_message(msg)
+            image = MIMEImage(screenshot['data'], _subtype=screenshot['content_type'].split('/')[-1])
+            image.add_header('Content-Disposition', f'attachment; filename="{screenshot["filename"]}"')
+            msg.attach(image)
+        except Exception as e:
+            print(f"Error attaching screenshot {screenshot['filename']}: {str(e)}")
+
+    return msg
+
+def send_due_digests(force=False):
+    """
+    Queue the digest email of every environment whose digest is due
+
+    A digest is due once its oldest result has waited DIGEST_WINDOW_MINUTES
+    or DIGEST_MAX_RESULTS results are waiting. The results are removed from
+    the digest in the same transaction that queues the email.
+
+    Args:
+        force (bool): Send every waiting digest, due or not
+
+    Returns:
+        int: Number of digest emails queued
+    """
+    with _digest_lock:
+        outbox = get_email_outbox()
+        queued = 0
+        for env, backlog in outbox.get_digest_backlog().items():
+            env_config = config_by_env.get(env, Config)
+            waited = time.time() - backlog['oldest_added_at']
+            if (not force and backlog['count'] < env_config.DIGEST_MAX_RESULTS
+                    and waited < env_config.DIGEST_WINDOW_MINUTES * 60):
+                continue
+
+            recipients = get_email_recipients()
+            if not recipients:
+                print(f"No valid email recipients found. Keeping the {env} digest.")
+                continue
+
+            try:
+                entries = outbox.get_digest_entries(env)
+                msg = build_digest_email(env, [summary for _, summary in entries], recipients)
+                message_id = outbox.enqueue(msg, recipients, digest_entry_ids=[entry_id for entry_id, _ in entries])
+                print(f"✅ Digest email {message_id} with {len(entries)} {env} results queued for delivery")
+                queued += 1
+            except Exception as e:
+                print(f"Error preparing the {env} digest email: {str(e)}")
+        return queued
+
+def send_test_result_email(test_id, status, details, screenshots=None):
+    """
+    Queue an email with test results and screenshots
+
+    The email is built here and delivered by the email outbox on a
+    background thread (see utils/outbox_utils.py), so this never waits on SMTP.
 
-                # Format recipient list for logging
-                recipient_list = ', '.join(recipients)
-                print(f"✅ Email notification sent successfully to: {recipient_list}")
+    In an environment with EMAIL_MODE 'digest' the result is held for the
+    next digest email instead, unless it failed and DIGEST_FAILURES_IMMEDIATE
+    is set, in which case it is emailed now and also listed in the digest.
 
-                # Log screenshot count
-                if screenshots:
-                    print(f"   - Attached {len(screenshots)} screenshots to the email")
+    Screenshots are fitted into EMAIL_SIZE_BUDGET_MB (see fit_screenshots).
 
-                return True
+    Args:
+        test_id (str): Unique identifier for the test
+        status (str): 'PASSED' or 'FAILED'
+        details (dict): Dictionary containing test details
+        screenshots (list): List of dictionaries with screenshot data and filenames
+
+    Returns:
+        dict: Report of the queued email (attachment_mode, attachment_count, attached_bytes,
+            linked_screenshots, email_bytes, size_budget_bytes), or False if it was not queued
+    """
+    # Check if email configuration is available
+    if not all([Config.SMTP_SERVER, Config.EMAIL_USERNAME, Config.EMAIL_PASSWORD]):
+        print("Email configuration is incomplete. Skipping email notification.")
+        return False
+
+    recipients = get_email_recipients()
+    if not recipients:
+        print("No valid email recipients found. Skipping email notification.")
+        return False
+
+    env = (details.get('test_params') or {}).get('env', 'dev')
+    env_config = config_by_env.get(env, Config)
+    if getattr(env_config, 'EMAIL_MODE', 'immediate') == 'digest':
+        immediate = status != 'PASSED' and env_config.DIGEST_FAILURES_IMMEDIATE
+        try:
+            waiting = get_email_outbox().add_digest_entry(env, test_id, status, digest_summary(details, immediate))
+            print(f"Result added to the {env} digest ({waiting} waiting)")
+            if waiting >= env_config.DIGEST_MAX_RESULTS:
+                # Built off the test thread, which should never wait on mail
+                digest_due.set()
         except Exception as e:
-            print(f"❌ SMTP Error: {str(e)}")
-            print("   Email notification could not be sent. This is non-critical and the test will continue.")
-            return False
+            print(f"Error adding result to the {env} digest: {str(e)}")
+            immediate = True
+        if not immediate:
+            return {'attachment_mode': 'digest', 'attachment_count': 0, 'attached_bytes': 0,
+                    'linked_screenshots': 0, 'email_bytes': 0, 'size_budget_bytes': email_size_budget()}
 
+    print(f"Queueing email to {len(recipients)} recipient(s): {', '.join(recipients)}")
+
+    try:
+        budget = email_size_budget()
+        plan = fit_screenshots(group_screenshots_by_case(details, screenshots), budget)
+        msg = build_test_result_email(test_id, status, details, screenshots, recipients, plan)
+        email_bytes = len(msg.as_bytes())
+        message_id = get_email_outbox().enqueue(msg, recipients, test_id=test_id)
+        print(f"✅ Email notification {message_id} queued for delivery")
+
+        report = {
+            'attachment_mode': plan['mode'],
+            'attachment_count': len(plan['attachments']),
+            'attached_bytes': sum(len(attachment['data']) for attachment in plan['attachments']),
+            'linked_screenshots': len(plan['linked']),
+            'email_bytes': email_bytes,
+            'size_budget_bytes': budget
+        }
+
+        # Log what was attached
+        if plan['mode'] == 'contact_sheet':
+            print(f"   - Downscaled {len(screenshots)} screenshots into {len(plan['contact_sheets'])} contact sheets "
+                  f"({report['attached_bytes'] / 1024:.0f} KB attached, {len(plan['linked'])} linked)")
+        elif plan['linked']:
+            print(f"   - Attached {len(plan['attachments'])} screenshots to the email, {len(plan['linked'])} linked")
+        elif screenshots:
+            print(f"   - Attached {len(plan['attachments'])} screenshots to the email")
+        if budget and email_bytes > budget:
+            print(f"Warning: Email of {email_bytes / 1024 / 1024:.1f} MB is over the size budget")
+
+        return report
     except Exception as e:
         print(f"Error preparing email: {str(e)}")
         print("Email notification could not be prepared. This is non-critical and the test will continue.")
@@ -274,7 +850,7 @@ def send_test_result_email_from_json(test_result_json_path):
         test_result_json_path (str): Path to the test result JSON file
 
     Returns:
-        bool: True if email was sent successfully, False otherwise
+        dict: Report of the queued email (see send_test_result_email), or False if it was not queued
     """
     try:
         print(f"Preparing email from test result JSON: {test_result_json_path}")
@@ -298,7 +874,15 @@ def send_test_result_email_from_json(test_result_json_path):
             print("❌ Error: Test status not found in result JSON")
             return False
 
-        screenshots = test_result.get('screenshots', [])
+        # Load the screenshot bytes from the screenshot store
+        store = get_screenshot_store()
+        screenshots = []
+        for filename, handle in test_result.get('screenshot_objects', {}).items():
+            if handle.get('duplicate_of'):
+                continue
+            data = store.get(handle['sha256'])
+            if data is not None:
+                screenshots.append({'filename': filename, 'data': data, 'content_type': handle['content_type']})
         print(f"Found {len(screenshots)} screenshots in test result")
 
         # Send the email
@@ -0,0 +1,122 @@
+import re
+import json
+from xml.sax.saxutils import escape as _escape, quoteattr as _quoteattr
+
+
+# Export formats: media type and file extension
+EXPORT_FORMATS = {
+    'ndjson': ('application/x-ndjson', 'ndjson'),
+    'junit': ('application/xml', 'xml')
+}
+
+
+# Characters XML 1.0 does not allow, even escaped (e.g. the ANSI escapes of console output)
+INVALID_XML_CHARS = re.compile('[^\u0009\u000A\u000D\u0020-\uD7FF\uE000-\uFFFD\U00010000-\U0010FFFF]')
+
+
+def escape(text):
+    """Escape text for XML, dropping the characters XML 1.0 does not allow"""
+    return _escape(INVALID_XML_CHARS.sub('', str(text)))
+
+
+def quoteattr(text):
+    """Quote an XML attribute value, dropping the characters XML 1.0 does not allow"""
+    return _quoteattr(INVALID_XML_CHARS.sub('', str(text)))
+
+
+def ndjson_lines(results):
+    """
+    Write results as newline-delimited JSON
+
+    Args:
+        results (iterable): Result details, e.g. from ResultStore.iter_results
+
+    Yields:
+        str: One line of JSON per result
+    """
+    for details in results:
+        yield json.dumps(details) + '\n'
+
+
+def _junit_time(seconds):
+    """Format a duration for a JUnit time attribute"""
+    return f"{seconds or 0:.3f}"
+
+
+def junit_testsuite(details):
+    """
+    Write a result as a JUnit testsuite element with a testcase per test case
+
+    Failed test cases get a failure element. Test cases that never ended
+    (e.g. in an interrupted run) are reported as errors, and stages over
+    their time budget note it in system-out. A result that did not pass
+    without any failed test case (an error before the first stage, a run
+    killed between stages or interrupted) gets an extra testcase with an
+    error holding its error message, so the suite is never green.
+
+    Args:
+        details (dict): Result details
+
+    Returns:
+        str: The testsuite element
+    """
+    env = (details.get('test_params') or {}).get('env', 'dev')
+    test_cases = details.get('test_cases') or []
+    failures = sum(1 for case in test_cases if case.get('status') == 'FAILED')
+    errors = sum(1 for case in test_cases if case.get('status') not in ('PASSED', 'FAILED'))
+    run_error = details.get('status') != 'PASSED' and not failures
+
+    lines = [
+        f'  <testsuite name={quoteattr(details["test_id"])} tests="{len(test_cases) + run_error}" '
+        f'failures="{failures}" errors="{errors + run_error}" time="{_junit_time(details.get("duration_seconds"))}" '
+        f'timestamp={quoteattr(details.get("start_time") or "")}>',
+        '    <properties>',
+        f'      <property name="env" value={quoteattr(env)}/>',
+        f'      <property name="status" value={quoteattr(details.get("status") or "")}/>'
+    ]
+    if details.get('saved_at'):
+        lines.append(f'      <property name="saved_at" value={quoteattr(details["saved_at"])}/>')
+    if details.get('performance_status'):
+        lines.append(f'      <property name="performance_status" value={quoteattr(details["performance_status"])}/>')
+    lines.append('    </properties>')
+
+    for case in test_cases:
+        lines.append(f'    <testcase classname={quoteattr(f"verixai.{env}")} name={quoteattr(case.get("name") or "")} '
+                     f'time="{_junit_time(case.get("duration_seconds"))}">')
+        status = case.get('status')
+        message = case.get('error_message') or ''
+        if status == 'FAILED':
+            lines.append(f'      <failure message={quoteattr(message)}>{escape(message)}</failure>')
+        elif status != 'PASSED':
+            lines.append(f'      <error message={quoteattr(f"Test case did not end ({status})")}/>')
+        if case.get('performance_status') == 'SLOW':
+            note = f"Over its time budget of {case.get('budget_seconds')}s"
+            lines.append(f'      <system-out>{escape(note)}</system-out>')
+        lines.append('    </testcase>')
+
+    if run_error:
+        message = details.get('error_message') or f"Test run ended {details.get('status')}"
+        lines.append(f'    <testcase classname={quoteattr(f"verixai.{env}")} name="Test run" '
+                     f'time="{_junit_time(details.get("duration_seconds"))}">')
+        lines.append(f'      <error message={quoteattr(message)}>{escape(message)}</error>')
+        lines.append('    </testcase>')
+
+    lines.append('  </testsuite>')
+    return '\n'.join(lines) + '\n'
+
+
+def junit_xml(results):
+    """
+    Write results as a JUnit XML document with a testsuite per result
+
+    Args:
+        results (iterable): Result details, e.g. from ResultStore.iter_results
+
+    Yields:
+        str: Chunks of the XML document
+    """
+    yield '<?xml version="1.0" encoding="UTF-8"?>\n'
+    yield '<testsuites name="VerixAI Automation">\n'
+    for details in results:
+        yield junit_testsuite(details)
+    yield '</testsuites>\n'
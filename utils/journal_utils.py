@@ -0,0 +1,127 @@
+import os
+import json
+import tempfile
+import threading
+from datetime import datetime
+
+
+class RunJournal:
+    """Class to record run lifecycle events in an append-only JSON lines file
+
+    Every event is one line flushed to disk as it happens, so the state of
+    the runs in flight survives a crash or a pod restart. Replaying the file
+    rebuilds that state. The file is compacted every compact_every events
+    by rewriting it as one snapshot line per run still tracked, which keeps
+    replay fast however long the server has been up. A line cut short by a
+    crash is skipped on replay.
+    """
+
+    def __init__(self, path, compact_every=1000):
+        """
+        Initialize the journal, creating the file if needed
+
+        Args:
+            path (str): Path of the journal file
+            compact_every (int): Number of events appended between two compactions
+        """
+        self.path = path
+        self.compact_every = compact_every
+        self.events_since_compaction = 0
+        self.lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.file = open(path, 'a', encoding='utf-8')
+
+    def _write(self, entry):
+        """Write an entry and flush it to disk; must be called with the lock held"""
+        self.file.write(json.dumps(entry, default=str) + '\n')
+        self.file.flush()
+        os.fsync(self.file.fileno())
+
+    def append(self, event, test_id, **fields):
+        """
+        Append an event
+
+        Args:
+            event (str): 'queued', 'started', 'stage_ended', 'completed', 'evicted' or 'status'
+            test_id (str): ID of the test
+            **fields: Fields of the run record changed by the event
+
+        Returns:
+            bool: True if the journal is due for compaction
+        """
+        entry = {'event': event, 'test_id': test_id, 'time': datetime.now().isoformat(), **fields}
+        with self.lock:
+            self._write(entry)
+            self.events_since_compaction += 1
+            return self.events_since_compaction >= self.compact_every
+
+    def replay(self):
+        """
+        Rebuild the run records from the journal
+
+        Returns:
+            dict: Test ID -> run record (status, times, params, error and the stages ended so far)
+        """
+        runs = {}
+        with self.lock:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                lines = f.readlines()
+
+        for line in lines:
+            try:
+                entry = json.loads(line)
+                event = entry.pop('event')
+                test_id = entry.pop('test_id')
+            except (ValueError, KeyError, AttributeError):
+                continue
+            entry.pop('time', None)
+
+            if event == 'evicted':
+                runs.pop(test_id, None)
+            elif event in ('queued', 'snapshot'):
+                runs[test_id] = {'test_id': test_id, 'stages': [], **entry}
+            else:
+                record = runs.setdefault(test_id, {'test_id': test_id, 'stages': []})
+                if event == 'stage_ended':
+                    record['stages'].append(entry)
+                else:
+                    record.update(entry)
+        return runs
+
+    def compact(self, collect):
+        """
+        Rewrite the journal as one snapshot line per run
+
+        The records are collected with the journal lock held, so no event can
+        be appended to the old file between the snapshot and the rewrite and
+        then be lost with it.
+
+        Args:
+            collect (callable): Returns the run records still tracked; the other runs are dropped
+                from the journal
+        """
+        with self.lock:
+            records = collect()
+            directory = os.path.dirname(os.path.abspath(self.path))
+            fd, temp_path = tempfile.mkstemp(dir=directory, prefix='.journal-')
+            try:
+                with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                    for record in records:
+                        snapshot = {key: value for key, value in record.items() if key not in ('logs', 'result')}
+                        f.write(json.dumps({'event': 'snapshot', **snapshot}, default=str) + '\n')
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(temp_path, self.path)
+            except Exception:
+                if os.path.exists(temp_path):
+                    os.remove(temp_path)
+                raise
+
+            self.file.close()
+            self.file = open(self.path, 'a', encoding='utf-8')
+            self.events_since_compaction = 0
+
+    def close(self):
+        """Close the journal file"""
+        with self.lock:
+            self.file.close()
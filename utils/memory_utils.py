@@ -0,0 +1,437 @@
+import os
+import signal
+import threading
+import time
+
+try:
+    import psutil
+except ImportError:  # psutil is optional, /proc is read directly on Linux without it
+    psutil = None
+
+
+MB = 1024 * 1024
+
+# cgroup files holding the container memory limit and usage (v2 first, then v1)
+CGROUP_LIMIT_FILES = ('/sys/fs/cgroup/memory.max', '/sys/fs/cgroup/memory/memory.limit_in_bytes')
+CGROUP_USAGE_FILES = ('/sys/fs/cgroup/memory.current', '/sys/fs/cgroup/memory/memory.usage_in_bytes')
+
+# cgroup stat file and key of the reclaimable page cache, matching CGROUP_USAGE_FILES
+CGROUP_INACTIVE_FILE_STATS = (('/sys/fs/cgroup/memory.stat', 'inactive_file'),
+                              ('/sys/fs/cgroup/memory/memory.stat', 'total_inactive_file'))
+
+# cgroup v1 reports "no limit" as a huge number rather than "max"
+UNLIMITED_THRESHOLD = 1 << 60
+
+
+class MemoryBudgetExceeded(Exception):
+    """Raised when a test's browser process tree goes over its memory budget"""
+
+
+def _read_int_file(path):
+    """Read an integer from a file, returning None if unavailable or unlimited"""
+    try:
+        with open(path, 'r') as f:
+            value = f.read().strip()
+    except OSError:
+        return None
+    if not value or value == 'max':
+        return None
+    try:
+        number = int(value)
+    except ValueError:
+        return None
+    return None if number >= UNLIMITED_THRESHOLD else number
+
+
+def _meminfo():
+    """Parse /proc/meminfo into a dict of bytes"""
+    values = {}
+    try:
+        with open('/proc/meminfo', 'r') as f:
+            for line in f:
+                key, _, rest = line.partition(':')
+                parts = rest.split()
+                if parts:
+                    values[key] = int(parts[0]) * 1024
+    except OSError:
+        pass
+    return values
+
+
+def container_memory_limit_mb():
+    """
+    Get the memory limit of the container, falling back to the host's total memory
+
+    Returns:
+        float: Memory limit in MB, or None if it cannot be determined
+    """
+    for path in CGROUP_LIMIT_FILES:
+        limit = _read_int_file(path)
+        if limit:
+            return limit / MB
+    if psutil:
+        return psutil.virtual_memory().total / MB
+    total = _meminfo().get('MemTotal')
+    return total / MB if total else None
+
+
+def _cgroup_stat(path, key):
+    """Read one value from a cgroup memory.stat file, returning None if unavailable"""
+    try:
+        with open(path, 'r') as f:
+            for line in f:
+                name, _, value = line.partition(' ')
+                if name == key:
+                    return int(value)
+    except (OSError, ValueError):
+        pass
+    return None
+
+
+def container_memory_usage_mb():
+    """
+    Get the working set of the container, falling back to the host's used memory
+
+    Like the kubelet, the inactive page cache is left out: the cgroup usage
+    counts the cache filled by reading upload corpora and writing results
+    and screenshots, which the kernel reclaims before anything is killed.
+
+    Returns:
+        float: Memory usage in MB, or None if it cannot be determined
+    """
+    for path, (stat_path, key) in zip(CGROUP_USAGE_FILES, CGROUP_INACTIVE_FILE_STATS):
+        usage = _read_int_file(path)
+        if usage is not None:
+            inactive_file = _cgroup_stat(stat_path, key) or 0
+            return max(usage - inactive_file, 0) / MB
+    if psutil:
+        memory = psutil.virtual_memory()
+        return (memory.total - memory.available) / MB
+    info = _meminfo()
+    if 'MemTotal' in info and 'MemAvailable' in info:
+        return (info['MemTotal'] - info['MemAvailable']) / MB
+    return None
+
+
+def _proc_children():
+    """Build a parent pid -> child pids map from /proc"""
+    children = {}
+    for entry in os.listdir('/proc'):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f'/proc/{entry}/stat', 'r') as f:
+                stat = f.read()
+        except OSError:
+            continue
+        # The command name is in parentheses and may contain spaces
+        fields = stat[stat.rfind(')') + 2:].split()
+        if len(fields) > 1:
+            children.setdefault(int(fields[1]), []).append(int(entry))
+    return children
+
+
+def process_tree_pids(pid):
+    """
+    Get a process and all of its descendants
+
+    Args:
+        pid (int): Root process ID
+
+    Returns:
+        list: Process IDs, root first
+    """
+    if psutil:
+        try:
+            root = psutil.Process(pid)
+            return [pid] + [child.pid for child in root.children(recursive=True)]
+        except psutil.Error:
+            return []
+
+    if not os.path.exists(f'/proc/{pid}'):
+        return []
+    children = _proc_children()
+    pids = [pid]
+    index = 0
+    while index < len(pids):
+        pids.extend(children.get(pids[index], []))
+        index += 1
+    return pids
+
+
+def _process_memory(pid):
+    """
+    Memory of a single process in bytes, counting shared pages once across processes
+
+    Chrome's processes share libraries and /dev/shm segments, so their RSS
+    adds up to far more than they use. The proportional set size (PSS) splits
+    each shared page between the processes mapping it; the unique set size
+    (USS) is used where PSS is not available, and RSS only as a last resort.
+    """
+    if psutil:
+        try:
+            process = psutil.Process(pid)
+            try:
+                full = process.memory_full_info()
+                return getattr(full, 'pss', None) or full.uss
+            except (psutil.AccessDenied, AttributeError):
+                return process.memory_info().rss
+        except psutil.Error:
+            return 0
+    try:
+        with open(f'/proc/{pid}/smaps_rollup', 'r') as f:
+            for line in f:
+                if line.startswith('Pss:'):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    try:
+        with open(f'/proc/{pid}/statm', 'r') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        return 0
+
+
+def process_tree_rss_mb(pid):
+    """
+    Get the combined memory of a process tree
+
+    Shared pages are counted once (PSS, see _process_memory), so the result
+    is what the tree actually costs the container rather than a sum of RSS.
+
+    Args:
+        pid (int): Root process ID (e.g. chromedriver)
+
+    Returns:
+        float: Memory of the whole tree in MB
+    """
+    return sum(_process_memory(p) for p in process_tree_pids(pid)) / MB
+
+
+def kill_process_tree(pid):
+    """
+    Kill a process and all of its descendants
+
+    Args:
+        pid (int): Root process ID
+    """
+    # Kill children first so they are not re-parented and left running
+    for p in reversed(process_tree_pids(pid)):
+        try:
+            os.kill(p, signal.SIGKILL)
+        except (OSError, AttributeError):
+            pass
+
+
+class MemoryWatchdog:
+    """Class to sample the RSS of a browser process tree and enforce a memory budget"""
+
+    def __init__(self, pid, budget_mb, interval=2.0, on_sample=None, label=None):
+        """
+        Initialize the watchdog
+
+        Args:
+            pid (int): Root process ID of the tree to watch (chromedriver)
+            budget_mb (float): Memory budget in MB (0 or None disables enforcement)
+            interval (float): Seconds between samples
+            on_sample (callable, optional): Called with the RSS in MB after each sample
+            label (str, optional): Name used in log messages
+        """
+        self.pid = pid
+        self.budget_mb = budget_mb
+        self.interval = interval
+        self.on_sample = on_sample
+        self.label = label or str(pid)
+        self.current_mb = 0.0
+        self.peak_mb = 0.0
+        self.samples = 0
+        self.exceeded = False
+        self.message = None
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """Start sampling in a background thread"""
+        self._thread = threading.Thread(target=self._run, name=f"memory-watchdog-{self.label}", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """Stop sampling"""
+        self._stop_event.set()
+        if self._thread and self._thread is not threading.current_thread():
+            self._thread.join(timeout=self.interval + 1)
+
+    def sample(self):
+        """
+        Take one sample and enforce the budget
+
+        Returns:
+            float: RSS of the process tree in MB
+        """
+        self.current_mb = process_tree_rss_mb(self.pid)
+        self.peak_mb = max(self.peak_mb, self.current_mb)
+        self.samples += 1
+
+        if self.on_sample:
+            try:
+                self.on_sample(self.current_mb)
+            except Exception as e:
+                print(f"Error reporting memory sample: {str(e)}")
+
+        if self.budget_mb and self.current_mb > self.budget_mb and not self.exceeded:
+            self.exceeded = True
+            self.message = (f"Browser memory {self.current_mb:.0f} MB exceeded the per-test budget "
+                            f"of {self.budget_mb:.0f} MB; browser processes were killed")
+            print(f"❌ {self.message} ({self.label})")
+            kill_process_tree(self.pid)
+            self._stop_event.set()
+
+        return self.current_mb
+
+    def _run(self):
+        """Sampling loop"""
+        while not self._stop_event.is_set():
+            try:
+                self.sample()
+            except Exception as e:
+                print(f"Error sampling browser memory: {str(e)}")
+            self._stop_event.wait(self.interval)
+
+    def get_details(self):
+        """Get a dictionary of memory usage details"""
+        return {
+            'budget_mb': self.budget_mb,
+            'peak_rss_mb': round(self.peak_mb, 1),
+            'samples': self.samples,
+            'exceeded': self.exceeded
+        }
+
+
+class MemoryAdmissionController:
+    """Class to admit new tests only when their memory budget fits in the container
+
+    Each running test reserves its budget. Memory it has not used yet is still
+    counted as committed, because its browser may grow into it, so the
+    available figure is what is left for new tests in the worst case.
+    """
+
+    def __init__(self, reserve_mb=0):
+        """
+        Initialize the controller
+
+        Args:
+            reserve_mb (float): Memory kept free for the API process itself
+        """
+        self.reserve_mb = reserve_mb
+        self.reservations = {}  # test_id -> budget in MB
+        self.usage = {}  # test_id -> last sampled RSS in MB
+        self.condition = threading.Condition()
+
+    def _available_mb(self):
+        """Memory left for new tests; must be called with the condition held"""
+        limit_mb = container_memory_limit_mb()
+        if limit_mb is None:
+            return None
+        used_mb = container_memory_usage_mb() or 0.0
+        # Headroom the running tests may still grow into
+        growth_mb = sum(max(budget - self.usage.get(test_id, 0.0), 0.0)
+                        for test_id, budget in self.reservations.items())
+        return limit_mb - self.reserve_mb - used_mb - growth_mb
+
+    def capacity(self):
+        """
+        Get the current memory capacity
+
+        Returns:
+            dict: Container limit and usage, reserved budgets and memory available for new tests
+        """
+        with self.condition:
+            available_mb = self._available_mb()
+            return {
+                'limit_mb': _round(container_memory_limit_mb()),
+                'used_mb': _round(container_memory_usage_mb()),
+                'reserve_mb': self.reserve_mb,
+                'running_tests': len(self.reservations),
+                'reserved_mb': _round(sum(self.reservations.values())),
+                'browser_rss_mb': _round(sum(self.usage.values())),
+                'available_mb': _round(available_mb)
+            }
+
+    def try_admit(self, test_id, budget_mb):
+        """
+        Admit a test if its budget fits
+
+        A test is always admitted when nothing else is running, so a budget
+        larger than the container can never block the queue forever.
+
+        Args:
+            test_id (str): ID of the test
+            budget_mb (float): Memory budget of the test in MB
+
+        Returns:
+            bool: True if the test was admitted
+        """
+        with self.condition:
+            return self._try_admit(test_id, budget_mb)
+
+    def _try_admit(self, test_id, budget_mb):
+        """Admit a test; must be called with the condition held. A test without a budget is always admitted"""
+        available_mb = self._available_mb()
+        if not budget_mb or not self.reservations or available_mb is None or available_mb >= budget_mb:
+            self.reservations[test_id] = budget_mb
+            self.usage[test_id] = 0.0
+            return True
+        return False
+
+    def acquire(self, test_id, budget_mb, timeout=None, poll_interval=5.0):
+        """
+        Wait until a test can be admitted
+
+        Args:
+            test_id (str): ID of the test
+            budget_mb (float): Memory budget of the test in MB
+            timeout (float, optional): Maximum number of seconds to wait
+            poll_interval (float): Seconds between re-checks while waiting
+
+        Returns:
+            bool: True if admitted, False if the timeout expired
+        """
+        deadline = time.monotonic() + timeout if timeout else None
+        with self.condition:
+            while not self._try_admit(test_id, budget_mb):
+                remaining = deadline - time.monotonic() if deadline else poll_interval
+                if remaining <= 0:
+                    return False
+                # Re-check on release or periodically, as usage changes outside our control
+                self.condition.wait(min(poll_interval, remaining))
+            return True
+
+    def update_usage(self, test_id, rss_mb):
+        """
+        Record the latest RSS sample of a running test
+
+        Args:
+            test_id (str): ID of the test
+            rss_mb (float): RSS of the test's browser process tree in MB
+        """
+        with self.condition:
+            if test_id in self.reservations:
+                self.usage[test_id] = rss_mb
+
+    def release(self, test_id):
+        """
+        Release the reservation of a finished test
+
+        Args:
+            test_id (str): ID of the test
+        """
+        with self.condition:
+            self.reservations.pop(test_id, None)
+            self.usage.pop(test_id, None)
+            self.condition.notify_all()
+
+
+def _round(value):
+    """Round a MB value for reporting"""
+    return round(value, 1) if value is not None else None
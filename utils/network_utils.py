@@ -0,0 +1,375 @@
+import os
+import re
+import json
+from datetime import datetime, timezone
+from urllib.parse import urlparse, urlunparse, urlencode, parse_qsl
+from utils.stats_utils import latency_summary
+
+
+# Resource types that count as backend API calls in the per-endpoint breakdown.
+# The HAR artifact still contains every request.
+API_RESOURCE_TYPES = ('XHR', 'Fetch', 'Document')
+
+# Maximum number of endpoints kept per stage in the breakdown
+MAX_ENDPOINTS_PER_STAGE = 25
+
+# Stage name used for requests made before the first stage starts
+UNATTRIBUTED_STAGE = "Unattributed"
+
+_UUID_SEGMENT = re.compile(r'^[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}$')
+_NUMERIC_SEGMENT = re.compile(r'^\d+$')
+_HEX_SEGMENT = re.compile(r'^[0-9a-fA-F]{16,}$')
+_TOKEN_SEGMENT = re.compile(r'^(?=.*\d)[A-Za-z0-9_\-]{20,}$')
+
+# Placeholder for query parameter values kept out of the HAR
+REDACTED_VALUE = "REDACTED"
+
+
+def enable_performance_logging(chrome_options):
+    """
+    Enable the ChromeDriver performance log with network events
+
+    Args:
+        chrome_options (Options): Chrome options to update
+    """
+    chrome_options.set_capability('goog:loggingPrefs', {'performance': 'ALL'})
+    chrome_options.add_experimental_option('perfLoggingPrefs', {
+        'enableNetwork': True,
+        'enablePage': False
+    })
+
+
+def redact_url(url):
+    """
+    Replace the query parameter values of a URL and drop its fragment
+
+    Query strings carry secrets such as the Keycloak authorization code and
+    session_state or the signatures of signed upload and download URLs. The
+    parameter names are kept so the requests stay recognizable.
+
+    Args:
+        url (str): Request URL
+
+    Returns:
+        str: The URL with every query value replaced by REDACTED_VALUE
+    """
+    parsed = urlparse(url)
+    if not parsed.query and not parsed.fragment:
+        return url
+    query = urlencode([(name, REDACTED_VALUE) for name, _ in parse_qsl(parsed.query, keep_blank_values=True)])
+    return urlunparse(parsed._replace(query=query, fragment=''))
+
+
+def normalize_endpoint(method, url):
+    """
+    Normalize a request URL into an endpoint key
+
+    Path segments that look like IDs (numbers, UUIDs, long hex strings or
+    tokens) are replaced with placeholders so requests for different cases or
+    documents are grouped under the same endpoint.
+
+    Args:
+        method (str): HTTP method
+        url (str): Request URL
+
+    Returns:
+        str: Endpoint key such as ``POST api.example.com/cases/{id}/documents``
+    """
+    parsed = urlparse(url)
+    segments = []
+    for segment in parsed.path.split('/'):
+        if _UUID_SEGMENT.match(segment):
+            segments.append('{uuid}')
+        elif _NUMERIC_SEGMENT.match(segment) or _HEX_SEGMENT.match(segment):
+            segments.append('{id}')
+        elif _TOKEN_SEGMENT.match(segment):
+            segments.append('{token}')
+        else:
+            segments.append(segment)
+    path = '/'.join(segments) or '/'
+    return f"{method} {parsed.netloc}{path}"
+
+
+class NetworkRecorder:
+    """Class to turn ChromeDriver performance logs into HAR entries and per-stage aggregates
+
+    Only URLs, methods, status codes, sizes and timings are recorded. Request
+    and response headers are left out on purpose: they carry session cookies
+    and bearer tokens that must not end up in artifacts. For the same reason
+    URLs are recorded with their query values redacted.
+    """
+
+    def __init__(self):
+        """Initialize an empty recorder"""
+        self.stage = UNATTRIBUTED_STAGE
+        self.stages = []  # Stage names in the order they started
+        self.pending = {}  # requestId -> entry still in flight
+        self.entries = []  # Finished entries
+
+    def set_stage(self, stage):
+        """
+        Attribute requests started from now on to a stage
+
+        Args:
+            stage (str): Name of the stage (test case)
+        """
+        self.stage = stage
+        if stage not in self.stages:
+            self.stages.append(stage)
+
+    def drain(self, driver):
+        """
+        Read all buffered performance log entries from the driver
+
+        Args:
+            driver (WebDriver): The Chrome WebDriver
+
+        Returns:
+            int: Number of log entries processed
+        """
+        try:
+            logs = driver.get_log('performance')
+        except Exception as e:
+            print(f"Warning: Could not read performance log: {str(e)}")
+            return 0
+
+        for log_entry in logs:
+            try:
+                message = json.loads(log_entry['message'])['message']
+            except (KeyError, TypeError, ValueError):
+                continue
+            self.handle_event(message.get('method'), message.get('params', {}))
+        return len(logs)
+
+    def handle_event(self, method, params):
+        """
+        Handle a single DevTools Network event
+
+        Args:
+            method (str): DevTools event name
+            params (dict): Event parameters
+        """
+        request_id = params.get('requestId')
+        if not request_id:
+            return
+
+        if method == 'Network.requestWillBeSent':
+            # A redirect reuses the request ID: close the previous hop first
+            if params.get('redirectResponse') and request_id in self.pending:
+                entry = self.pending.pop(request_id)
+                self._apply_response(entry, params['redirectResponse'])
+                self._finish(entry, params.get('timestamp'), params['redirectResponse'].get('encodedDataLength', 0))
+
+            request = params.get('request', {})
+            self.pending[request_id] = {
+                'stage': self.stage,
+                'method': request.get('method', 'GET'),
+                'url': redact_url(request.get('url', '')),
+                'resource_type': params.get('type', 'Other'),
+                'wall_time': params.get('wallTime'),
+                'start': params.get('timestamp'),
+                'request_body_size': len(request.get('postData', '') or ''),
+                'status': 0,
+                'status_text': '',
+                'mime_type': '',
+                'protocol': '',
+                'timing': None,
+                'error': None
+            }
+        elif method == 'Network.responseReceived':
+            entry = self.pending.get(request_id)
+            if entry:
+                self._apply_response(entry, params.get('response', {}))
+        elif method == 'Network.loadingFinished':
+            entry = self.pending.pop(request_id, None)
+            if entry:
+                self._finish(entry, params.get('timestamp'), params.get('encodedDataLength', 0))
+        elif method == 'Network.loadingFailed':
+            entry = self.pending.pop(request_id, None)
+            if entry:
+                entry['error'] = params.get('blockedReason') or params.get('errorText') or 'failed'
+                self._finish(entry, params.get('timestamp'), 0)
+
+    def _apply_response(self, entry, response):
+        """Copy the interesting response fields onto an entry"""
+        entry['status'] = response.get('status', 0)
+        entry['status_text'] = response.get('statusText', '')
+        entry['mime_type'] = response.get('mimeType', '')
+        entry['protocol'] = response.get('protocol', '')
+        entry['timing'] = response.get('timing')
+
+    def _finish(self, entry, end_timestamp, encoded_length):
+        """Complete an entry and move it to the finished list"""
+        start = entry.get('start')
+        if start is not None and end_timestamp is not None:
+            entry['time_ms'] = max(0.0, (end_timestamp - start) * 1000.0)
+        else:
+            entry['time_ms'] = 0.0
+        entry['bytes'] = int(encoded_length or 0)
+        self.entries.append(entry)
+
+    def summarize(self, stage=None, resource_types=API_RESOURCE_TYPES):
+        """
+        Aggregate finished requests per endpoint
+
+        Args:
+            stage (str, optional): Only include requests started in this stage
+            resource_types (tuple, optional): Resource types to include in the
+                endpoint breakdown (None for all)
+
+        Returns:
+            dict: Request count, bytes and latency percentiles, overall and per endpoint
+        """
+        entries = [e for e in self.entries if stage is None or e['stage'] == stage]
+
+        endpoints = {}
+        for entry in entries:
+            if resource_types and entry['resource_type'] not in resource_types:
+                continue
+            key = normalize_endpoint(entry['method'], entry['url'])
+            stats = endpoints.setdefault(key, {'latencies': [], 'bytes': 0, 'errors': 0, 'status_codes': {}})
+            stats['latencies'].append(entry['time_ms'])
+            stats['bytes'] += entry['bytes']
+            if entry['error'] or entry['status'] >= 400:
+                stats['errors'] += 1
+            status_key = str(entry['status'])
+            stats['status_codes'][status_key] = stats['status_codes'].get(status_key, 0) + 1
+
+        endpoint_summaries = []
+        for key, stats in endpoints.items():
+            endpoint_summaries.append({
+                'endpoint': key,
+                'count': len(stats['latencies']),
+                'bytes': stats['bytes'],
+                'errors': stats['errors'],
+                'status_codes': stats['status_codes'],
+                'latency_ms': latency_summary(stats['latencies']),
+                'total_time_ms': round(sum(stats['latencies']), 1)
+            })
+        # Slowest endpoints (by total time spent) first
+        endpoint_summaries.sort(key=lambda summary: summary['total_time_ms'], reverse=True)
+
+        return {
+            'request_count': len(entries),
+            'bytes': sum(e['bytes'] for e in entries),
+            'failed_requests': sum(1 for e in entries if e['error']),
+            'api_request_count': sum(s['count'] for s in endpoint_summaries),
+            'api_latency_ms': latency_summary([e['time_ms'] for e in entries
+                                               if not resource_types or e['resource_type'] in resource_types]),
+            'endpoints': endpoint_summaries[:MAX_ENDPOINTS_PER_STAGE]
+        }
+
+    def to_har(self):
+        """
+        Build a HAR 1.2 document from the finished entries
+
+        Returns:
+            dict: HAR document with one page per stage
+        """
+        pages = []
+        for stage in [UNATTRIBUTED_STAGE] + self.stages:
+            stage_entries = [e for e in self.entries if e['stage'] == stage]
+            if not stage_entries:
+                continue
+            pages.append({
+                'id': stage,
+                'title': stage,
+                'startedDateTime': _iso_from_wall_time(min(e['wall_time'] or 0 for e in stage_entries)),
+                'pageTimings': {}
+            })
+
+        return {
+            'log': {
+                'version': '1.2',
+                'creator': {'name': 'VerixAI Automation', 'version': '1.0.0'},
+                'pages': pages,
+                'entries': [self._har_entry(e) for e in self.entries]
+            }
+        }
+
+    def _har_entry(self, entry):
+        """Convert an entry to a HAR entry"""
+        parsed = urlparse(entry['url'])
+        return {
+            'pageref': entry['stage'],
+            'startedDateTime': _iso_from_wall_time(entry['wall_time']),
+            'time': round(entry['time_ms'], 3),
+            'request': {
+                'method': entry['method'],
+                'url': entry['url'],
+                'httpVersion': entry['protocol'] or 'unknown',
+                'cookies': [],
+                'headers': [],
+                'queryString': [{'name': k, 'value': v} for k, v in parse_qsl(parsed.query, keep_blank_values=True)],
+                'headersSize': -1,
+                'bodySize': entry['request_body_size']
+            },
+            'response': {
+                'status': entry['status'],
+                'statusText': entry['status_text'],
+                'httpVersion': entry['protocol'] or 'unknown',
+                'cookies': [],
+                'headers': [],
+                'content': {'size': entry['bytes'], 'mimeType': entry['mime_type']},
+                'redirectURL': '',
+                'headersSize': -1,
+                'bodySize': entry['bytes']
+            },
+            'cache': {},
+            'timings': _har_timings(entry),
+            '_resourceType': entry['resource_type'],
+            '_error': entry['error']
+        }
+
+    def save_har(self, file_path):
+        """
+        Write the HAR document to a file
+
+        Args:
+            file_path (str): Path of the HAR file
+
+        Returns:
+            str: Path of the written file
+        """
+        directory = os.path.dirname(file_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(file_path, 'w') as f:
+            json.dump(self.to_har(), f)
+        return file_path
+
+
+def _iso_from_wall_time(wall_time):
+    """Convert a DevTools wall time (seconds since epoch) to ISO 8601"""
+    if not wall_time:
+        return datetime.now(timezone.utc).isoformat()
+    return datetime.fromtimestamp(wall_time, tz=timezone.utc).isoformat()
+
+
+def _phase(timing, start_key, end_key):
+    """Duration of a ResourceTiming phase in ms, or -1 if it did not happen"""
+    start = timing.get(start_key, -1)
+    end = timing.get(end_key, -1)
+    if start is None or end is None or start < 0 or end < 0:
+        return -1
+    return round(end - start, 3)
+
+
+def _har_timings(entry):
+    """Build HAR timings from the DevTools ResourceTiming of an entry"""
+    timing = entry.get('timing')
+    total = round(entry['time_ms'], 3)
+    if not timing:
+        return {'send': 0, 'wait': total, 'receive': 0}
+
+    send_end = timing.get('sendEnd', 0)
+    headers_end = timing.get('receiveHeadersEnd', send_end)
+    return {
+        'blocked': -1,
+        'dns': _phase(timing, 'dnsStart', 'dnsEnd'),
+        'connect': _phase(timing, 'connectStart', 'connectEnd'),
+        'ssl': _phase(timing, 'sslStart', 'sslEnd'),
+        'send': max(0, round(send_end - timing.get('sendStart', send_end), 3)),
+        'wait': max(0, round(headers_end - send_end, 3)),
+        'receive': max(0, round(total - headers_end, 3))
+    }
@@ -0,0 +1,417 @@
+import os
+import json
+import time
+import random
+import smtplib
+import sqlite3
+import threading
+from datetime import datetime
+from config import Config
+
+
+# Columns of an outbox message reported by the status methods (everything but the message bytes)
+STATUS_COLUMNS = ('id', 'test_id', 'subject', 'recipients', 'status', 'attempts', 'last_error',
+                  'created_at', 'next_attempt_at', 'sent_at')
+
+
+class EmailOutbox:
+    """Class to deliver emails from a persistent outbox on a background thread
+
+    Emails are written to an SQLite table and handed to a sender thread, so
+    whoever queues one never waits on SMTP. The sender keeps one
+    authenticated SMTP connection open and reuses it for every message until
+    it has been idle for idle_timeout seconds. A message that cannot be sent
+    is retried with exponential backoff, up to max_attempts attempts; SMTP
+    5xx replies are permanent and not retried. Messages queued by a process
+    that stopped before delivering them are sent by the next one.
+
+    Once a message is sent or has failed for good its bytes are dropped,
+    keeping only the status columns, and those rows are deleted after
+    retention_days, so the database does not grow with every email sent.
+
+    The outbox also holds the results waiting to go out in a digest email
+    (see email_utils.send_due_digests).
+    """
+
+    def __init__(self, db_path, max_attempts=6, backoff_seconds=30, max_backoff_seconds=3600,
+                 idle_timeout=60, smtp_timeout=30, retention_days=30):
+        """
+        Initialize the outbox, creating the database if needed
+
+        Args:
+            db_path (str): Path of the SQLite database file
+            max_attempts (int): Attempts before a message is marked as failed
+            backoff_seconds (float): Delay before the first retry; doubled for each further one
+            max_backoff_seconds (float): Longest delay between two attempts
+            idle_timeout (float): Seconds an unused SMTP connection is kept open
+            smtp_timeout (float): Timeout of SMTP socket operations
+            retention_days (float): Days the status of a sent or failed message is kept
+        """
+        self.db_path = db_path
+        self.max_attempts = max_attempts
+        self.backoff_seconds = backoff_seconds
+        self.max_backoff_seconds = max_backoff_seconds
+        self.idle_timeout = idle_timeout
+        self.smtp_timeout = smtp_timeout
+        self.retention_days = retention_days
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(db_path, check_same_thread=False)
+        self.connection.row_factory = sqlite3.Row
+        with self.lock:
+            self.connection.execute("PRAGMA journal_mode=WAL")
+            self.connection.execute("""
+                CREATE TABLE IF NOT EXISTS outbox (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    test_id TEXT,
+                    subject TEXT,
+                    sender TEXT NOT NULL,
+                    recipients TEXT NOT NULL,
+                    message BLOB NOT NULL,
+                    status TEXT NOT NULL,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    last_error TEXT,
+                    created_at TEXT NOT NULL,
+                    next_attempt_at REAL NOT NULL,
+                    sent_at TEXT
+                )
+            """)
+            self.connection.execute("CREATE INDEX IF NOT EXISTS outbox_due ON outbox (status, next_attempt_at)")
+            self.connection.execute("CREATE INDEX IF NOT EXISTS outbox_test ON outbox (test_id)")
+            self.connection.execute("""
+                CREATE TABLE IF NOT EXISTS digest_entries (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    env TEXT NOT NULL,
+                    test_id TEXT,
+                    status TEXT,
+                    summary TEXT NOT NULL,
+                    added_at REAL NOT NULL
+                )
+            """)
+            # A message being sent when the previous process stopped may not have gone out
+            self.connection.execute("UPDATE outbox SET status = 'pending' WHERE status = 'sending'")
+            self.connection.commit()
+
+        self.smtp = None
+        self.smtp_last_used = 0.0
+        self.last_pruned = 0.0
+        self._wake = threading.Event()
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def enqueue(self, msg, recipients, test_id=None, digest_entry_ids=None):
+        """
+        Queue an email for delivery
+
+        Args:
+            msg (email.message.Message): The message to send
+            recipients (list): Recipient addresses
+            test_id (str, optional): Test the email reports on
+            digest_entry_ids (list, optional): Digest entries the email reports on; they are
+                removed in the same transaction
+
+        Returns:
+            int: ID of the queued message
+        """
+        with self.lock:
+            cursor = self.connection.execute(
+                "INSERT INTO outbox (test_id, subject, sender, recipients, message, status, created_at, next_attempt_at) "
+                "VALUES (?, ?, ?, ?, ?, 'pending', ?, ?)",
+                (test_id, msg['Subject'], msg['From'], json.dumps(recipients), msg.as_bytes(),
+                 datetime.now().isoformat(), time.time())
+            )
+            if digest_entry_ids:
+                self.connection.executemany(
+                    "DELETE FROM digest_entries WHERE id = ?", [(entry_id,) for entry_id in digest_entry_ids])
+            self.connection.commit()
+            message_id = cursor.lastrowid
+        self.start()
+        self._wake.set()
+        return message_id
+
+    def start(self):
+        """Start the sender thread if it is not running"""
+        with self.lock:
+            if self._thread and self._thread.is_alive():
+                return
+            self._stop_event.clear()
+            self._thread = threading.Thread(target=self._run, name="email-outbox", daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout=5):
+        """Stop the sender thread and close the SMTP connection"""
+        self._stop_event.set()
+        self._wake.set()
+        if self._thread and self._thread is not threading.current_thread():
+            self._thread.join(timeout=timeout)
+
+    def _next_due(self):
+        """Get the next pending message that is due, or the time until one is"""
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT id, sender, recipients, message, attempts, next_attempt_at FROM outbox "
+                "WHERE status = 'pending' ORDER BY next_attempt_at, id LIMIT 1").fetchone()
+            if row is None:
+                return None, None
+            wait = row['next_attempt_at'] - time.time()
+            if wait > 0:
+                return None, wait
+            self.connection.execute("UPDATE outbox SET status = 'sending' WHERE id = ?", (row['id'],))
+            self.connection.commit()
+            return dict(row), 0
+
+    def _run(self):
+        """Send due messages until stopped"""
+        while not self._stop_event.is_set():
+            try:
+                message, wait = self._next_due()
+            except Exception as e:
+                print(f"Error reading the email outbox: {str(e)}")
+                message, wait = None, 5
+
+            if message:
+                self._deliver(message)
+                continue
+
+            # Nothing due: prune old messages at most hourly, close an idle connection and sleep
+            # until a message is queued or due
+            if time.monotonic() - self.last_pruned >= 3600:
+                self.last_pruned = time.monotonic()
+                try:
+                    pruned = self.prune()
+                    if pruned:
+                        print(f"Pruned {pruned} old messages from the email outbox")
+                except Exception as e:
+                    print(f"Error pruning the email outbox: {str(e)}")
+            if self.smtp and time.monotonic() - self.smtp_last_used >= self.idle_timeout:
+                self._close_smtp()
+            timeout = self.idle_timeout if wait is None else min(wait, self.idle_timeout)
+            self._wake.wait(timeout=max(timeout, 0.05))
+            self._wake.clear()
+
+        self._close_smtp()
+
+    def _open_smtp(self):
+        """Get the authenticated SMTP connection, opening it if needed"""
+        if self.smtp is not None:
+            try:
+                # A connection the server has dropped fails here rather than halfway through a message
+                if self.smtp.noop()[0] == 250:
+                    return self.smtp
+            except (smtplib.SMTPException, OSError):
+                pass
+            self._close_smtp()
+
+        smtp = smtplib.SMTP(Config.SMTP_SERVER, Config.SMTP_PORT, timeout=self.smtp_timeout)
+        try:
+            smtp.starttls()
+            smtp.login(Config.EMAIL_USERNAME, Config.EMAIL_PASSWORD)
+        except Exception:
+            smtp.close()
+            raise
+        self.smtp = smtp
+        return smtp
+
+    def _close_smtp(self):
+        """Close the SMTP connection, if open"""
+        if self.smtp is None:
+            return
+        try:
+            self.smtp.quit()
+        except Exception:
+            try:
+                self.smtp.close()
+            except Exception:
+                pass
+        self.smtp = None
+
+    def _deliver(self, message):
+        """Send one message and record the outcome"""
+        recipients = json.loads(message['recipients'])
+        attempts = message['attempts'] + 1
+        try:
+            smtp = self._open_smtp()
+            smtp.sendmail(message['sender'], recipients, message['message'])
+            self.smtp_last_used = time.monotonic()
+        except Exception as e:
+            if not isinstance(e, smtplib.SMTPResponseException):
+                # The connection may be unusable after a network error
+                self._close_smtp()
+            permanent = isinstance(e, smtplib.SMTPResponseException) and 500 <= e.smtp_code < 600
+            if isinstance(e, smtplib.SMTPRecipientsRefused):
+                permanent = True
+
+            failed = permanent or attempts >= self.max_attempts
+            if failed:
+                status, next_attempt_at = 'failed', time.time()
+                print(f"❌ Email {message['id']} could not be delivered after {attempts} attempt(s): {str(e)}")
+            else:
+                delay = min(self.backoff_seconds * 2 ** (attempts - 1), self.max_backoff_seconds)
+                status, next_attempt_at = 'pending', time.time() + delay * random.uniform(0.8, 1.2)
+                print(f"Email {message['id']} attempt {attempts} failed, retrying in {delay:.0f}s: {str(e)}")
+
+            with self.lock:
+                self.connection.execute(
+                    "UPDATE outbox SET status = ?, attempts = ?, last_error = ?, next_attempt_at = ? WHERE id = ?",
+                    (status, attempts, str(e), next_attempt_at, message['id']))
+                if failed:
+                    self.connection.execute("UPDATE outbox SET message = X'' WHERE id = ?", (message['id'],))
+                self.connection.commit()
+            return False
+
+        with self.lock:
+            self.connection.execute(
+                "UPDATE outbox SET status = 'sent', attempts = ?, last_error = NULL, sent_at = ?, message = X'' "
+                "WHERE id = ?",
+                (attempts, datetime.now().isoformat(), message['id']))
+            self.connection.commit()
+        print(f"✅ Email {message['id']} sent to: {', '.join(recipients)}")
+        return True
+
+    def flush(self, timeout=60):
+        """
+        Wait until no message is waiting for its first attempt or being sent
+
+        Useful before a command-line run exits, since the sender is a daemon thread.
+
+        Args:
+            timeout (float): Maximum number of seconds to wait
+
+        Returns:
+            bool: True if nothing was left waiting
+        """
+        self.start()
+        self._wake.set()
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            with self.lock:
+                row = self.connection.execute(
+                    "SELECT COUNT(*) FROM outbox WHERE status = 'sending' "
+                    "OR (status = 'pending' AND attempts = 0)").fetchone()
+            if not row[0]:
+                return True
+            time.sleep(0.1)
+        return False
+
+    def prune(self):
+        """
+        Delete sent and failed messages older than retention_days
+
+        Returns:
+            int: Number of messages deleted
+        """
+        cutoff = datetime.fromtimestamp(time.time() - self.retention_days * 86400).isoformat()
+        with self.lock:
+            cursor = self.connection.execute(
+                "DELETE FROM outbox WHERE status IN ('sent', 'failed') AND COALESCE(sent_at, created_at) < ?",
+                (cutoff,))
+            self.connection.commit()
+        return cursor.rowcount
+
+    def add_digest_entry(self, env, test_id, status, summary):
+        """
+        Hold a result for the next digest email of its environment
+
+        Args:
+            env (str): Environment of the test
+            test_id (str): ID of the test
+            status (str): Status of the test
+            summary (dict): What the digest shows of the result
+
+        Returns:
+            int: Number of results waiting for the digest of the environment
+        """
+        with self.lock:
+            self.connection.execute(
+                "INSERT INTO digest_entries (env, test_id, status, summary, added_at) VALUES (?, ?, ?, ?, ?)",
+                (env, test_id, status, json.dumps(summary), time.time()))
+            self.connection.commit()
+            row = self.connection.execute("SELECT COUNT(*) FROM digest_entries WHERE env = ?", (env,)).fetchone()
+        return row[0]
+
+    def get_digest_backlog(self):
+        """
+        Get the results waiting for a digest, per environment
+
+        Returns:
+            dict: Environment -> {'count', 'oldest_added_at' (epoch seconds)}
+        """
+        with self.lock:
+            rows = self.connection.execute(
+                "SELECT env, COUNT(*) AS count, MIN(added_at) AS oldest FROM digest_entries GROUP BY env").fetchall()
+        return {row['env']: {'count': row['count'], 'oldest_added_at': row['oldest']} for row in rows}
+
+    def get_digest_entries(self, env):
+        """
+        Get the results waiting for the digest of an environment
+
+        Args:
+            env (str): Environment
+
+        Returns:
+            list: (entry ID, summary dict) tuples, oldest first
+        """
+        with self.lock:
+            rows = self.connection.execute(
+                "SELECT id, summary FROM digest_entries WHERE env = ? ORDER BY id", (env,)).fetchall()
+        return [(row['id'], json.loads(row['summary'])) for row in rows]
+
+    def get_messages(self, test_id):
+        """
+        Get the delivery status of the emails of a test
+
+        Args:
+            test_id (str): ID of the test
+
+        Returns:
+            list: A dict per message, oldest first
+        """
+        with self.lock:
+            rows = self.connection.execute(
+                f"SELECT {', '.join(STATUS_COLUMNS)} FROM outbox WHERE test_id = ? ORDER BY id", (test_id,)).fetchall()
+        messages = []
+        for row in rows:
+            message = dict(row)
+            message['recipients'] = json.loads(message['recipients'])
+            message['next_attempt_at'] = (datetime.fromtimestamp(message['next_attempt_at']).isoformat()
+                                          if message['status'] == 'pending' else None)
+            messages.append(message)
+        return messages
+
+    def get_stats(self):
+        """
+        Count the messages in the outbox by status
+
+        Returns:
+            dict: Status -> number of messages
+        """
+        with self.lock:
+            rows = self.connection.execute("SELECT status, COUNT(*) AS count FROM outbox GROUP BY status").fetchall()
+        stats = {'pending': 0, 'sending': 0, 'sent': 0, 'failed': 0}
+        stats.update({row['status']: row['count'] for row in rows})
+        return stats
+
+
+_outbox = None
+_outbox_lock = threading.Lock()
+
+
+def get_email_outbox():
+    """
+    Get the process-wide email outbox
+
+    Returns:
+        EmailOutbox: Outbox at EMAIL_OUTBOX_PATH
+    """
+    global _outbox
+    with _outbox_lock:
+        if _outbox is None:
+            _outbox = EmailOutbox(
+                Config.EMAIL_OUTBOX_PATH,
+                max_attempts=Config.EMAIL_MAX_ATTEMPTS,
+                backoff_seconds=Config.EMAIL_RETRY_BACKOFF_SECONDS,
+                idle_timeout=Config.SMTP_IDLE_TIMEOUT,
+                retention_days=Config.EMAIL_OUTBOX_RETENTION_DAYS
+            )
+        return _outbox
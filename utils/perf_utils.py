@@ -0,0 +1,148 @@
+from datetime import datetime
+
+
+# Installed on every new document before any page script runs. Long tasks,
+# largest contentful paint and layout shifts are only observable while the
+# page is alive, so they are accumulated in window.__verixaiPerf and read back
+# by COLLECT_PAGE_METRICS_SCRIPT.
+PERFORMANCE_OBSERVER_SCRIPT = """
+(function () {
+    if (window.__verixaiPerf) {
+        return;
+    }
+    var perf = window.__verixaiPerf = {
+        longTaskCount: 0,
+        longTaskTime: 0,
+        longestTask: 0,
+        largestContentfulPaint: null,
+        cumulativeLayoutShift: 0
+    };
+    if (typeof PerformanceObserver === 'undefined') {
+        return;
+    }
+
+    function observe(type, callback) {
+        try {
+            new PerformanceObserver(function (list) {
+                list.getEntries().forEach(callback);
+            }).observe({ type: type, buffered: true });
+        } catch (e) {
+            // Entry type not supported by this browser
+        }
+    }
+
+    observe('longtask', function (entry) {
+        perf.longTaskCount += 1;
+        perf.longTaskTime += entry.duration;
+        perf.longestTask = Math.max(perf.longestTask, entry.duration);
+    });
+    observe('largest-contentful-paint', function (entry) {
+        perf.largestContentfulPaint = entry.startTime;
+    });
+    observe('layout-shift', function (entry) {
+        if (!entry.hadRecentInput) {
+            perf.cumulativeLayoutShift += entry.value;
+        }
+    });
+})();
+"""
+
+COLLECT_PAGE_METRICS_SCRIPT = """
+function round(value) {
+    return value === null || value === undefined ? null : Math.round(value * 10) / 10;
+}
+
+var result = { url: window.location.href, navigation: null, paint: {}, long_tasks: null, heap: null };
+
+var nav = performance.getEntriesByType ? performance.getEntriesByType('navigation')[0] : null;
+if (nav) {
+    result.navigation = {
+        type: nav.type,
+        dns_ms: round(nav.domainLookupEnd - nav.domainLookupStart),
+        connect_ms: round(nav.connectEnd - nav.connectStart),
+        ttfb_ms: round(nav.responseStart - nav.startTime),
+        response_ms: round(nav.responseEnd - nav.responseStart),
+        dom_interactive_ms: round(nav.domInteractive - nav.startTime),
+        dom_content_loaded_ms: round(nav.domContentLoadedEventEnd - nav.startTime),
+        load_ms: round(nav.loadEventEnd - nav.startTime),
+        transfer_size: nav.transferSize,
+        decoded_body_size: nav.decodedBodySize
+    };
+}
+
+(performance.getEntriesByType ? performance.getEntriesByType('paint') : []).forEach(function (entry) {
+    result.paint[entry.name.replace(/-/g, '_') + '_ms'] = round(entry.startTime);
+});
+
+var perf = window.__verixaiPerf;
+if (perf) {
+    result.paint.largest_contentful_paint_ms = round(perf.largestContentfulPaint);
+    result.cumulative_layout_shift = Math.round(perf.cumulativeLayoutShift * 1000) / 1000;
+    result.long_tasks = {
+        count: perf.longTaskCount,
+        total_ms: round(perf.longTaskTime),
+        longest_ms: round(perf.longestTask)
+    };
+}
+
+if (performance.memory) {
+    result.heap = {
+        used_bytes: performance.memory.usedJSHeapSize,
+        total_bytes: performance.memory.totalJSHeapSize,
+        limit_bytes: performance.memory.jsHeapSizeLimit
+    };
+}
+
+return result;
+"""
+
+# Performance.getMetrics entries kept in each sample
+DEVTOOLS_METRICS = (
+    'JSHeapUsedSize',
+    'JSHeapTotalSize',
+    'Nodes',
+    'Documents',
+    'JSEventListeners',
+    'LayoutCount',
+    'RecalcStyleCount',
+    'LayoutDuration',
+    'RecalcStyleDuration',
+    'ScriptDuration',
+    'TaskDuration'
+)
+
+
+def install_performance_observers(driver):
+    """
+    Register the performance observers on every new document and enable DevTools metrics
+
+    Args:
+        driver (WebDriver): The Chrome WebDriver
+    """
+    driver.execute_cdp_cmd("Page.addScriptToEvaluateOnNewDocument", {"source": PERFORMANCE_OBSERVER_SCRIPT})
+    driver.execute_cdp_cmd("Performance.enable", {})
+
+
+def collect_page_metrics(driver, label):
+    """
+    Collect a web performance sample for the current page
+
+    Args:
+        driver (WebDriver): The Chrome WebDriver
+        label (str): What triggered the sample (e.g. 'page_load' or 'stage_end')
+
+    Returns:
+        dict: Navigation timing, paint timings, long tasks, JS heap and DevTools metrics
+    """
+    sample = driver.execute_script(COLLECT_PAGE_METRICS_SCRIPT) or {}
+    sample['label'] = label
+    sample['timestamp'] = datetime.now().isoformat()
+
+    try:
+        metrics = driver.execute_cdp_cmd("Performance.getMetrics", {}).get('metrics', [])
+        sample['devtools'] = {m['name']: m['value'] for m in metrics if m.get('name') in DEVTOOLS_METRICS}
+    except Exception as e:
+        sample['devtools'] = None
+        print(f"Warning: Could not read DevTools performance metrics: {str(e)}")
+
+    return sample
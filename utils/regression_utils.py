@@ -0,0 +1,64 @@
+from config import Config
+from utils.result_utils import get_result_store
+from utils.stats_utils import median_absolute_deviation, robust_z_score
+
+
+# The MAD is floored at this fraction of the median, so a stage that always takes
+# exactly the same time is not flagged for a change of a few milliseconds
+MIN_MAD_FRACTION = 0.01
+
+
+def find_stage_regressions(env, test_cases, exclude_test_id=None, store=None):
+    """
+    Compare the passed stages of a run with their rolling baselines
+
+    The baseline of a stage is the median and median absolute deviation
+    (MAD) of its duration in the last REGRESSION_BASELINE_RUNS passing runs
+    of the same environment. A stage is flagged when its robust z-score is
+    above REGRESSION_Z_THRESHOLD and it is at least
+    REGRESSION_MIN_SLOWDOWN_PERCENT slower than the median, so that neither
+    noisy stages nor tiny but steady slowdowns raise alarms. Stages with
+    fewer than REGRESSION_MIN_BASELINE_RUNS baseline runs are not compared.
+
+    Args:
+        env (str): Environment of the run
+        test_cases (list): Test case details from TestCase.get_details
+        exclude_test_id (str, optional): ID of the run, left out of the baselines
+        store (ResultStore, optional): Store to read the baselines from
+
+    Returns:
+        list: A dict per regressed stage with its duration, baseline and scores
+    """
+    cases = [case for case in test_cases
+             if case.get('status') == 'PASSED' and case.get('duration_seconds') is not None]
+    if not cases:
+        return []
+
+    store = store or get_result_store()
+    baselines = store.stage_baselines(env, [case['name'] for case in cases],
+                                      runs=Config.REGRESSION_BASELINE_RUNS, exclude_test_id=exclude_test_id)
+
+    regressions = []
+    for case in cases:
+        durations = baselines.get(case['name'], [])
+        if len(durations) < Config.REGRESSION_MIN_BASELINE_RUNS:
+            continue
+
+        median, mad = median_absolute_deviation(durations)
+        duration = case['duration_seconds']
+        z_score = robust_z_score(duration, median, mad, min_mad=median * MIN_MAD_FRACTION)
+        slowdown = (duration - median) / median * 100 if median else None
+        if z_score is None or slowdown is None:
+            continue
+
+        if z_score > Config.REGRESSION_Z_THRESHOLD and slowdown >= Config.REGRESSION_MIN_SLOWDOWN_PERCENT:
+            regressions.append({
+                'stage': case['name'],
+                'duration_seconds': round(duration, 2),
+                'baseline_median_seconds': round(median, 2),
+                'baseline_mad_seconds': round(mad, 2),
+                'baseline_runs': len(durations),
+                'robust_z': round(z_score, 2),
+                'slowdown_percent': round(slowdown, 1)
+            })
+    return regressions
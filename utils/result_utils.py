@@ -0,0 +1,687 @@
+import os
+import json
+import base64
+import sqlite3
+import threading
+import zlib
+from datetime import datetime
+from config import Config
+from utils.stats_utils import DURATION_BUCKETS, histogram_bucket, histogram_percentile
+
+
+# Columns of the results table besides the details JSON, kept up to date so listings never parse it
+SUMMARY_COLUMNS = ('test_id', 'env', 'status', 'start_time', 'end_time', 'duration_seconds',
+                   'error_message', 'test_case_count', 'failed_case_count')
+
+# Columns added after the first version of the results table
+ADDED_COLUMNS = {
+    'error_message': 'TEXT',
+    'test_case_count': 'INTEGER',
+    'failed_case_count': 'INTEGER',
+    'saved_at': 'TEXT'
+}
+
+# Version of the stage rollup layout, kept in PRAGMA user_version; rollups stored by an older
+# version are rebuilt from the test cases (2: finer duration buckets, passed runs only)
+ROLLUP_VERSION = 2
+
+# Rollup granularities and the length of the timestamp prefix that names their buckets
+ROLLUP_GRANULARITIES = {
+    'hour': 13,  # 2024-05-01T14
+    'day': 10    # 2024-05-01
+}
+
+# Test case statuses counted in the stage rollups
+ROLLUP_STATUSES = ('PASSED', 'FAILED')
+
+
+def rollup_bucket(timestamp, granularity):
+    """Name the rollup bucket of an ISO timestamp"""
+    return timestamp[:ROLLUP_GRANULARITIES[granularity]]
+
+
+def encode_cursor(start_time, test_id):
+    """Encode the position after a listed result as an opaque cursor"""
+    return base64.urlsafe_b64encode(json.dumps([start_time, test_id]).encode('utf-8')).decode('ascii')
+
+
+def decode_cursor(cursor):
+    """
+    Decode a cursor from encode_cursor
+
+    Raises:
+        ValueError: If the cursor is malformed
+    """
+    try:
+        start_time, test_id = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+    except Exception:
+        raise ValueError("Invalid cursor")
+    if not isinstance(start_time, str) or not isinstance(test_id, str):
+        raise ValueError("Invalid cursor")
+    return start_time, test_id
+
+
+class ResultStore:
+    """Class to keep test results in an SQLite database indexed by test ID
+
+    The full result details are stored as JSON next to a few columns that
+    lookups need, so finding a result is a primary-key lookup instead of a
+    scan over every result file. The database runs in WAL mode so readers
+    are not blocked by a result being written. One connection is shared by
+    all threads and guarded by a lock; callers on the event loop should run
+    the methods in a thread pool.
+    """
+
+    def __init__(self, db_path):
+        """
+        Initialize the store, creating the database if needed
+
+        Args:
+            db_path (str): Path of the SQLite database file
+        """
+        self.db_path = db_path
+        directory = os.path.dirname(os.path.abspath(db_path))
+        os.makedirs(directory, exist_ok=True)
+
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(db_path, check_same_thread=False)
+        self.connection.row_factory = sqlite3.Row
+        with self.lock:
+            self.connection.execute("PRAGMA journal_mode=WAL")
+            self.connection.execute("PRAGMA synchronous=NORMAL")
+            self._create_schema()
+            self.connection.commit()
+
+    def _create_schema(self):
+        """Create the tables and indexes; must be called with the lock held"""
+        self.connection.execute("""
+            CREATE TABLE IF NOT EXISTS results (
+                test_id TEXT PRIMARY KEY,
+                env TEXT,
+                status TEXT,
+                start_time TEXT,
+                end_time TEXT,
+                duration_seconds REAL,
+                details TEXT NOT NULL
+            )
+        """)
+        self.connection.execute("""
+            CREATE TABLE IF NOT EXISTS result_cases (
+                test_id TEXT NOT NULL,
+                name TEXT NOT NULL,
+                status TEXT,
+                start_time TEXT,
+                duration_seconds REAL,
+                PRIMARY KEY (test_id, name)
+            )
+        """)
+
+        rollups_exist = self.connection.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'stage_rollups'").fetchone()
+        self.connection.execute("""
+            CREATE TABLE IF NOT EXISTS stage_rollups (
+                granularity TEXT NOT NULL,
+                bucket TEXT NOT NULL,
+                env TEXT NOT NULL,
+                stage TEXT NOT NULL,
+                runs INTEGER NOT NULL,
+                passed INTEGER NOT NULL,
+                flips INTEGER NOT NULL,
+                duration_count INTEGER NOT NULL,
+                duration_sum REAL NOT NULL,
+                duration_min REAL,
+                duration_max REAL,
+                histogram TEXT NOT NULL,
+                PRIMARY KEY (granularity, env, stage, bucket)
+            )
+        """)
+        self.connection.execute("""
+            CREATE TABLE IF NOT EXISTS stage_last_status (
+                env TEXT NOT NULL,
+                stage TEXT NOT NULL,
+                status TEXT NOT NULL,
+                start_time TEXT NOT NULL,
+                PRIMARY KEY (env, stage)
+            )
+        """)
+
+        self.connection.execute("""
+            CREATE TABLE IF NOT EXISTS runs (
+                test_id TEXT PRIMARY KEY,
+                status TEXT,
+                start_time TEXT,
+                end_time TEXT,
+                error TEXT,
+                params TEXT,
+                logs BLOB
+            )
+        """)
+
+        existing = {row['name'] for row in self.connection.execute("PRAGMA table_info(results)")}
+        missing = [column for column in ADDED_COLUMNS if column not in existing]
+        for column in missing:
+            self.connection.execute(f"ALTER TABLE results ADD COLUMN {column} {ADDED_COLUMNS[column]}")
+
+        self.connection.execute("CREATE INDEX IF NOT EXISTS results_start ON results (start_time, test_id)")
+        self.connection.execute("CREATE INDEX IF NOT EXISTS results_env_start ON results (env, start_time, test_id)")
+        self.connection.execute("CREATE INDEX IF NOT EXISTS results_saved ON results (saved_at, test_id)")
+        self.connection.execute("CREATE INDEX IF NOT EXISTS result_cases_name ON result_cases (name, status)")
+
+        if missing:
+            # Fill the new columns and the test case table from the stored details
+            rows = self.connection.execute("SELECT details FROM results").fetchall()
+            for row in rows:
+                self._write(json.loads(row['details']))
+
+        rollup_version = self.connection.execute("PRAGMA user_version").fetchone()[0]
+        if not rollups_exist or rollup_version < ROLLUP_VERSION:
+            # Build the rollups from the results saved before they existed or in an older layout
+            self._rebuild_rollups()
+            self.connection.execute(f"PRAGMA user_version = {ROLLUP_VERSION}")
+
+    def _write(self, details):
+        """Insert or replace a result and its test cases; must be called with the lock held"""
+        test_params = details.get('test_params') or {}
+        env = test_params.get('env', 'dev')
+        test_cases = details.get('test_cases') or []
+        self.connection.execute(
+            "INSERT OR REPLACE INTO results "
+            "(test_id, env, status, start_time, end_time, duration_seconds, "
+            "error_message, test_case_count, failed_case_count, saved_at, details) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (
+                details['test_id'],
+                env,
+                details.get('status'),
+                details.get('start_time'),
+                details.get('end_time'),
+                details.get('duration_seconds'),
+                details.get('error_message'),
+                len(test_cases),
+                sum(1 for case in test_cases if case.get('status') == 'FAILED'),
+                datetime.now().isoformat(),
+                json.dumps(details)
+            )
+        )
+        self.connection.execute("DELETE FROM result_cases WHERE test_id = ?", (details['test_id'],))
+        self.connection.executemany(
+            "INSERT OR REPLACE INTO result_cases (test_id, name, status, start_time, duration_seconds) "
+            "VALUES (?, ?, ?, ?, ?)",
+            [(details['test_id'], case.get('name'), case.get('status'), case.get('start_time'),
+              case.get('duration_seconds')) for case in test_cases if case.get('name')]
+        )
+
+    def _roll_up(self, env, stage, status, start_time, duration):
+        """Add one test case run to the hourly and daily rollups; must be called with the lock held"""
+        # A flip is a stage changing status from its previous run in the same environment.
+        # Runs older than the last one seen only count towards the totals.
+        previous = self.connection.execute(
+            "SELECT status, start_time FROM stage_last_status WHERE env = ? AND stage = ?", (env, stage)).fetchone()
+        flipped = 0
+        if previous is None or previous['start_time'] <= start_time:
+            flipped = int(previous is not None and previous['status'] != status)
+            self.connection.execute(
+                "INSERT OR REPLACE INTO stage_last_status (env, stage, status, start_time) VALUES (?, ?, ?, ?)",
+                (env, stage, status, start_time))
+
+        for granularity in ROLLUP_GRANULARITIES:
+            bucket = rollup_bucket(start_time, granularity)
+            row = self.connection.execute(
+                "SELECT * FROM stage_rollups WHERE granularity = ? AND env = ? AND stage = ? AND bucket = ?",
+                (granularity, env, stage, bucket)).fetchone()
+            if row:
+                rollup = dict(row)
+                rollup['histogram'] = json.loads(rollup['histogram'])
+            else:
+                rollup = {'granularity': granularity, 'bucket': bucket, 'env': env, 'stage': stage,
+                          'runs': 0, 'passed': 0, 'flips': 0, 'duration_count': 0, 'duration_sum': 0.0,
+                          'duration_min': None, 'duration_max': None,
+                          'histogram': [0] * (len(DURATION_BUCKETS) + 1)}
+
+            rollup['runs'] += 1
+            rollup['passed'] += int(status == 'PASSED')
+            rollup['flips'] += flipped
+            # Only passed runs feed the duration stats, so timeouts and early failures don't skew them
+            if duration is not None and status == 'PASSED':
+                rollup['duration_count'] += 1
+                rollup['duration_sum'] += duration
+                rollup['duration_min'] = duration if rollup['duration_min'] is None else min(rollup['duration_min'], duration)
+                rollup['duration_max'] = duration if rollup['duration_max'] is None else max(rollup['duration_max'], duration)
+                rollup['histogram'][histogram_bucket(duration)] += 1
+
+            self.connection.execute(
+                "INSERT OR REPLACE INTO stage_rollups "
+                "(granularity, bucket, env, stage, runs, passed, flips, duration_count, duration_sum, "
+                "duration_min, duration_max, histogram) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (granularity, bucket, env, stage, rollup['runs'], rollup['passed'], rollup['flips'],
+                 rollup['duration_count'], rollup['duration_sum'], rollup['duration_min'],
+                 rollup['duration_max'], json.dumps(rollup['histogram']))
+            )
+
+    def _roll_up_cases(self, test_id=None):
+        """Add the stored test cases of one result, or of all, to the rollups; must be called with the lock held"""
+        query = ("SELECT results.env, result_cases.name, result_cases.status, result_cases.start_time, "
+                 "result_cases.duration_seconds FROM result_cases JOIN results USING (test_id)")
+        params = ()
+        if test_id is not None:
+            query += " WHERE test_id = ?"
+            params = (test_id,)
+        for row in self.connection.execute(query + " ORDER BY result_cases.start_time", params).fetchall():
+            if row['status'] in ROLLUP_STATUSES and row['start_time']:
+                self._roll_up(row['env'], row['name'], row['status'], row['start_time'], row['duration_seconds'])
+
+    def _rebuild_rollups(self):
+        """Recompute the rollups from every stored test case; must be called with the lock held"""
+        self.connection.execute("DELETE FROM stage_rollups")
+        self.connection.execute("DELETE FROM stage_last_status")
+        self._roll_up_cases()
+
+    def save(self, details):
+        """
+        Insert or replace a test result
+
+        A result is added to the stage rollups the first time it is saved;
+        saving it again only replaces the stored details.
+
+        Args:
+            details (dict): Details from TestResult.get_details
+        """
+        with self.lock:
+            known = self.connection.execute(
+                "SELECT 1 FROM results WHERE test_id = ?", (details['test_id'],)).fetchone()
+            self._write(details)
+            if not known:
+                self._roll_up_cases(details['test_id'])
+            self.connection.commit()
+
+    def get(self, test_id):
+        """
+        Get a test result
+
+        Args:
+            test_id (str): ID of the test
+
+        Returns:
+            dict: Result details, or None if not found
+        """
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT details FROM results WHERE test_id = ?", (test_id,)).fetchone()
+        return json.loads(row['details']) if row else None
+
+    def exists(self, test_id):
+        """
+        Check whether a test result is stored
+
+        Args:
+            test_id (str): ID of the test
+
+        Returns:
+            bool: True if the result is stored
+        """
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT 1 FROM results WHERE test_id = ?", (test_id,)).fetchone()
+        return row is not None
+
+    def save_run(self, record):
+        """
+        Insert or replace the record of a finished run (see utils/run_utils.py)
+
+        The result details are not part of the record; they are saved with save().
+
+        Args:
+            record (dict): Run record with test_id, status, start_time, end_time, error, params and logs
+        """
+        logs = zlib.compress((record.get('logs') or '').encode('utf-8'))
+        with self.lock:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO runs (test_id, status, start_time, end_time, error, params, logs) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (record['test_id'], record.get('status'), record.get('start_time'), record.get('end_time'),
+                 record.get('error'), json.dumps(record.get('params')), logs)
+            )
+            self.connection.commit()
+
+    def get_run(self, test_id):
+        """
+        Get the record of a finished run
+
+        Args:
+            test_id (str): ID of the test
+
+        Returns:
+            dict: Run record, or None if not found
+        """
+        with self.lock:
+            row = self.connection.execute("SELECT * FROM runs WHERE test_id = ?", (test_id,)).fetchone()
+        if not row:
+            return None
+        record = dict(row)
+        record['params'] = json.loads(record['params']) if record['params'] else None
+        record['logs'] = zlib.decompress(record['logs']).decode('utf-8') if record['logs'] else ''
+        return record
+
+    def list_results(self, env=None, status=None, since=None, until=None, failed_case=None,
+                     limit=50, cursor=None):
+        """
+        List result summaries, newest first, one page at a time
+
+        Pages are keyed on (start_time, test_id), so a page costs the same
+        however deep into the history it is.
+
+        Args:
+            env (str, optional): Only results of this environment
+            status (str, optional): Only results with this status (e.g. 'PASSED' or 'FAILED')
+            since (str, optional): Only results started at or after this ISO timestamp
+            until (str, optional): Only results started before this ISO timestamp
+            failed_case (str, optional): Only results in which this test case failed
+            limit (int): Maximum number of results in the page
+            cursor (str, optional): next_cursor of the previous page
+
+        Returns:
+            tuple: (list of summary dicts, cursor of the next page or None)
+
+        Raises:
+            ValueError: If the cursor is malformed
+        """
+        conditions = []
+        params = []
+        if env:
+            conditions.append("env = ?")
+            params.append(env)
+        if status:
+            conditions.append("status = ?")
+            params.append(status.upper())
+        if since:
+            conditions.append("start_time >= ?")
+            params.append(since)
+        if until:
+            conditions.append("start_time < ?")
+            params.append(until)
+        if failed_case:
+            conditions.append("test_id IN (SELECT test_id FROM result_cases WHERE name = ? AND status = 'FAILED')")
+            params.append(failed_case)
+        if cursor:
+            conditions.append("(start_time, test_id) < (?, ?)")
+            params.extend(decode_cursor(cursor))
+
+        query = f"SELECT {', '.join(SUMMARY_COLUMNS)} FROM results"
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        query += " ORDER BY start_time DESC, test_id DESC LIMIT ?"
+        params.append(limit + 1)
+
+        with self.lock:
+            rows = self.connection.execute(query, params).fetchall()
+            page = [dict(row) for row in rows[:limit]]
+
+            # Names of the failed test cases of the page, from the test case table
+            failed = {}
+            if page:
+                placeholders = ', '.join('?' for _ in page)
+                for row in self.connection.execute(
+                        f"SELECT test_id, name FROM result_cases WHERE status = 'FAILED' "
+                        f"AND test_id IN ({placeholders})", [summary['test_id'] for summary in page]):
+                    failed.setdefault(row['test_id'], []).append(row['name'])
+
+        for summary in page:
+            summary['failed_cases'] = failed.get(summary['test_id'], [])
+
+        next_cursor = None
+        if len(rows) > limit and page:
+            next_cursor = encode_cursor(page[-1]['start_time'], page[-1]['test_id'])
+        return page, next_cursor
+
+    def iter_results(self, env=None, status=None, since=None, until=None, batch_size=100):
+        """
+        Iterate over the stored result details in the order they were last saved
+
+        Results are read in keyset-paged batches and the lock is released
+        between batches, so memory use does not grow with the number of
+        results and saves are not held up by a long export. Ordering by save
+        time rather than start time means a result saved after an export
+        (one still running then, or one a restart marked INTERRUPTED) is
+        picked up by the next export from the last saved_at.
+
+        Args:
+            env (str, optional): Only results of this environment
+            status (str, optional): Only results with this status
+            since (str, optional): Only results saved at or after this ISO timestamp
+            until (str, optional): Only results saved before this ISO timestamp
+            batch_size (int): Number of results read at a time
+
+        Yields:
+            dict: Result details, with the time the result was saved as saved_at
+        """
+        conditions = []
+        params = []
+        if env:
+            conditions.append("env = ?")
+            params.append(env)
+        if status:
+            conditions.append("status = ?")
+            params.append(status.upper())
+        if since:
+            conditions.append("saved_at >= ?")
+            params.append(since)
+        if until:
+            conditions.append("saved_at < ?")
+            params.append(until)
+
+        position = None
+        while True:
+            batch_conditions = list(conditions)
+            batch_params = list(params)
+            if position:
+                batch_conditions.append("(saved_at, test_id) > (?, ?)")
+                batch_params.extend(position)
+
+            query = "SELECT test_id, saved_at, details FROM results"
+            if batch_conditions:
+                query += " WHERE " + " AND ".join(batch_conditions)
+            query += " ORDER BY saved_at, test_id LIMIT ?"
+            batch_params.append(batch_size)
+
+            with self.lock:
+                rows = self.connection.execute(query, batch_params).fetchall()
+            for row in rows:
+                details = json.loads(row['details'])
+                details['saved_at'] = row['saved_at']
+                yield details
+            if len(rows) < batch_size:
+                return
+            position = (rows[-1]['saved_at'], rows[-1]['test_id'])
+
+    def stage_analytics(self, env=None, granularity='day', since=None, until=None, stage=None):
+        """
+        Summarize stage durations, pass rates and flakiness from the rollups
+
+        Rollups hold whole hours or days, so the range is widened to the
+        buckets it touches. Duration figures cover passed runs only;
+        percentiles are estimated from the duration histograms, to within
+        the width of a histogram bucket (about 6%).
+
+        Args:
+            env (str, optional): Only runs of this environment; all environments are merged otherwise
+            granularity (str): 'hour' or 'day'
+            since (str, optional): Only buckets at or after this ISO timestamp
+            until (str, optional): Only buckets up to this ISO timestamp
+            stage (str, optional): Only this stage (test case name)
+
+        Returns:
+            list: Per-stage dicts with the totals over the range and a series per bucket
+
+        Raises:
+            ValueError: If the granularity is unknown
+        """
+        if granularity not in ROLLUP_GRANULARITIES:
+            raise ValueError(f"Invalid granularity: {granularity}. Must be one of {', '.join(ROLLUP_GRANULARITIES)}")
+
+        conditions = ["granularity = ?"]
+        params = [granularity]
+        if env:
+            conditions.append("env = ?")
+            params.append(env)
+        if stage:
+            conditions.append("stage = ?")
+            params.append(stage)
+        if since:
+            conditions.append("bucket >= ?")
+            params.append(rollup_bucket(since, granularity))
+        if until:
+            conditions.append("bucket <= ?")
+            params.append(rollup_bucket(until, granularity))
+
+        with self.lock:
+            rows = self.connection.execute(
+                f"SELECT * FROM stage_rollups WHERE {' AND '.join(conditions)} ORDER BY stage, bucket",
+                params).fetchall()
+
+        # Merge environments per bucket, then buckets per stage; every rollup field adds up
+        stages = {}
+        for row in rows:
+            series = stages.setdefault(row['stage'], {})
+            merged = series.get(row['bucket'])
+            if merged is None:
+                merged = series[row['bucket']] = _empty_rollup()
+            _merge_rollup(merged, row)
+
+        analytics = []
+        for name, series in stages.items():
+            total = _empty_rollup()
+            for rollup in series.values():
+                _merge_rollup(total, rollup)
+            analytics.append({
+                'stage': name,
+                **_summarize_rollup(total),
+                'series': [{'bucket': bucket, **_summarize_rollup(rollup)} for bucket, rollup in series.items()]
+            })
+        return analytics
+
+    def stage_baselines(self, env, stages, runs=20, exclude_test_id=None):
+        """
+        Get the durations of stages in their latest passing runs
+
+        Args:
+            env (str): Environment of the runs
+            stages (list): Stage (test case) names
+            runs (int): Maximum number of runs per stage
+            exclude_test_id (str, optional): Result to leave out, e.g. the one being compared
+
+        Returns:
+            dict: Stage name -> durations in seconds, newest first
+        """
+        baselines = {}
+        with self.lock:
+            for stage in stages:
+                rows = self.connection.execute(
+                    "SELECT result_cases.duration_seconds FROM result_cases JOIN results USING (test_id) "
+                    "WHERE result_cases.name = ? AND result_cases.status = 'PASSED' AND results.env = ? "
+                    "AND result_cases.duration_seconds IS NOT NULL AND test_id != ? "
+                    "ORDER BY result_cases.start_time DESC LIMIT ?",
+                    (stage, env, exclude_test_id or '', runs)).fetchall()
+                baselines[stage] = [row['duration_seconds'] for row in rows]
+        return baselines
+
+    def backfill(self, results_dir):
+        """
+        Import result JSON files that are not in the database yet
+
+        Args:
+            results_dir (str): Directory holding {test_id}.json result files
+
+        Returns:
+            int: Number of results imported
+        """
+        if not os.path.isdir(results_dir):
+            return 0
+
+        with self.lock:
+            known = {row['test_id'] for row in self.connection.execute("SELECT test_id FROM results")}
+
+        pending = []
+        for filename in sorted(os.listdir(results_dir)):
+            if not filename.endswith('.json') or filename[:-len('.json')] in known:
+                continue
+            try:
+                with open(os.path.join(results_dir, filename), 'r') as f:
+                    details = json.load(f)
+            except (OSError, ValueError) as e:
+                print(f"Skipping unreadable result file {filename}: {str(e)}")
+                continue
+            if not isinstance(details, dict) or not details.get('test_id') or details['test_id'] in known:
+                continue
+            known.add(details['test_id'])
+            pending.append(details)
+
+        # Oldest first, so the stage rollups see the runs in order
+        pending.sort(key=lambda details: details.get('start_time') or '')
+        for details in pending:
+            self.save(details)
+        return len(pending)
+
+    def close(self):
+        """Close the database connection"""
+        with self.lock:
+            self.connection.close()
+
+
+def _empty_rollup():
+    """Rollup fields of a bucket without runs"""
+    return {'runs': 0, 'passed': 0, 'flips': 0, 'duration_count': 0, 'duration_sum': 0.0,
+            'duration_min': None, 'duration_max': None, 'histogram': [0] * (len(DURATION_BUCKETS) + 1)}
+
+
+def _merge_rollup(total, rollup):
+    """Add a rollup row or dict into total"""
+    for key in ('runs', 'passed', 'flips', 'duration_count', 'duration_sum'):
+        total[key] += rollup[key]
+    for key, pick in (('duration_min', min), ('duration_max', max)):
+        if rollup[key] is not None:
+            total[key] = rollup[key] if total[key] is None else pick(total[key], rollup[key])
+    histogram = rollup['histogram']
+    if isinstance(histogram, str):
+        histogram = json.loads(histogram)
+    total['histogram'] = [a + b for a, b in zip(total['histogram'], histogram)]
+
+
+def _summarize_rollup(rollup):
+    """Turn rollup fields into the figures the analytics report"""
+    def rounded(value):
+        return round(value, 2) if value is not None else None
+
+    runs = rollup['runs']
+    count = rollup['duration_count']
+    return {
+        'runs': runs,
+        'passed': rollup['passed'],
+        'failed': runs - rollup['passed'],
+        'pass_rate': round(rollup['passed'] / runs, 4) if runs else None,
+        'flips': rollup['flips'],
+        'flake_rate': round(rollup['flips'] / runs, 4) if runs else None,
+        'duration_p50': rounded(histogram_percentile(rollup['histogram'], 50, minimum=rollup['duration_min'],
+                                                     maximum=rollup['duration_max'])),
+        'duration_p95': rounded(histogram_percentile(rollup['histogram'], 95, minimum=rollup['duration_min'],
+                                                     maximum=rollup['duration_max'])),
+        'duration_mean': rounded(rollup['duration_sum'] / count) if count else None,
+        'duration_max': rounded(rollup['duration_max'])
+    }
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_result_store():
+    """
+    Get the process-wide result store
+
+    Returns:
+        ResultStore: Store at RESULTS_DB_PATH
+    """
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = ResultStore(Config.RESULTS_DB_PATH)
+        return _store
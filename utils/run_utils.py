@@ -0,0 +1,318 @@
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from utils.result_utils import get_result_store
+
+
+# Run statuses after which a run record no longer changes
+FINISHED_STATUSES = ('completed', 'error', 'interrupted')
+
+# Fields of a run record written to the run journal
+JOURNAL_FIELDS = ('status', 'start_time', 'end_time', 'error', 'params')
+
+# Fields of a test case kept in the run journal when its stage ends
+STAGE_FIELDS = ('name', 'status', 'start_time', 'end_time', 'duration_seconds', 'error_message',
+                'budget_seconds', 'performance_status')
+
+
+class RunRegistry:
+    """Class to keep track of test runs with a bounded amount of memory
+
+    Queued and running tests are kept in memory, where their status and logs
+    are updated. Once a run has finished it stays in memory for ttl_seconds,
+    and at most max_finished finished runs are kept; older ones are written
+    to the result store (the record here, the result details by
+    TestResult.save_result) and dropped. Reads fall through to the result
+    store, with an LRU cache of the runs read most recently.
+
+    With a run journal, every lifecycle change (queued, started, stage
+    ended, completed, evicted) is also appended to it, so recover() can
+    rebuild the runs a previous process was tracking.
+    """
+
+    def __init__(self, ttl_seconds=3600, max_finished=50, cache_size=32, store=None, journal=None):
+        """
+        Initialize the registry
+
+        Args:
+            ttl_seconds (float): How long a finished run stays in memory
+            max_finished (int): Maximum number of finished runs kept in memory
+            cache_size (int): Number of runs read back from the result store kept in memory
+            store (ResultStore, optional): Store evicted runs are written to
+            journal (RunJournal, optional): Journal lifecycle events are appended to
+        """
+        self.ttl_seconds = ttl_seconds
+        self.max_finished = max_finished
+        self.cache_size = cache_size
+        self._store = store
+        self.journal = journal
+        self.lock = threading.Lock()
+        self.runs = {}  # Test ID -> live run record
+        self.finished = OrderedDict()  # Test ID -> time it finished, oldest first
+        self.cache = OrderedDict()  # Test ID -> run record read back from the store, least recent first
+
+    @property
+    def store(self):
+        """The result store, looked up on first use"""
+        if self._store is None:
+            self._store = get_result_store()
+        return self._store
+
+    def _tracked_records(self):
+        """Snapshot the records of the runs in memory, for compacting the journal"""
+        with self.lock:
+            return [dict(record) for record in self.runs.values()]
+
+    def _journal(self, event, test_id, **fields):
+        """Append an event to the journal, if there is one, and compact it when due"""
+        if self.journal is None:
+            return
+        try:
+            if self.journal.append(event, test_id, **fields):
+                self.journal.compact(self._tracked_records)
+        except Exception as e:
+            print(f"Error writing the run journal: {str(e)}")
+
+    def add(self, test_id, record):
+        """
+        Register a new run
+
+        Args:
+            test_id (str): ID of the test
+            record (dict): Run record (status, start_time, params, logs)
+        """
+        with self.lock:
+            record['test_id'] = test_id
+            record.setdefault('stages', [])
+            self.runs[test_id] = record
+            self.cache.pop(test_id, None)
+        self._journal('queued', test_id, **{key: record.get(key) for key in JOURNAL_FIELDS})
+        self.evict()
+
+    def active(self, test_id):
+        """
+        Get the record of a run kept in memory
+
+        Args:
+            test_id (str): ID of the test
+
+        Returns:
+            dict: The live run record, or None if it is not in memory
+        """
+        with self.lock:
+            return self.runs.get(test_id)
+
+    def update(self, test_id, **fields):
+        """
+        Update fields of a run kept in memory
+
+        A run whose status becomes finished (see FINISHED_STATUSES) starts
+        its time to live.
+
+        Args:
+            test_id (str): ID of the test
+            **fields: Fields of the run record to set
+        """
+        with self.lock:
+            record = self.runs.get(test_id)
+            if record is None:
+                return
+            record.update(fields)
+            if record.get('status') in FINISHED_STATUSES:
+                self.finished[test_id] = time.monotonic()
+                self.finished.move_to_end(test_id)
+
+        status = fields.get('status')
+        if status:
+            event = 'started' if status == 'running' else 'completed' if status in FINISHED_STATUSES else 'status'
+            journaled = {key: fields[key] for key in JOURNAL_FIELDS if key in fields}
+            if isinstance(fields.get('result'), dict):
+                journaled['result_status'] = fields['result'].get('status')
+            self._journal(event, test_id, **journaled)
+
+        if status in FINISHED_STATUSES:
+            self.evict()
+
+    def record_stage(self, test_id, details):
+        """
+        Record the end of a stage of a run kept in memory
+
+        Args:
+            test_id (str): ID of the test
+            details (dict): Test case details from TestCase.get_details
+        """
+        stage = {key: details.get(key) for key in STAGE_FIELDS if details.get(key) is not None}
+        with self.lock:
+            record = self.runs.get(test_id)
+            if record is None:
+                return
+            record.setdefault('stages', []).append(stage)
+        self._journal('stage_ended', test_id, **stage)
+
+    def append_logs(self, test_id, text):
+        """
+        Append output to the logs of a run kept in memory
+
+        Args:
+            test_id (str): ID of the test
+            text (str): Output to append
+
+        Returns:
+            bool: True if the run is in memory
+        """
+        with self.lock:
+            record = self.runs.get(test_id)
+            if record is None:
+                return False
+            record['logs'] = record.get('logs', '') + text
+            return True
+
+    def get(self, test_id):
+        """
+        Get a run, from memory or from the result store
+
+        Runs saved before the registry existed are rebuilt from their
+        result details, without logs.
+
+        Args:
+            test_id (str): ID of the test
+
+        Returns:
+            dict: Run record with its result, or None if not found
+        """
+        with self.lock:
+            record = self.runs.get(test_id)
+            if record is None and test_id in self.cache:
+                self.cache.move_to_end(test_id)
+                record = self.cache[test_id]
+        if record is not None:
+            return record
+
+        record = self.store.get_run(test_id)
+        result = self.store.get(test_id)
+        if record is None and result is None:
+            return None
+        if record is None:
+            record = {
+                'test_id': test_id,
+                'status': 'completed',
+                'start_time': result.get('start_time'),
+                'end_time': result.get('end_time'),
+                'params': result.get('test_params'),
+                'logs': ''
+            }
+        record['result'] = result
+
+        with self.lock:
+            self.cache[test_id] = record
+            while len(self.cache) > self.cache_size:
+                self.cache.popitem(last=False)
+        return record
+
+    def evict(self):
+        """
+        Move finished runs past their time to live, or over the count limit, to the result store
+
+        Returns:
+            int: Number of runs evicted
+        """
+        now = time.monotonic()
+        with self.lock:
+            expired = []
+            for test_id, finished_at in self.finished.items():
+                if now - finished_at < self.ttl_seconds and len(self.finished) - len(expired) <= self.max_finished:
+                    break
+                expired.append(test_id)
+
+        evicted = 0
+        for test_id in expired:
+            with self.lock:
+                record = self.runs.get(test_id)
+            if record is None:
+                continue
+            try:
+                self.store.save_run(record)
+            except Exception as e:
+                # Keep the run in memory rather than lose it
+                print(f"Error moving run {test_id} to the result store: {str(e)}")
+                continue
+            with self.lock:
+                self.runs.pop(test_id, None)
+                self.finished.pop(test_id, None)
+            self._journal('evicted', test_id)
+            evicted += 1
+        return evicted
+
+    def recover(self):
+        """
+        Rebuild the runs of a previous process from the journal
+
+        Finished runs are written to the result store. Runs that were still
+        queued or running were orphaned by the restart: they are marked
+        'interrupted' and saved with an INTERRUPTED result holding the
+        stages that had ended. The journal is then compacted.
+
+        Returns:
+            dict: Number of finished and interrupted runs recovered
+        """
+        if self.journal is None:
+            return {'finished': 0, 'interrupted': 0}
+
+        recovered = {'finished': 0, 'interrupted': 0}
+        for test_id, record in self.journal.replay().items():
+            with self.lock:
+                if test_id in self.runs:
+                    continue
+
+            record.setdefault('logs', '')
+            if record.get('status') not in FINISHED_STATUSES:
+                record['status'] = 'interrupted'
+                record['end_time'] = datetime.now().isoformat()
+                record['error'] = "The server restarted while the test was running"
+                if not self.store.exists(test_id):
+                    self.store.save(self._interrupted_result(record))
+                recovered['interrupted'] += 1
+            else:
+                recovered['finished'] += 1
+
+            try:
+                self.store.save_run(record)
+            except Exception as e:
+                print(f"Error saving recovered run {test_id}: {str(e)}")
+
+        self.journal.compact(self._tracked_records)
+        return recovered
+
+    def _interrupted_result(self, record):
+        """Build result details for a run interrupted by a restart from its journaled stages"""
+        duration = None
+        if record.get('start_time'):
+            duration = (datetime.fromisoformat(record['end_time']) -
+                        datetime.fromisoformat(record['start_time'])).total_seconds()
+        return {
+            'test_id': record['test_id'],
+            'status': 'INTERRUPTED',
+            'start_time': record.get('start_time'),
+            'end_time': record['end_time'],
+            'duration_seconds': duration,
+            'test_params': record.get('params') or {},
+            'screenshots': [],
+            'screenshot_count': 0,
+            'test_cases': record.get('stages', []),
+            'error_message': record['error']
+        }
+
+    def get_stats(self):
+        """
+        Get the number of runs held in memory
+
+        Returns:
+            dict: Counts of active, finished and cached runs
+        """
+        with self.lock:
+            return {
+                'active': len(self.runs) - len(self.finished),
+                'finished': len(self.finished),
+                'cached': len(self.cache)
+            }
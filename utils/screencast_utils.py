@@ -0,0 +1,154 @@
+import base64
+import json
+import threading
+import time
+import requests
+
+try:
+    import websocket
+except ImportError:  # websocket-client is optional, screencast recording is unavailable without it
+    websocket = None
+
+
+class ScreencastRecorder:
+    """Class to record a low-frame-rate screencast of the page through the DevTools protocol
+
+    ChromeDriver's execute_cdp_cmd cannot deliver events, so the recorder
+    opens its own DevTools websocket to the page target (Chrome accepts
+    several clients per target) and receives Page.screencastFrame events on
+    a background thread. Chrome only sends frames when the page repaints, at
+    the reduced size requested, and every frame is acknowledged so the
+    stream keeps flowing. Frames are thinned out to the requested frame rate
+    and collected until take_frames() hands them over.
+    """
+
+    def __init__(self, driver, fps=2.0, max_width=960, max_height=540, quality=60, max_frames=600):
+        """
+        Initialize the recorder
+
+        Args:
+            driver (WebDriver): The Chrome WebDriver
+            fps (float): Maximum number of frames kept per second
+            max_width (int): Maximum frame width in pixels
+            max_height (int): Maximum frame height in pixels
+            quality (int): JPEG quality of the frames, 1-100
+            max_frames (int): Maximum number of frames kept between two take_frames() calls;
+                older frames are thinned out beyond it
+        """
+        self.driver = driver
+        self.min_interval = 1.0 / fps if fps else 0.0
+        self.max_width = max_width
+        self.max_height = max_height
+        self.quality = quality
+        self.max_frames = max_frames
+        self.frames = []  # (timestamp, JPEG bytes)
+        self.frames_received = 0
+        self.last_kept = None
+        self.lock = threading.Lock()
+        self.send_lock = threading.Lock()
+        self.ws = None
+        self.message_id = 0
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def _page_websocket_url(self):
+        """Find the DevTools websocket URL of the page the driver controls"""
+        address = self.driver.capabilities.get('goog:chromeOptions', {}).get('debuggerAddress')
+        if not address:
+            raise Exception("Chrome did not report a DevTools debugger address")
+
+        targets = requests.get(f"http://{address}/json", timeout=5).json()
+        pages = [t for t in targets if t.get('type') == 'page' and t.get('webSocketDebuggerUrl')]
+        if not pages:
+            raise Exception("No page target found for the screencast")
+
+        # ChromeDriver window handles are DevTools target IDs
+        handle = self.driver.current_window_handle
+        for page in pages:
+            if page.get('id') == handle:
+                return page['webSocketDebuggerUrl']
+        return pages[0]['webSocketDebuggerUrl']
+
+    def _send(self, method, params=None):
+        """Send a DevTools command without waiting for its response"""
+        with self.send_lock:
+            self.message_id += 1
+            self.ws.send(json.dumps({'id': self.message_id, 'method': method, 'params': params or {}}))
+
+    def start(self):
+        """Connect to the page and start the screencast"""
+        if websocket is None:
+            raise Exception("websocket-client is not installed")
+
+        # Chrome rejects websocket connections with an unexpected Origin header
+        self.ws = websocket.create_connection(self._page_websocket_url(), timeout=10, suppress_origin=True)
+        self.ws.settimeout(1)
+        self._send('Page.enable')
+        self._send('Page.startScreencast', {
+            'format': 'jpeg',
+            'quality': self.quality,
+            'maxWidth': self.max_width,
+            'maxHeight': self.max_height,
+            'everyNthFrame': 1
+        })
+        self._thread = threading.Thread(target=self._run, name="screencast", daemon=True)
+        self._thread.start()
+        return self
+
+    def _run(self):
+        """Receive frames until stopped"""
+        while not self._stop_event.is_set():
+            try:
+                message = json.loads(self.ws.recv())
+            except websocket.WebSocketTimeoutException:
+                continue
+            except Exception as e:
+                if not self._stop_event.is_set():
+                    print(f"Screencast connection closed: {str(e)}")
+                return
+
+            if message.get('method') != 'Page.screencastFrame':
+                continue
+
+            params = message['params']
+            try:
+                self._send('Page.screencastFrameAck', {'sessionId': params['sessionId']})
+            except Exception:
+                return
+            self.frames_received += 1
+
+            timestamp = params.get('metadata', {}).get('timestamp') or time.time()
+            if self.last_kept is not None and timestamp - self.last_kept < self.min_interval:
+                continue
+            self.last_kept = timestamp
+            with self.lock:
+                self.frames.append((timestamp, base64.b64decode(params['data'])))
+                if len(self.frames) > self.max_frames:
+                    # Halve the frame rate of what has been kept rather than losing the end
+                    self.frames = self.frames[::2]
+
+    def take_frames(self):
+        """
+        Hand over the frames received since the last call
+
+        Returns:
+            list: (timestamp, JPEG bytes) tuples in order
+        """
+        with self.lock:
+            frames, self.frames = self.frames, []
+        return frames
+
+    def stop(self):
+        """Stop the screencast and close the connection"""
+        self._stop_event.set()
+        if self.ws:
+            try:
+                self._send('Page.stopScreencast')
+            except Exception:
+                pass
+            try:
+                self.ws.close()
+            except Exception:
+                pass
+        if self._thread and self._thread is not threading.current_thread():
+            self._thread.join(timeout=2)
@@ -0,0 +1,587 @@
+import io
+import os
+import hashlib
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from config import Config
+
+try:
+    from PIL import Image, ImageDraw
+except ImportError:  # Pillow is optional, screenshots are kept as PNG without it
+    Image = None
+    ImageDraw = None
+
+
+MB = 1024 * 1024
+
+# Formats screenshots can be re-encoded to: format -> (Pillow format, content type, file extension)
+SCREENSHOT_FORMATS = {
+    'webp': ('WEBP', 'image/webp', 'webp'),
+    'jpeg': ('JPEG', 'image/jpeg', 'jpg'),
+    'png': ('PNG', 'image/png', 'png')
+}
+
+
+class ScreenshotStore:
+    """Class to keep screenshots in a content-addressed store on disk
+
+    Each screenshot is written once under its SHA-256, so identical frames
+    (e.g. the same dialog captured twice) share one file. Test results keep
+    only handles; the bytes are read back when an email is built or a
+    screenshot is served. Recently used bytes are kept in an in-memory LRU
+    capped at a fixed size for the whole process.
+
+    Adding an object that is already stored refreshes its modification time,
+    so sweep() can delete the objects no recent run has written.
+    """
+
+    def __init__(self, root, memory_cap_mb=64):
+        """
+        Initialize the store
+
+        Args:
+            root (str): Directory holding the objects
+            memory_cap_mb (float): Maximum size of the in-memory cache in MB (0 disables it)
+        """
+        self.root = root
+        self.memory_cap = int(memory_cap_mb * MB)
+        self.cache = OrderedDict()  # sha256 -> bytes, least recently used first
+        self.cache_bytes = 0
+        self.lock = threading.Lock()
+        os.makedirs(self.root, exist_ok=True)
+
+    def path(self, sha256):
+        """
+        Get the path of an object
+
+        Args:
+            sha256 (str): Hex digest of the object
+
+        Returns:
+            str: Path of the object file
+        """
+        return os.path.join(self.root, sha256[:2], sha256)
+
+    def exists(self, sha256):
+        """Check whether an object is in the store"""
+        return os.path.exists(self.path(sha256))
+
+    def put(self, data, content_type='image/png'):
+        """
+        Add an object to the store
+
+        Args:
+            data (bytes): Object content
+            content_type (str): MIME type of the content
+
+        Returns:
+            dict: Handle with the sha256, size and content_type of the object
+        """
+        sha256 = hashlib.sha256(data).hexdigest()
+        path = self.path(sha256)
+        try:
+            # Mark the object as used again, so sweep() keeps it
+            os.utime(path)
+        except FileNotFoundError:
+            directory = os.path.dirname(path)
+            os.makedirs(directory, exist_ok=True)
+            # Write to a temporary file and rename it, so readers never see a partial object
+            fd, temp_path = tempfile.mkstemp(dir=directory, prefix='.tmp-')
+            try:
+                with os.fdopen(fd, 'wb') as f:
+                    f.write(data)
+                os.replace(temp_path, path)
+            except BaseException:
+                if os.path.exists(temp_path):
+                    os.remove(temp_path)
+                raise
+
+        self._cache_put(sha256, data)
+        return {'sha256': sha256, 'size': len(data), 'content_type': content_type}
+
+    def get(self, sha256):
+        """
+        Read an object
+
+        Args:
+            sha256 (str): Hex digest of the object
+
+        Returns:
+            bytes: Object content, or None if it is not in the store
+        """
+        with self.lock:
+            data = self.cache.get(sha256)
+            if data is not None:
+                self.cache.move_to_end(sha256)
+                return data
+
+        try:
+            with open(self.path(sha256), 'rb') as f:
+                data = f.read()
+        except OSError:
+            return None
+
+        self._cache_put(sha256, data)
+        return data
+
+    def _cache_put(self, sha256, data):
+        """Add bytes to the in-memory cache, evicting the least recently used ones over the cap"""
+        if len(data) > self.memory_cap:
+            return
+        with self.lock:
+            if sha256 in self.cache:
+                self.cache.move_to_end(sha256)
+                return
+            self.cache[sha256] = data
+            self.cache_bytes += len(data)
+            while self.cache_bytes > self.memory_cap:
+                _, evicted = self.cache.popitem(last=False)
+                self.cache_bytes -= len(evicted)
+
+    def sweep(self, max_age_days):
+        """
+        Delete the objects not written for max_age_days, and temporary files left by a crash
+
+        Results older than that keep their handles, but their screenshots are no
+        longer served or emailed.
+
+        Args:
+            max_age_days (float): Age in days after which an object is deleted (0 or None keeps everything)
+
+        Returns:
+            dict: Number of objects deleted and MB freed
+        """
+        if not max_age_days or max_age_days <= 0:
+            return {'deleted': 0, 'freed_mb': 0.0}
+
+        now = time.time()
+        cutoff = now - max_age_days * 86400
+        deleted = 0
+        freed = 0
+        for directory in os.scandir(self.root):
+            if not directory.is_dir():
+                continue
+            for entry in os.scandir(directory.path):
+                try:
+                    stat = entry.stat()
+                    temporary = entry.name.startswith('.tmp-')
+                    if stat.st_mtime >= (now - 3600 if temporary else cutoff):
+                        continue
+                    os.remove(entry.path)
+                except OSError:
+                    continue
+                if not temporary:
+                    deleted += 1
+                    freed += stat.st_size
+                    with self.lock:
+                        data = self.cache.pop(entry.name, None)
+                        if data is not None:
+                            self.cache_bytes -= len(data)
+        return {'deleted': deleted, 'freed_mb': round(freed / MB, 1)}
+
+    def get_stats(self):
+        """Get a dictionary of cache usage"""
+        with self.lock:
+            return {
+                'cached_objects': len(self.cache),
+                'cached_mb': round(self.cache_bytes / MB, 1),
+                'memory_cap_mb': round(self.memory_cap / MB, 1)
+            }
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_screenshot_store():
+    """
+    Get the process-wide screenshot store
+
+    Returns:
+        ScreenshotStore: Store rooted at SCREENSHOTS_DIR/objects
+    """
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = ScreenshotStore(
+                os.path.join(Config.SCREENSHOTS_DIR, 'objects'),
+                memory_cap_mb=Config.SCREENSHOT_MEMORY_CAP_MB
+            )
+        return _store
+
+
+def screenshot_format(fmt=None):
+    """
+    Resolve the format screenshots are stored in
+
+    Args:
+        fmt (str, optional): Requested format (defaults to SCREENSHOT_FORMAT)
+
+    Returns:
+        str: 'webp', 'jpeg' or 'png'; 'png' when Pillow is not installed or the format is unknown
+    """
+    fmt = (fmt or Config.SCREENSHOT_FORMAT).lower()
+    if fmt == 'jpg':
+        fmt = 'jpeg'
+    if Image is None or fmt not in SCREENSHOT_FORMATS:
+        return 'png'
+    return fmt
+
+
+def screenshot_extension(fmt=None):
+    """Get the file extension of screenshots in the given (or configured) format"""
+    return SCREENSHOT_FORMATS[screenshot_format(fmt)][2]
+
+
+def _save_image(image, fmt, quality):
+    """Encode a Pillow image in one of SCREENSHOT_FORMATS"""
+    pil_format = SCREENSHOT_FORMATS[fmt][0]
+    if pil_format == 'JPEG' and image.mode not in ('RGB', 'L'):
+        image = image.convert('RGB')
+    options = {'optimize': True} if pil_format == 'PNG' else {'quality': quality}
+    if pil_format == 'WEBP':
+        options['method'] = 4
+    buffer = io.BytesIO()
+    image.save(buffer, pil_format, **options)
+    return buffer.getvalue()
+
+
+def _encode_image(image, png_data, fmt, quality, thumbnail_width):
+    """Re-encode a decoded screenshot and make its thumbnail"""
+    data = png_data if fmt == 'png' else _save_image(image, fmt, quality)
+
+    thumbnail = None
+    if thumbnail_width and image.width > thumbnail_width:
+        height = max(1, round(image.height * thumbnail_width / image.width))
+        small = image.resize((thumbnail_width, height), Image.LANCZOS)
+        # Thumbnails share the screenshot's format and content type
+        thumbnail = _save_image(small, fmt, quality)
+
+    return data, SCREENSHOT_FORMATS[fmt][1], thumbnail
+
+
+def encode_screenshot(png_data, fmt=None, quality=80, thumbnail_width=320):
+    """
+    Re-encode a PNG screenshot and make a thumbnail of it
+
+    Args:
+        png_data (bytes): Screenshot as returned by WebDriver.get_screenshot_as_png()
+        fmt (str, optional): Target format (defaults to SCREENSHOT_FORMAT)
+        quality (int): Quality of lossy formats, 1-100
+        thumbnail_width (int): Width of the thumbnail in pixels (0 disables thumbnails)
+
+    Returns:
+        tuple: (data, content type, thumbnail data or None)
+    """
+    fmt = screenshot_format(fmt)
+    if Image is None:
+        return png_data, 'image/png', None
+
+    with Image.open(io.BytesIO(png_data)) as image:
+        image.load()
+        return _encode_image(image, png_data, fmt, quality, thumbnail_width)
+
+
+def build_animation(frames, quality=60, max_frame_seconds=2.0):
+    """
+    Assemble screencast frames into an animated WebP
+
+    Each frame is shown for the time until the next one (capped, so idle
+    periods without repaints do not stall playback), the last one for a second.
+
+    Args:
+        frames (list): (timestamp, JPEG bytes) tuples in order
+        quality (int): WebP quality, 1-100
+        max_frame_seconds (float): Longest time a single frame is shown
+
+    Returns:
+        bytes: Animated WebP, or None if there are no frames or Pillow is not installed
+    """
+    if not frames or Image is None:
+        return None
+
+    images = [Image.open(io.BytesIO(data)) for _, data in frames]
+    try:
+        durations = []
+        for (timestamp, _), (next_timestamp, _) in zip(frames, frames[1:]):
+            durations.append(int(min(max(next_timestamp - timestamp, 0.05), max_frame_seconds) * 1000))
+        durations.append(1000)
+
+        buffer = io.BytesIO()
+        images[0].save(
+            buffer,
+            'WEBP',
+            save_all=True,
+            append_images=images[1:],
+            duration=durations,
+            loop=0,
+            quality=quality,
+            method=4
+        )
+        return buffer.getvalue()
+    finally:
+        for image in images:
+            image.close()
+
+
+def build_contact_sheet(images, max_bytes=None, columns=3, tile_width=480, min_tile_width=120, quality=70, fmt=None):
+    """
+    Downscale screenshots into one grid image, each tile captioned with its name
+
+    The tiles shrink (and the quality drops) step by step until the sheet
+    fits in max_bytes. Recordings show their first frame.
+
+    Args:
+        images (list): (caption, image bytes) tuples in order
+        max_bytes (int, optional): Largest acceptable size of the encoded sheet
+        columns (int): Tiles per row
+        tile_width (int): Width of a tile in pixels to start from
+        min_tile_width (int): Width of a tile below which the sheet is given up
+        quality (int): Quality to start from, 1-100
+        fmt (str, optional): Format of the sheet (defaults to SCREENSHOT_FORMAT, JPEG instead of PNG)
+
+    Returns:
+        tuple: (data, content type), or None if there are no images, Pillow is not installed or the
+            sheet does not fit in max_bytes
+    """
+    if not images or Image is None:
+        return None
+
+    fmt = screenshot_format(fmt)
+    if fmt == 'png':
+        fmt = 'jpeg'
+
+    tiles = []
+    for caption, data in images:
+        try:
+            with Image.open(io.BytesIO(data)) as image:
+                tile = image.convert('RGB')
+        except Exception as e:
+            print(f"Skipping {caption} in the contact sheet: {str(e)}")
+            continue
+        tile.thumbnail((tile_width, tile_width * 4), Image.LANCZOS)
+        tiles.append((caption, tile))
+    if not tiles:
+        return None
+
+    columns = max(1, min(columns, len(tiles)))
+    caption_height = 14
+    while tile_width >= min_tile_width:
+        scaled = [(caption, tile if tile.width <= tile_width else
+                   tile.resize((tile_width, max(1, round(tile.height * tile_width / tile.width))), Image.LANCZOS))
+                  for caption, tile in tiles]
+        rows = [scaled[i:i + columns] for i in range(0, len(scaled), columns)]
+        row_heights = [max(tile.height for _, tile in row) + caption_height for row in rows]
+
+        sheet = Image.new('RGB', (columns * tile_width, sum(row_heights)), 'white')
+        draw = ImageDraw.Draw(sheet)
+        top = 0
+        for row, row_height in zip(rows, row_heights):
+            for column, (caption, tile) in enumerate(row):
+                left = column * tile_width
+                sheet.paste(tile, (left, top + caption_height))
+                draw.text((left + 2, top + 1), caption[:tile_width // 7], fill='black')
+            top += row_height
+
+        data = _save_image(sheet, fmt, quality)
+        if max_bytes is None or len(data) <= max_bytes:
+            return data, SCREENSHOT_FORMATS[fmt][1]
+        tile_width = int(tile_width * 0.75)
+        quality = max(40, quality - 10)
+    return None
+
+
+def dhash(image, hash_size=8):
+    """
+    Compute the difference hash of an image
+
+    The image is shrunk to (hash_size + 1) x hash_size grey pixels and each
+    bit records whether a pixel is brighter than its right neighbour, so
+    frames that look alike have hashes a small Hamming distance apart.
+
+    Args:
+        image (PIL.Image.Image): Decoded image
+        hash_size (int): Hash width and height in bits
+
+    Returns:
+        int: hash_size * hash_size bit hash
+    """
+    small = image.convert('L').resize((hash_size + 1, hash_size), Image.BILINEAR)
+    pixels = list(small.getdata())
+    value = 0
+    for row in range(hash_size):
+        offset = row * (hash_size + 1)
+        for col in range(hash_size):
+            value = (value << 1) | (pixels[offset + col] > pixels[offset + col + 1])
+    return value
+
+
+def hamming_distance(a, b):
+    """Number of differing bits between two hashes"""
+    return bin(a ^ b).count('1')
+
+
+class ScreenshotPipeline:
+    """Class to compress and store screenshots on background threads
+
+    The automation thread only grabs the raw PNG; re-encoding, thumbnailing
+    and writing to the store happen on a small thread pool. Each screenshot
+    handle is filled in by its worker, so callers wait for the returned
+    future (or TestResult.flush_screenshots) before reading the handle.
+
+    Frames are deduplicated against the last kept frame of the same lane
+    (test case) by perceptual hash. A frame waits for the previous frame of
+    its lane to finish, which cannot deadlock because the executor starts
+    work in submission order.
+    """
+
+    def __init__(self, store, workers=2, fmt=None, quality=80, thumbnail_width=320,
+                 dedup_policy='off', dedup_threshold=4):
+        """
+        Initialize the pipeline
+
+        Args:
+            store (ScreenshotStore): Store the encoded screenshots are written to
+            workers (int): Number of worker threads
+            fmt (str, optional): Target format (defaults to SCREENSHOT_FORMAT)
+            quality (int): Quality of lossy formats, 1-100
+            thumbnail_width (int): Width of thumbnails in pixels (0 disables thumbnails)
+            dedup_policy (str): What to do with near-duplicate frames: 'off' keeps them, 'drop'
+                removes them from the result and 'collapse' keeps their names but points them at
+                the frame they duplicate
+            dedup_threshold (int): Maximum Hamming distance between the hashes of near-duplicates
+        """
+        self.store = store
+        self.format = screenshot_format(fmt)
+        self.quality = quality
+        self.thumbnail_width = thumbnail_width
+        self.dedup_policy = dedup_policy if dedup_policy in ('off', 'drop', 'collapse') else 'off'
+        self.dedup_threshold = dedup_threshold
+        self.executor = ThreadPoolExecutor(max_workers=max(1, int(workers)), thread_name_prefix='screenshot')
+
+    def submit(self, handle, png_data, save_path=None, previous=None, exempt=False):
+        """
+        Queue a screenshot for encoding and storage
+
+        Args:
+            handle (dict): Screenshot handle to fill in with the stored object's details
+            png_data (bytes): Raw PNG screenshot
+            save_path (str, optional): Also write the encoded screenshot to this path
+            previous (Future, optional): Future of the previous frame in the same lane
+            exempt (bool): Always keep this frame (e.g. failure screenshots)
+
+        Returns:
+            Future: Resolves to (handle, reference handle) once the screenshot is stored, where the
+                reference is the last kept frame of the lane
+        """
+        return self.executor.submit(self._process, handle, png_data, save_path, previous, exempt)
+
+    def submit_recording(self, handle, frames):
+        """
+        Queue screencast frames to be assembled into an animated WebP and stored
+
+        Args:
+            handle (dict): Recording handle to fill in with the stored object's details
+            frames (list): (timestamp, JPEG bytes) tuples in order
+
+        Returns:
+            Future: Resolves to the handle once the recording is stored
+        """
+        return self.executor.submit(self._process_recording, handle, frames)
+
+    def _process_recording(self, handle, frames):
+        """Assemble and store one recording"""
+        data = build_animation(frames, quality=self.quality)
+        if data:
+            handle.update(self.store.put(data, 'image/webp'))
+            handle['duration_seconds'] = round(frames[-1][0] - frames[0][0], 1)
+        return handle
+
+    def _reference(self, previous):
+        """Get the last kept frame of a lane from the previous frame's future"""
+        if previous is None:
+            return None
+        try:
+            return previous.result()[1]
+        except Exception:
+            return None
+
+    def _process(self, handle, png_data, save_path, previous, exempt):
+        """Hash, deduplicate, encode, thumbnail and store one screenshot"""
+        handle['original_size'] = len(png_data)
+        image = None
+        if Image is not None:
+            try:
+                image = Image.open(io.BytesIO(png_data))
+                image.load()
+                handle['dhash'] = f"{dhash(image):016x}"
+            except Exception as e:
+                print(f"Error decoding screenshot {handle.get('filename')}: {str(e)}")
+                image = None
+
+        reference = self._reference(previous)
+        if (self.dedup_policy != 'off' and not exempt and reference and reference.get('sha256')
+                and handle.get('dhash') and reference.get('dhash')):
+            distance = hamming_distance(int(handle['dhash'], 16), int(reference['dhash'], 16))
+            if distance <= self.dedup_threshold:
+                handle['suppressed'] = 'dropped' if self.dedup_policy == 'drop' else 'collapsed'
+                handle['duplicate_of'] = reference['filename']
+                if self.dedup_policy == 'collapse':
+                    for key in ('sha256', 'size', 'content_type', 'thumbnail_sha256'):
+                        handle[key] = reference.get(key)
+                if image is not None:
+                    image.close()
+                return handle, reference
+
+        data, content_type, thumbnail = png_data, 'image/png', None
+        if image is not None:
+            try:
+                data, content_type, thumbnail = _encode_image(
+                    image, png_data, self.format, self.quality, self.thumbnail_width)
+            except Exception as e:
+                print(f"Error encoding screenshot {handle.get('filename')}, keeping the PNG: {str(e)}")
+            finally:
+                image.close()
+
+        stored = self.store.put(data, content_type)
+        handle.update(stored)
+        handle['thumbnail_sha256'] = self.store.put(thumbnail, content_type)['sha256'] if thumbnail else None
+
+        if save_path:
+            try:
+                with open(save_path, 'wb') as f:
+                    f.write(data)
+                print(f"Screenshot also saved to disk: {save_path}")
+            except OSError as e:
+                print(f"Error saving screenshot to disk: {str(e)}")
+
+        return handle, handle
+
+
+_pipeline = None
+
+
+def get_screenshot_pipeline():
+    """
+    Get the process-wide screenshot pipeline
+
+    Returns:
+        ScreenshotPipeline: Pipeline writing to the process-wide screenshot store
+    """
+    global _pipeline
+    store = get_screenshot_store()
+    with _store_lock:
+        if _pipeline is None:
+            _pipeline = ScreenshotPipeline(
+                store,
+                workers=Config.SCREENSHOT_WORKERS,
+                fmt=Config.SCREENSHOT_FORMAT,
+                quality=Config.SCREENSHOT_QUALITY,
+                thumbnail_width=Config.SCREENSHOT_THUMBNAIL_WIDTH,
+                dedup_policy=Config.SCREENSHOT_DEDUP_POLICY,
+                dedup_threshold=Config.SCREENSHOT_DEDUP_THRESHOLD
+            )
+        return _pipeline
@@ -0,0 +1,150 @@
+import bisect
+import math
+
+
+def percentile(values, pct):
+    """
+    Calculate a percentile with linear interpolation between closest ranks
+
+    Args:
+        values (list): Numeric samples (need not be sorted)
+        pct (float): Percentile between 0 and 100
+
+    Returns:
+        float: The percentile, or None if there are no samples
+    """
+    if not values:
+        return None
+    ordered = sorted(values)
+    if len(ordered) == 1:
+        return float(ordered[0])
+
+    rank = (len(ordered) - 1) * (pct / 100.0)
+    lower = math.floor(rank)
+    upper = math.ceil(rank)
+    if lower == upper:
+        return float(ordered[int(rank)])
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (rank - lower)
+
+
+def median_absolute_deviation(values):
+    """
+    Calculate the median and the median absolute deviation of samples
+
+    Args:
+        values (list): Numeric samples
+
+    Returns:
+        tuple: (median, MAD), or (None, None) if there are no samples
+    """
+    if not values:
+        return None, None
+    median = percentile(values, 50)
+    return median, percentile([abs(value - median) for value in values], 50)
+
+
+def robust_z_score(value, median, mad, min_mad=0.0):
+    """
+    Calculate how far a value is from the median in units of the MAD
+
+    The MAD is scaled by 1.4826 so the score matches a standard z-score
+    for normally distributed samples.
+
+    Args:
+        value (float): The sample to score
+        median (float): Median of the reference samples
+        mad (float): Median absolute deviation of the reference samples
+        min_mad (float): Floor for the MAD, so a very steady baseline does not flag tiny changes
+
+    Returns:
+        float: The robust z-score, or None if the spread is zero
+    """
+    spread = max(mad, min_mad) * 1.4826
+    if not spread:
+        return None
+    return (value - median) / spread
+
+
+def latency_summary(values, digits=1):
+    """
+    Summarize latency samples
+
+    Args:
+        values (list): Latency samples
+        digits (int): Number of digits to round to
+
+    Returns:
+        dict: p50, p90, p95, p99, max and mean of the samples
+    """
+    if not values:
+        return {'p50': None, 'p90': None, 'p95': None, 'p99': None, 'max': None, 'mean': None}
+    return {
+        'p50': round(percentile(values, 50), digits),
+        'p90': round(percentile(values, 90), digits),
+        'p95': round(percentile(values, 95), digits),
+        'p99': round(percentile(values, 99), digits),
+        'max': round(max(values), digits),
+        'mean': round(sum(values) / len(values), digits)
+    }
+
+
+# Upper bounds in seconds of the duration histogram buckets, log-spaced from 0.5 s to an hour so
+# each bucket is 6% wider than the one before; a last bucket holds anything longer
+DURATION_BUCKET_RATIO = 1.06
+DURATION_BUCKETS = tuple(round(0.5 * DURATION_BUCKET_RATIO ** index, 3)
+                         for index in range(math.ceil(math.log(7200) / math.log(DURATION_BUCKET_RATIO)) + 1))
+
+
+def histogram_bucket(value, bounds=DURATION_BUCKETS):
+    """
+    Find the histogram bucket of a value
+
+    Args:
+        value (float): The sample
+        bounds (tuple): Ascending bucket upper bounds
+
+    Returns:
+        int: Index of the bucket, len(bounds) for values above the last bound
+    """
+    return bisect.bisect_left(bounds, value)
+
+
+def histogram_percentile(counts, pct, bounds=DURATION_BUCKETS, minimum=None, maximum=None):
+    """
+    Estimate a percentile from histogram counts
+
+    The sample is assumed to be spread evenly within its bucket, so the
+    error is at most the width of the bucket the percentile falls in.
+
+    Args:
+        counts (list): Sample count per bucket, len(bounds) + 1 entries
+        pct (float): Percentile between 0 and 100
+        bounds (tuple): Ascending bucket upper bounds
+        minimum (float, optional): Smallest sample, used to bound the estimate
+        maximum (float, optional): Largest sample, used to bound the estimate and for the last bucket
+
+    Returns:
+        float: The estimated percentile, or None if there are no samples
+    """
+    total = sum(counts)
+    if not total:
+        return None
+
+    rank = total * (pct / 100.0)
+    seen = 0
+    for index, count in enumerate(counts):
+        if not count or seen + count < rank:
+            seen += count
+            continue
+        lower = bounds[index - 1] if index > 0 else 0.0
+        if index < len(bounds):
+            upper = bounds[index]
+        else:
+            upper = maximum if maximum is not None else lower
+        estimate = lower + (upper - lower) * max(rank - seen, 0) / count
+        if minimum is not None:
+            estimate = max(estimate, minimum)
+        if maximum is not None:
+            estimate = min(estimate, maximum)
+        return float(estimate)
+    return float(maximum) if maximum is not None else float(bounds[-1])
@@ -4,9 +4,16 @@ import uuid
 import time
 import io
 import base64
+from collections import deque
 from datetime import datetime
 from config import Config
 from utils.email_utils import send_test_result_email
+from utils.result_utils import get_result_store
+from utils.regression_utils import find_stage_regressions
+from utils.screenshot_utils import get_screenshot_store, get_screenshot_pipeline, SCREENSHOT_FORMATS
+
+# Screenshots whose names contain one of these are never deduplicated
+FAILURE_SCREENSHOT_MARKERS = ('error', 'fail', 'warning')
 
 class TestCase:
     """Class to handle individual test case results"""
@@ -25,21 +32,61 @@ class TestCase:
         self.end_time = None
         self.status = "RUNNING"
         self.error_message = None
-        self.screenshots = []  # List of dicts with screenshot data and metadata
-
-    def add_screenshot(self, screenshot_data, filename):
+        self.screenshots = []  # List of screenshot handles (see TestResult.add_screenshot)
+        self.network = None  # Per-endpoint network breakdown for this stage, if captured
+        self.performance = []  # Web performance samples taken during this stage
+        self.uploads = []  # Throughput measurements of the uploads made during this stage
+        self.suppressed_screenshots = 0  # Near-duplicate screenshots dropped or collapsed
+        self.recording = None  # Handle of the screencast recording of this stage, if recorded
+        self.budget_seconds = None  # Time budget of this stage, if one is set
+        self.performance_status = None  # 'OK' or 'SLOW' against the budget, once the stage has ended
+
+    def add_screenshot(self, screenshot):
         """
         Add a screenshot to the test case
 
         Args:
-            screenshot_data (bytes): The binary data of the screenshot
-            filename (str): The filename for the screenshot
+            screenshot (dict): Screenshot handle created by TestResult.add_screenshot
         """
-        self.screenshots.append({
-            'filename': filename,
-            'data': screenshot_data,
-            'timestamp': datetime.now().isoformat()
-        })
+        self.screenshots.append(screenshot)
+
+    def set_network_summary(self, summary):
+        """
+        Attach the network breakdown recorded during this test case
+
+        Args:
+            summary (dict): Aggregates from NetworkRecorder.summarize
+        """
+        self.network = summary
+
+    def add_performance_sample(self, sample):
+        """
+        Add a web performance sample to the test case
+
+        Args:
+            sample (dict): Sample from perf_utils.collect_page_metrics
+        """
+        self.performance.append(sample)
+
+    def add_upload_metrics(self, metrics):
+        """
+        Add the throughput measurement of an upload to the test case
+
+        Args:
+            metrics (dict): Details from UploadMeasurement.get_details
+        """
+        self.uploads.append(metrics)
+
+    def set_budget(self, budget_seconds, over_budget):
+        """
+        Record the time budget of the test case and whether it went over it
+
+        Args:
+            budget_seconds (float): Time budget in seconds
+            over_budget (bool): Whether the test case took longer than its budget
+        """
+        self.budget_seconds = budget_seconds
+        self.performance_status = 'SLOW' if over_budget else 'OK'
 
     def mark_passed(self):
         """Mark the test case as passed"""
@@ -72,9 +119,30 @@ class TestCase:
             'screenshot_count': len(self.screenshots)
         }
 
+        if self.suppressed_screenshots:
+            details['suppressed_screenshot_count'] = self.suppressed_screenshots
+
+        if self.recording and self.recording.get('sha256'):
+            details['recording'] = {
+                key: self.recording.get(key) for key in ('filename', 'frame_count', 'duration_seconds', 'size')
+            }
+
+        if self.budget_seconds is not None:
+            details['budget_seconds'] = self.budget_seconds
+            details['performance_status'] = self.performance_status
+
         if self.error_message:
             details['error_message'] = self.error_message
 
+        if self.network is not None:
+            details['network'] = self.network
+
+        if self.performance:
+            details['performance'] = self.performance
+
+        if self.uploads:
+            details['uploads'] = self.uploads
+
         return details
 
 class TestResult:
@@ -93,38 +161,256 @@ class TestResult:
         self.end_time = None
         self.status = "RUNNING"
         self.error_message = None
-        self.screenshots = []  # List of dicts with screenshot data and metadata
+        self.screenshots = []  # Handles of screenshots in the screenshot store, without the bytes
+        self.screenshot_store = get_screenshot_store()
+        self.screenshot_pipeline = get_screenshot_pipeline()
+        self.pending_screenshots = []  # Futures of screenshots still being encoded
+        self.screenshot_lanes = {}  # Test case name -> future of its latest screenshot, for deduplication
+        self.suppressed_screenshots = 0  # Near-duplicate screenshots dropped or collapsed
+        self.recordings = []  # Handles of per-test-case screencast recordings
+        self.capture_policy = 'always'  # 'always' or 'on_failure' (see set_capture_policy)
+        self.ring_size = 5
+        self.screenshot_rings = {}  # Test case name (None for the overall test) -> recent unstored screenshots
+        self.discarded_screenshots = 0  # Screenshots of passed test cases that were never stored
+        self.pending_recordings = []  # Futures of recordings still being assembled
         self.test_params = test_params or {}
         self.test_cases = {}  # Dictionary to store individual test cases
         self.email_sent = False  # Flag to track if email has been sent
+        self.email_report = None  # Attachments and size of the queued email (see send_test_result_email)
+        self.network_capture = None  # HAR file and overall network aggregates, if captured
+        self.memory = None  # Browser memory usage reported by the watchdog
+        self.performance_regressions = None  # Stages slower than their baseline, once the test has ended
+        self.stage_budgets = {}  # Test case name -> time budget in seconds (see set_stage_budgets)
+        self.stage_budget_action = 'slow'
+        self.listeners = []  # Callbacks notified of test case and test ends (see add_listener)
 
         # Create a temporary directory for any necessary files
         self.temp_dir = os.path.join(os.getcwd(), 'temp')
         if not os.path.exists(self.temp_dir):
             os.makedirs(self.temp_dir)
 
-    def add_screenshot(self, screenshot_data, filename, test_case_name=None):
+    def set_capture_policy(self, policy, ring_size=5):
+        """
+        Choose which screenshots are kept
+
+        Args:
+            policy (str): 'always' stores every screenshot; 'on_failure' keeps the last ring_size
+                screenshots of each test case in memory and stores them only if the test case
+                (or the overall test) fails
+            ring_size (int): Number of screenshots kept per test case under 'on_failure'
+        """
+        if policy not in ('always', 'on_failure'):
+            print(f"Invalid screenshot capture policy: {policy}, defaulting to 'always'")
+            policy = 'always'
+        self.capture_policy = policy
+        self.ring_size = max(1, int(ring_size))
+
+    def add_listener(self, callback):
+        """
+        Register a callback for the lifecycle events of the test
+
+        Args:
+            callback (callable): Called as callback(event, details) with 'test_case_ended' and
+                the test case details, or 'test_ended' and the test details
+        """
+        self.listeners.append(callback)
+
+    def _notify(self, event, details):
+        """Call the listeners; a failing listener does not affect the test"""
+        for callback in self.listeners:
+            try:
+                callback(event, details)
+            except Exception as e:
+                print(f"Error in test result listener for {event}: {str(e)}")
+
+    def set_stage_budgets(self, budgets, action='slow'):
+        """
+        Set time budgets for test cases
+
+        Args:
+            budgets (dict): Test case name -> time budget in seconds
+            action (str): 'slow' marks a test case over its budget as SLOW but keeps its status;
+                'fail' marks it as failed
+        """
+        if action not in ('slow', 'fail'):
+            print(f"Invalid stage budget action: {action}, defaulting to 'slow'")
+            action = 'slow'
+        self.stage_budgets = dict(budgets or {})
+        self.stage_budget_action = action
+
+    def add_screenshot(self, screenshot_data, filename, test_case_name=None, save_path=None):
         """
         Add a screenshot to the test result
 
+        The screenshot is encoded and written to the screenshot store on a
+        background thread, which fills in the returned handle. Under the
+        'on_failure' capture policy it is only buffered until its test case ends.
+
         Args:
-            screenshot_data (bytes): The binary data of the screenshot
+            screenshot_data (bytes): The binary PNG data of the screenshot
             filename (str): The filename for the screenshot
             test_case_name (str, optional): Name of the test case to add the screenshot to
+            save_path (str, optional): Also write the encoded screenshot to this path
+
+        Returns:
+            dict: Handle of the screenshot in the screenshot store, or None if it was buffered
         """
-        # Create screenshot metadata
+        timestamp = datetime.now().isoformat()
+        if self.capture_policy == 'on_failure':
+            lane = test_case_name if test_case_name in self.test_cases else None
+            ring = self.screenshot_rings.setdefault(lane, deque(maxlen=self.ring_size))
+            if len(ring) == ring.maxlen:
+                self.discarded_screenshots += 1
+            ring.append((screenshot_data, filename, test_case_name, save_path, timestamp))
+            return None
+
+        return self._store_screenshot(screenshot_data, filename, test_case_name, save_path, timestamp)
+
+    def _store_screenshot(self, screenshot_data, filename, test_case_name, save_path, timestamp):
+        """Queue a screenshot for the screenshot store and record its handle"""
+        # Keep only the handle; the bytes go to the store
         screenshot_info = {
             'filename': filename,
-            'data': screenshot_data,
-            'timestamp': datetime.now().isoformat()
+            'timestamp': timestamp,
+            'sha256': None,
+            'content_type': SCREENSHOT_FORMATS[self.screenshot_pipeline.format][1]
         }
+        # Deduplicate against the previous frame of the same test case, but keep every failure shot
+        lane = test_case_name if test_case_name in self.test_cases else None
+        exempt = any(marker in filename.lower() for marker in FAILURE_SCREENSHOT_MARKERS)
+        future = self.screenshot_pipeline.submit(
+            screenshot_info, screenshot_data, save_path, self.screenshot_lanes.get(lane), exempt)
+        self.screenshot_lanes[lane] = future
+        self.pending_screenshots.append(future)
 
         # Add to overall screenshots
         self.screenshots.append(screenshot_info)
 
         # Add to specific test case if provided
         if test_case_name and test_case_name in self.test_cases:
-            self.test_cases[test_case_name].add_screenshot(screenshot_data, filename)
+            self.test_cases[test_case_name].add_screenshot(screenshot_info)
+
+        return screenshot_info
+
+    def flush_screenshot_ring(self, test_case_name=None):
+        """
+        Store the buffered screenshots of a test case (or of the overall test)
+
+        Args:
+            test_case_name (str, optional): Name of the test case, None for the overall test
+        """
+        ring = self.screenshot_rings.pop(test_case_name, None)
+        if ring:
+            print(f"Keeping the last {len(ring)} screenshots of {test_case_name or 'the test'}")
+        for screenshot in ring or ():
+            self._store_screenshot(*screenshot)
+
+    def drop_screenshot_ring(self, test_case_name=None):
+        """
+        Discard the buffered screenshots of a test case (or of the overall test)
+
+        Args:
+            test_case_name (str, optional): Name of the test case, None for the overall test
+        """
+        ring = self.screenshot_rings.pop(test_case_name, None)
+        if ring:
+            self.discarded_screenshots += len(ring)
+
+    def finish_screenshot_rings(self):
+        """Store the remaining buffered screenshots if the test failed, otherwise discard them"""
+        for name in list(self.screenshot_rings):
+            if self.status == "FAILED":
+                self.flush_screenshot_ring(name)
+            else:
+                self.drop_screenshot_ring(name)
+
+    def add_recording(self, frames, test_case_name):
+        """
+        Add the screencast recording of a test case
+
+        The frames are assembled into an animated WebP on a background thread.
+
+        Args:
+            frames (list): (timestamp, JPEG bytes) tuples from ScreencastRecorder.take_frames
+            test_case_name (str): Name of the test case that was recorded
+
+        Returns:
+            dict: Handle of the recording in the screenshot store
+        """
+        recording_info = {
+            'filename': f"{test_case_name.lower().replace(' ', '_')}_recording.webp",
+            'timestamp': datetime.now().isoformat(),
+            'sha256': None,
+            'content_type': 'image/webp',
+            'frame_count': len(frames)
+        }
+        self.pending_recordings.append(self.screenshot_pipeline.submit_recording(recording_info, frames))
+        self.recordings.append(recording_info)
+        if test_case_name in self.test_cases:
+            self.test_cases[test_case_name].recording = recording_info
+        return recording_info
+
+    def flush_screenshots(self, timeout=60):
+        """
+        Wait for the screenshots and recordings still being encoded
+
+        Args:
+            timeout (float): Maximum number of seconds to wait for each screenshot
+        """
+        pending_recordings, self.pending_recordings = self.pending_recordings, []
+        for future in pending_recordings:
+            try:
+                future.result(timeout=timeout)
+            except Exception as e:
+                print(f"Error storing screencast recording: {str(e)}")
+
+        pending, self.pending_screenshots = self.pending_screenshots, []
+        suppressed = []
+        for future in pending:
+            try:
+                screenshot, _ = future.result(timeout=timeout)
+            except Exception as e:
+                print(f"Error storing screenshot: {str(e)}")
+                continue
+            if screenshot.get('suppressed'):
+                suppressed.append(screenshot)
+
+        if not suppressed:
+            return
+
+        # Count near-duplicates and take dropped ones out of the result
+        suppressed_ids = {id(s) for s in suppressed}
+        dropped_ids = {id(s) for s in suppressed if s['suppressed'] == 'dropped'}
+        self.suppressed_screenshots += len(suppressed)
+        self.screenshots = [s for s in self.screenshots if id(s) not in dropped_ids]
+        for test_case in self.test_cases.values():
+            test_case.suppressed_screenshots += sum(1 for s in test_case.screenshots if id(s) in suppressed_ids)
+            test_case.screenshots = [s for s in test_case.screenshots if id(s) not in dropped_ids]
+        print(f"Suppressed {len(suppressed)} near-duplicate screenshots")
+
+    def load_screenshots(self):
+        """
+        Read the screenshot bytes back from the store, e.g. to attach them to an email
+
+        Returns:
+            list: Dicts with the filename and data of each screenshot and recording still in the
+                store, leaving out collapsed near-duplicates
+        """
+        self.flush_screenshots()
+        screenshots = []
+        for screenshot in self.screenshots + [r for r in self.recordings if r.get('sha256')]:
+            if screenshot.get('suppressed'):
+                continue
+            data = self.screenshot_store.get(screenshot['sha256']) if screenshot.get('sha256') else None
+            if data is None:
+                print(f"Warning: Screenshot {screenshot['filename']} is missing from the screenshot store")
+                continue
+            screenshots.append({
+                'filename': screenshot['filename'],
+                'data': data,
+                'content_type': screenshot['content_type']
+            })
+        return screenshots
 
     def start_test_case(self, name):
         """
@@ -144,6 +430,9 @@ class TestResult:
         """
         End a test case with a pass/fail status
 
+        A test case that passed but took longer than its time budget (see
+        set_stage_budgets) is marked SLOW, or failed under the 'fail' action.
+
         Args:
             name (str): Name of the test case
             passed (bool): Whether the test case passed
@@ -156,17 +445,39 @@ class TestResult:
             # Create the test case if it doesn't exist
             self.start_test_case(name)
 
+        # Check the time budget of a test case that otherwise passed
+        test_case = self.test_cases[name]
+        budget = self.stage_budgets.get(name)
+        over_budget = False
+        if budget is not None and passed:
+            elapsed = (datetime.now() - test_case.start_time).total_seconds()
+            over_budget = elapsed > budget
+            if over_budget:
+                message = f"{name} took {elapsed:.1f}s, over its budget of {budget:g}s"
+                print(f"Stage over budget: {message}")
+                if self.stage_budget_action == 'fail':
+                    passed = False
+                    error_message = message
+
+        # Buffered screenshots are only worth keeping for a failure
         if passed:
+            self.drop_screenshot_ring(name)
             details = self.test_cases[name].mark_passed()
         else:
+            self.flush_screenshot_ring(name)
             details = self.test_cases[name].mark_failed(error_message)
 
+        if budget is not None and (passed or over_budget):
+            test_case.set_budget(budget, over_budget)
+            details = test_case.get_details()
+
         # Update the overall test status if any test case fails
         if not passed and self.status != "FAILED":
             self.status = "FAILED"
             if not self.error_message:
                 self.error_message = f"Test case '{name}' failed: {error_message}"
 
+        self._notify('test_case_ended', details)
         return details
 
     def mark_passed(self):
@@ -174,9 +485,13 @@ class TestResult:
         # Only mark as passed if no test cases have failed
         if self.status != "FAILED":
             self.status = "PASSED"
+        self.finish_screenshot_rings()
+        self.flush_screenshots()
 
         self.end_time = datetime.now()
+        self.check_regressions()
         details = self.get_details()
+        self._notify('test_ended', details)
 
         # Send email with results
         self.send_email_report()
@@ -188,13 +503,38 @@ class TestResult:
         self.end_time = datetime.now()
         self.status = "FAILED"
         self.error_message = error_message
+        self.finish_screenshot_rings()
+        self.flush_screenshots()
+        self.check_regressions()
         details = self.get_details()
+        self._notify('test_ended', details)
 
         # Send email with results
         self.send_email_report()
 
         return details
 
+    def check_regressions(self):
+        """
+        Compare the passed test cases with their baselines in earlier runs
+
+        Returns:
+            list: Details of the regressed stages (see find_stage_regressions)
+        """
+        try:
+            test_cases = [case.get_details() for case in self.test_cases.values()]
+            self.performance_regressions = find_stage_regressions(
+                self.test_params.get('env', 'dev'), test_cases, exclude_test_id=self.test_id)
+        except Exception as e:
+            print(f"Error checking for performance regressions: {str(e)}")
+            self.performance_regressions = []
+
+        for regression in self.performance_regressions:
+            print(f"Performance regression in {regression['stage']}: {regression['duration_seconds']}s vs "
+                  f"median {regression['baseline_median_seconds']}s over {regression['baseline_runs']} runs "
+                  f"(+{regression['slowdown_percent']}%, robust z {regression['robust_z']})")
+        return self.performance_regressions
+
     def get_details(self):
         """Get a dictionary of test details"""
         duration = (self.end_time - self.start_time).total_seconds() if self.end_time else None
@@ -214,33 +554,63 @@ class TestResult:
             'test_params': self.test_params,
             'screenshots': screenshot_filenames,
             'screenshot_count': len(self.screenshots),
+            'screenshot_objects': {
+                s['filename']: {
+                    'sha256': s['sha256'],
+                    'size': s['size'],
+                    'content_type': s['content_type'],
+                    'thumbnail_sha256': s.get('thumbnail_sha256'),
+                    **({'duplicate_of': s['duplicate_of']} if s.get('duplicate_of') else {})
+                }
+                for s in self.screenshots + self.recordings if s.get('sha256')
+            },
             'test_cases': test_case_details
         }
 
+        if self.suppressed_screenshots:
+            details['suppressed_screenshot_count'] = self.suppressed_screenshots
+
+        if self.capture_policy != 'always':
+            details['screenshot_capture_policy'] = self.capture_policy
+            details['discarded_screenshot_count'] = self.discarded_screenshots
+
         if self.error_message:
             details['error_message'] = self.error_message
 
+        if self.network_capture is not None:
+            details['network'] = self.network_capture
+
+        if self.memory is not None:
+            details['memory'] = self.memory
+
+        if self.email_report is not None:
+            details['email'] = self.email_report
+
+        if self.performance_regressions is not None:
+            details['performance_regressions'] = self.performance_regressions
+
+        if self.stage_budgets:
+            over_budget = [case['name'] for case in test_case_details if case.get('performance_status') == 'SLOW']
+            details['performance_status'] = 'OVER_BUDGET' if over_budget else 'OK'
+            details['over_budget_stages'] = over_budget
+
         return details
 
     def send_email_report(self):
-        """Send email with test results and screenshots"""
+        """Queue the email with test results and screenshots for delivery by the email outbox"""
         if self.email_sent:
             print("Email already sent for this test run")
             return False
 
         try:
-            # Get test details
+            # Get test details once every screenshot is stored
+            self.flush_screenshots()
             details = self.get_details()
 
-            # Extract binary screenshot data for email attachments
-            screenshot_data = []
-            for screenshot in self.screenshots:
-                screenshot_data.append({
-                    'filename': screenshot['filename'],
-                    'data': screenshot['data']
-                })
+            # Load the screenshot bytes for the email attachments only now
+            screenshot_data = self.load_screenshots()
 
-            # Send email with results and screenshots
+            # Queue email with results and screenshots
             success = send_test_result_email(
                 self.test_id,
                 self.status,
@@ -250,9 +620,11 @@ class TestResult:
 
             if success:
                 self.email_sent = True
-                print(f"Email report sent successfully for test {self.test_id}")
+                if isinstance(success, dict):
+                    self.email_report = success
+                print(f"Email report queued for test {self.test_id}")
             else:
-                print(f"Failed to send email report for test {self.test_id}")
+                print(f"Failed to queue email report for test {self.test_id}")
 
             return success
 
@@ -261,7 +633,7 @@ class TestResult:
             return False
 
     def save_result(self):
-        """Save the test result to a JSON file (for backward compatibility)"""
+        """Save the test result to the result store and to a JSON file (for backward compatibility)"""
         # Create results directory if needed
         results_dir = os.path.join(os.getcwd(), 'test_results')
         if not os.path.exists(results_dir):
@@ -269,10 +641,15 @@ class TestResult:
 
         result_file = os.path.join(results_dir, f"{self.test_id}.json")
 
+        # Make sure every screenshot handle is filled in
+        self.flush_screenshots()
+
         # Get details without binary data
         details = self.get_details()
 
         with open(result_file, 'w') as f:
             json.dump(details, f, indent=2)
 
+        get_result_store().save(details)
+
         return result_file
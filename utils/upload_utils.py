@@ -0,0 +1,343 @@
+import os
+import time
+import mimetypes
+from concurrent.futures import ThreadPoolExecutor
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from utils.stats_utils import latency_summary
+
+
+# Reads the upload popup and reports per-file and overall progress. The popup's
+# markup is not under our control, so several common patterns are recognised:
+# rows marked with data-file-name or file/upload item classes, <progress>
+# elements, ARIA progress bars, width-based progress bars and status text.
+UPLOAD_PROGRESS_SCRIPT = """
+var popup = document.getElementById(arguments[0]);
+var result = { present: !!popup, visible: false, overall_done: false, uploading: false, files: [] };
+if (!popup) {
+    return result;
+}
+
+var style = window.getComputedStyle(popup);
+result.visible = style.display !== 'none' && style.visibility !== 'hidden' && popup.offsetParent !== null;
+
+var text = popup.innerText || '';
+result.overall_done = /(upload(s)?\\s+(complete|completed|finished|successful))|(uploaded\\s+successfully)|(all\\s+files\\s+uploaded)/i.test(text);
+result.uploading = /(uploading|in progress|processing)/i.test(text);
+
+function progressOf(row) {
+    var progress = row.querySelector('progress');
+    if (progress && progress.max) {
+        return 100 * progress.value / progress.max;
+    }
+    var bar = row.querySelector('[role="progressbar"]');
+    if (bar && bar.getAttribute('aria-valuenow') !== null) {
+        var max = parseFloat(bar.getAttribute('aria-valuemax') || '100');
+        return 100 * parseFloat(bar.getAttribute('aria-valuenow')) / max;
+    }
+    var fill = row.querySelector('[style*="width"]');
+    if (fill && /%/.test(fill.style.width)) {
+        return parseFloat(fill.style.width);
+    }
+    var percent = (row.innerText || '').match(/(\\d{1,3})\\s*%/);
+    return percent ? parseFloat(percent[1]) : null;
+}
+
+var rows = popup.querySelectorAll('[data-file-name], .file-item, .upload-item, .file-row, li');
+for (var i = 0; i < rows.length; i++) {
+    var row = rows[i];
+    var rowText = (row.innerText || '').trim();
+    if (!rowText && !row.getAttribute('data-file-name')) {
+        continue;
+    }
+    var progress = progressOf(row);
+    var failed = /(fail|error)/i.test(rowText) || row.classList.contains('error');
+    var done = !failed && ((progress !== null && progress >= 100) ||
+        /(complete|uploaded|success|done|\\u2713|\\u2714)/i.test(rowText) ||
+        row.classList.contains('complete') || row.classList.contains('success'));
+    result.files.push({
+        name: row.getAttribute('data-file-name') || rowText.split('\\n')[0].slice(0, 200),
+        progress: progress,
+        done: done,
+        failed: failed
+    });
+}
+return result;
+"""
+
+
+# DICOM files are not in the mimetypes database on most systems
+mimetypes.add_type('application/dicom', '.dcm')
+
+
+def list_upload_files(path):
+    """
+    List the files an upload of a file or folder will send
+
+    Folder uploads name each file by its path relative to the folder's parent,
+    the way browsers report webkitRelativePath (e.g. ``notes_folder/a.pdf``).
+
+    Args:
+        path (str): File or folder path
+
+    Returns:
+        list: (absolute path, upload name) tuples
+    """
+    if os.path.isfile(path):
+        return [(path, os.path.basename(path))]
+
+    parent = os.path.dirname(os.path.normpath(path))
+    uploads = []
+    for root, dirs, files in os.walk(path):
+        dirs.sort()
+        for name in sorted(files):
+            file_path = os.path.join(root, name)
+            uploads.append((file_path, os.path.relpath(file_path, parent).replace(os.sep, '/')))
+    return uploads
+
+
+def upload_inventory(path):
+    """
+    Count the files and bytes that an upload of a file or folder will send
+
+    Args:
+        path (str): File or folder path
+
+    Returns:
+        tuple: (file count, total bytes)
+    """
+    files = list_upload_files(path)
+    return len(files), sum(os.path.getsize(file_path) for file_path, _ in files)
+
+
+class UploadMeasurement:
+    """Class to measure the throughput of a single upload through the UI"""
+
+    def __init__(self, path, upload_type):
+        """
+        Initialize the measurement
+
+        Args:
+            path (str): File or folder being uploaded
+            upload_type (str): 'file' or 'folder'
+        """
+        self.path = path
+        self.upload_type = upload_type
+        self.file_count, self.total_bytes = upload_inventory(path) if os.path.exists(path) else (0, 0)
+        self.start = None
+        self.end = None
+        self.completion_detected = False
+        self.success = None
+        self.file_times = {}  # File name -> seconds from selection until the UI showed it done
+        self.failed_files = set()
+
+    def mark_selected(self):
+        """Start the clock once the files have been handed to the file input"""
+        self.start = time.monotonic()
+
+    def mark_completed(self):
+        """Stop the clock when the UI shows the upload as complete"""
+        if self.end is None:
+            self.end = time.monotonic()
+
+    def elapsed(self):
+        """Seconds since the files were selected"""
+        return time.monotonic() - self.start if self.start else 0.0
+
+    def update(self, progress):
+        """
+        Record the per-file state reported by UPLOAD_PROGRESS_SCRIPT
+
+        Args:
+            progress (dict): Result of UPLOAD_PROGRESS_SCRIPT
+
+        Returns:
+            bool: True if the UI shows the upload as complete
+        """
+        elapsed = self.elapsed()
+        files = progress.get('files') or []
+        for file_state in files:
+            name = file_state.get('name')
+            if not name:
+                continue
+            if file_state.get('failed'):
+                self.failed_files.add(name)
+            elif file_state.get('done') and name not in self.file_times:
+                self.file_times[name] = round(elapsed, 3)
+
+        if progress.get('overall_done'):
+            return True
+        if files and all(f.get('done') or f.get('failed') for f in files):
+            return True
+        return False
+
+    def finish(self, success, completion_detected):
+        """
+        Record the outcome, stopping the clock if the UI never showed completion
+
+        Args:
+            success (bool): Whether the upload succeeded
+            completion_detected (bool): Whether the UI showed completion (as opposed
+                to giving up after a fixed wait)
+        """
+        if self.end is None:
+            self.end = time.monotonic()
+        self.success = success
+        self.completion_detected = completion_detected
+
+    def get_details(self):
+        """Get a dictionary of upload throughput details"""
+        elapsed = (self.end - self.start) if self.start and self.end else None
+        mb = self.total_bytes / (1024 * 1024)
+        return {
+            'upload_type': self.upload_type,
+            'mode': 'browser',
+            'path': os.path.basename(os.path.normpath(self.path)),
+            'file_count': self.file_count,
+            'total_bytes': self.total_bytes,
+            'elapsed_seconds': round(elapsed, 3) if elapsed is not None else None,
+            'completion_detected': self.completion_detected,
+            'success': self.success,
+            'mb_per_second': round(mb / elapsed, 3) if elapsed else None,
+            'files_per_second': round(self.file_count / elapsed, 3) if elapsed else None,
+            'per_file_seconds': self.file_times,
+            'failed_files': sorted(self.failed_files)
+        }
+
+
+class BulkUploader:
+    """Class to upload files straight to the VerixAI upload endpoint over pooled HTTP connections
+
+    The uploader reuses the logged-in browser session's cookies (and optionally
+    a bearer token), so the files land in the same case the UI is looking at.
+    Files are posted as individual multipart requests by a pool of worker
+    threads sharing one requests.Session, whose connection pool is sized to
+    the parallelism so connections are kept alive and reused.
+    """
+
+    def __init__(self, upload_url, cookies=None, headers=None, parallelism=4, field_name='file',
+                 extra_fields=None, timeout=300, retries=2, verify=True):
+        """
+        Initialize the uploader
+
+        Args:
+            upload_url (str): URL to POST each file to
+            cookies (list, optional): Cookies as returned by WebDriver.get_cookies()
+            headers (dict, optional): Extra headers (e.g. Authorization)
+            parallelism (int): Number of concurrent uploads
+            field_name (str): Multipart field name of the file
+            extra_fields (dict, optional): Extra multipart form fields sent with every file
+            timeout (float): Timeout of a single upload in seconds
+            retries (int): Retries on errors connecting to the endpoint. Once a file has been
+                sent it is never posted again, since the server may already have stored it
+            verify (bool): Whether to verify TLS certificates
+        """
+        self.upload_url = upload_url
+        self.parallelism = max(1, int(parallelism))
+        self.field_name = field_name
+        self.extra_fields = extra_fields or {}
+        self.timeout = timeout
+
+        self.session = requests.Session()
+        self.session.verify = verify
+        retry = Retry(
+            total=retries,
+            connect=retries,
+            read=0,
+            status=0,
+            backoff_factor=0.5
+        )
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.parallelism, max_retries=retry)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+        if headers:
+            self.session.headers.update(headers)
+        for cookie in cookies or []:
+            self.session.cookies.set(
+                cookie['name'],
+                cookie['value'],
+                domain=cookie.get('domain') or '',
+                path=cookie.get('path', '/')
+            )
+
+    def upload_file(self, file_path, upload_name):
+        """
+        Upload a single file
+
+        Args:
+            file_path (str): Path of the file
+            upload_name (str): File name sent in the multipart body
+
+        Returns:
+            dict: Name, size, HTTP status, duration and error of the upload
+        """
+        size = os.path.getsize(file_path)
+        content_type = mimetypes.guess_type(file_path)[0] or 'application/octet-stream'
+        start = time.monotonic()
+        try:
+            with open(file_path, 'rb') as f:
+                response = self.session.post(
+                    self.upload_url,
+                    files={self.field_name: (upload_name, f, content_type)},
+                    data=self.extra_fields,
+                    timeout=self.timeout
+                )
+            ok = response.ok
+            status = response.status_code
+            error = None if ok else response.text[:500]
+        except requests.RequestException as e:
+            ok = False
+            status = None
+            error = str(e)
+
+        return {
+            'name': upload_name,
+            'bytes': size,
+            'status': status,
+            'ok': ok,
+            'seconds': round(time.monotonic() - start, 3),
+            'error': error
+        }
+
+    def upload(self, path):
+        """
+        Upload a file or every file in a folder concurrently
+
+        Args:
+            path (str): File or folder path
+
+        Returns:
+            dict: Throughput details in the same shape as UploadMeasurement.get_details
+        """
+        files = list_upload_files(path)
+        start = time.monotonic()
+        with ThreadPoolExecutor(max_workers=self.parallelism) as executor:
+            results = list(executor.map(lambda item: self.upload_file(*item), files))
+        elapsed = time.monotonic() - start
+
+        total_bytes = sum(r['bytes'] for r in results)
+        failed = [r for r in results if not r['ok']]
+        mb = total_bytes / (1024 * 1024)
+        return {
+            'upload_type': 'folder' if os.path.isdir(path) else 'file',
+            'mode': 'http',
+            'path': os.path.basename(os.path.normpath(path)),
+            'file_count': len(results),
+            'total_bytes': total_bytes,
+            'elapsed_seconds': round(elapsed, 3),
+            'completion_detected': True,
+            'success': bool(results) and not failed,
+            'mb_per_second': round(mb / elapsed, 3) if elapsed else None,
+            'files_per_second': round(len(results) / elapsed, 3) if elapsed else None,
+            'parallelism': self.parallelism,
+            'per_file_seconds': {r['name']: r['seconds'] for r in results if r['ok']},
+            'request_latency_seconds': latency_summary([r['seconds'] for r in results], digits=3),
+            'failed_files': [r['name'] for r in failed],
+            'errors': [{'name': r['name'], 'status': r['status'], 'error': r['error']} for r in failed[:10]]
+        }
+
+    def close(self):
+        """Close the pooled connections"""
+        self.session.close()